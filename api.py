@@ -0,0 +1,321 @@
+"""Read-only HTTP/JSON API over the registered dashboard queries.
+
+Usage:
+    python api.py                      # serve on API_HOST:API_PORT
+
+Endpoints:
+    GET /api/queries                   catalogue of registered queries
+    GET /api/queries/{name}            one query's result; ?start=&end= (dates) for a
+                                       claims window, ?param= for query parameters
+    GET /api/export/{name}             the full result as a streamed file; ?format=csv|parquet,
+                                       plus the same ?start=&end=&param= as above
+    GET /api/live                      the change-feed aggregates from live.py
+    GET /metrics                       Prometheus metrics
+
+Serialised responses are cached until the data changes: the API LISTENs on
+the same change feed channels as the app and clears its caches on every
+change (providers have no feed, so their changes appear within
+QUERY_CACHE_TTL). Each response carries an ETag and is gzipped for clients
+that accept it, so a poller whose data has not changed gets an empty 304.
+Concurrent requests for the same uncached response share one query.
+Exports are never cached: they are streamed from the database to the
+client through a small bounded buffer, so the API holds a few chunks of
+the file at a time whatever its size.
+"""
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from aiohttp import web
+
+import export
+import live
+import matching
+from db import QUERY_CACHE_TTL, clear_query_cache, data_version
+from metrics import METRICS
+from queries import QUERIES, fetch, parameters, snapshot_of
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8080"))
+API_CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", "256"))
+# Responses smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+# Exports are sent in chunks of this size, at most EXPORT_BUFFER_CHUNKS ahead of the client
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_BUFFER_CHUNKS = 8
+
+
+class CacheInvalidator(live.ChangeListener):
+    """Clears the query cache whenever the app's data changes."""
+    channels = (live.CHANNEL, matching.CHANNEL)
+    name = "api-cache-invalidator"
+
+    def _reload(self, conn):
+        # Anything may have changed while disconnected
+        clear_query_cache()
+        with self.lock:
+            self._changed()
+
+    def _apply(self, conn, notifications):
+        clear_query_cache()
+        with self.lock:
+            self._changed()
+
+
+class CachedResponse:
+    __slots__ = ("version", "created", "body", "gzipped", "etag")
+
+    def __init__(self, version, body):
+        self.version = version
+        self.created = time.monotonic()
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+        self.etag = 'W/"%s"' % hashlib.sha1(body).hexdigest()
+
+
+class ResponseCache:
+    """LRU of serialised responses, each valid for one data version and QUERY_CACHE_TTL seconds."""
+
+    def __init__(self, max_entries=API_CACHE_MAX_ENTRIES, ttl=QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    async def get(self, key, version, build):
+        """Cached response for ``key``, or ``await build()`` (bytes) to make one."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry.version == version and time.monotonic() - entry.created < self.ttl:
+                self.entries.move_to_end(key)
+                return entry
+        # One build per key at a time; everyone else waits for its result
+        task = self.inflight.get((key, version))
+        if task is None:
+            task = asyncio.ensure_future(self._build(key, version, build))
+            self.inflight[(key, version)] = task
+            task.add_done_callback(lambda _: self.inflight.pop((key, version), None))
+        return await asyncio.shield(task)
+
+    async def _build(self, key, version, build):
+        entry = CachedResponse(version, await build())
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+
+CACHE = ResponseCache()
+
+
+def _json(data):
+    return json.dumps(data, default=str, separators=(",", ":")).encode()
+
+
+def _frame(df):
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def _respond(request, entry):
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if entry.etag in request.headers.get("If-None-Match", ""):
+        return web.Response(status=304, headers=headers)
+    if entry.gzipped is not None and "gzip" in request.headers.get("Accept-Encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return web.Response(body=entry.gzipped, content_type="application/json", headers=headers)
+    return web.Response(body=entry.body, content_type="application/json", headers=headers)
+
+
+def _bad_request(message, **details):
+    return web.HTTPBadRequest(text=_json({"error": message, **details}).decode(), content_type="application/json")
+
+
+def _window(request, query):
+    start, end = request.query.get("start"), request.query.get("end")
+    if not (start or end):
+        if query.sql is None:
+            raise ValueError(f"{query.name} needs start and end dates")
+        return None
+    start = date.fromisoformat(start) if start else date.min
+    end = date.fromisoformat(end) if end else date.today()
+    # The window ends at the start of the day after end, and there is none after date.max
+    until = datetime.max if end == date.max else datetime.combine(end + timedelta(days=1), datetime.min.time())
+    return datetime.combine(start, datetime.min.time()), until
+
+
+async def list_queries(request):
+    async def build():
+        return _json([{"name": q.name, "title": q.title, "windowed": q.windowed is not None,
+                       "parameters": list(parameters(q.name))} for q in QUERIES.values()])
+
+    return _respond(request, await CACHE.get(("catalogue",), 0, build))
+
+
+def _query_args(request):
+    """(name, query, params, window) of a /api/queries or /api/export request; raises 404/400."""
+    name = request.match_info["name"]
+    query = QUERIES.get(name)
+    if query is None:
+        raise web.HTTPNotFound(text=_json({"error": f"unknown query {name!r}"}).decode(),
+                               content_type="application/json")
+    params = tuple(request.query.getall("param", [])) or None
+    expected = parameters(name)
+    if len(params or ()) != len(expected):
+        raise _bad_request(f"{name} takes {len(expected)} param value(s), got {len(params or ())}",
+                           parameters=list(expected))
+    try:
+        window = _window(request, query)
+    except ValueError as e:
+        raise _bad_request(str(e))
+    return name, query, params, window
+
+
+async def get_query(request):
+    name, query, params, window = _query_args(request)
+    version = data_version()
+    # A precomputed answer changes when its snapshot is refreshed, without a
+    # new data version; its as-of time is part of the key and of the body (ETag)
+    snapshot = snapshot_of(name, window)
+    as_of = snapshot.as_of if snapshot is not None else None
+
+    async def build():
+        df = await asyncio.to_thread(fetch, name, params, window)
+        return _json({"name": name, "title": query.title, "window": window,
+                      "as_of": datetime.fromtimestamp(as_of).isoformat() if as_of else None, "rows": _frame(df)})
+
+    return _respond(request, await CACHE.get(("query", name, params, window, as_of), version, build))
+
+
+async def get_live(request):
+    feed = live.get_feed()
+    if not feed.connected:
+        raise web.HTTPServiceUnavailable(text=_json({"error": feed.error or "change feed not connected"}).decode(),
+                                         content_type="application/json")
+
+    async def build():
+        data = feed.frames()
+        return _json({key: _frame(value) if hasattr(value, "to_json") else value for key, value in data.items()})
+
+    return _respond(request, await CACHE.get(("live",), feed.version, build))
+
+
+class _ChunkWriter(io.RawIOBase):
+    """Binary file object for export.export() running in a worker thread.
+
+    Writes are gathered into EXPORT_CHUNK_BYTES chunks and handed to the
+    event loop through a bounded queue, so the export waits for the client
+    instead of buffering the file. Once the client is gone, writes raise
+    and the export stops.
+    """
+
+    def __init__(self, loop, queue):
+        super().__init__()
+        self.loop = loop
+        self.queue = queue
+        self.buffer = bytearray()
+        self.written = 0
+        self.cancelled = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.cancelled:
+            raise ConnectionResetError("export client went away")
+        self.buffer += data
+        self.written += len(data)
+        if len(self.buffer) >= EXPORT_CHUNK_BYTES:
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+        return len(data)
+
+    def tell(self):
+        return self.written
+
+    def finish(self):
+        if self.buffer and not self.cancelled:
+            self._put(bytes(self.buffer))
+        self._put(None)
+
+    def _put(self, item):
+        asyncio.run_coroutine_threadsafe(self.queue.put(item), self.loop).result()
+
+
+def _export(name, writer, fmt, params, window):
+    try:
+        export.export(name, writer, fmt, params, window)
+    finally:
+        writer.finish()
+
+
+async def export_query(request):
+    name, query, params, window = _query_args(request)
+    fmt = request.query.get("format", "csv")
+    if fmt not in export.FORMATS:
+        raise _bad_request(f"unknown format {fmt!r}", formats=list(export.FORMATS))
+
+    queue = asyncio.Queue(maxsize=EXPORT_BUFFER_CHUNKS)
+    writer = _ChunkWriter(asyncio.get_running_loop(), queue)
+    task = asyncio.ensure_future(asyncio.to_thread(_export, name, writer, fmt, params, window))
+    # Wait for the first chunk, so a failing query still gets a proper error response
+    chunk = await queue.get()
+    if chunk is None:
+        try:
+            await task
+        except Exception as e:
+            raise web.HTTPInternalServerError(text=_json({"error": str(e)}).decode(), content_type="application/json")
+    response = web.StreamResponse(headers={
+        "Content-Type": export.FORMATS[fmt],
+        "Content-Disposition": f'attachment; filename="{name}.{fmt}"',
+    })
+    await response.prepare(request)
+    try:
+        while chunk is not None:
+            await response.write(chunk)
+            chunk = await queue.get()
+    except (ConnectionResetError, asyncio.CancelledError):
+        # Stop the export and let its thread finish its last write
+        writer.cancelled = True
+        while await queue.get() is not None:
+            pass
+        raise
+    await task
+    await response.write_eof()
+    return response
+
+
+async def get_metrics(request):
+    return web.Response(text=METRICS.prometheus_text(), content_type="text/plain")
+
+
+def create_app():
+    app = web.Application()
+    app.router.add_get("/api/queries", list_queries)
+    app.router.add_get("/api/queries/{name}", get_query)
+    app.router.add_get("/api/export/{name}", export_query)
+    app.router.add_get("/api/live", get_live)
+    app.router.add_get("/metrics", get_metrics)
+
+    async def start_invalidator(app):
+        invalidator = CacheInvalidator()
+        invalidator.start()
+        app["invalidator"] = invalidator
+        yield
+        invalidator.stop()
+
+    app.cleanup_ctx.append(start_invalidator)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host=API_HOST, port=API_PORT)
@@ -0,0 +1,388 @@
+"""Benchmark the dashboard queries and Manage Listings write paths.
+
+Usage:
+    python benchmark.py run --claims 100000 --reset --output bench.json
+    python benchmark.py run --skip-load --runs 50 --output bench.json
+    python benchmark.py compare old.json new.json
+    python benchmark.py claims --claimers 128 --quantity 2000
+
+`run` generates a seeded synthetic data set shaped like the notebook's CSV
+files, bulk-loads it with ingest.py and then times every registered query
+(uncached) and each write path. It records p50/p95 latency, rows returned,
+rows scanned (from EXPLAIN ANALYZE) and peak Python memory. Point
+DATABASE_URL at a scratch PostgreSQL database: --reset truncates the four
+app tables before loading.
+
+`claims` runs many concurrent claimers against a few listings until they
+are used up. It then checks that no claim was lost and no listing was
+over-claimed, and exits non-zero if either happened. Database-side
+concurrency is capped at DB_POOL_SIZE + DB_MAX_OVERFLOW connections.
+"""
+import argparse
+import csv
+import json
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+import explain
+import ingest
+from claims import claim_first_available, claim_listing
+from db import DB_MAX_OVERFLOW, DB_POOL_SIZE, get_engine, transaction
+from listings import (FOOD_TYPES, MEAL_TYPES, bulk_add_listings, bulk_delete_listings, bulk_update_quantities,
+                      listing_versions)
+from queries import QUERIES
+
+PROVIDER_TYPES = ["Restaurant", "Grocery Store", "Supermarket", "Catering Service"]
+RECEIVER_TYPES = ["NGO", "Community Center", "Shelter", "Individual"]
+FOOD_NAMES = ["Rice", "Bread", "Soup", "Pasta", "Salad", "Fruits", "Vegetables", "Dairy", "Chicken", "Fish"]
+STATUSES = ["Completed", "Pending", "Cancelled"]
+STATUS_WEIGHTS = [0.4, 0.35, 0.25]
+
+
+# Synthetic data -------------------------------------------------------------
+
+def scale_for(claims):
+    """Row counts per table for a given number of claims."""
+    return {
+        "providers": max(10, claims // 10),
+        "receivers": max(10, claims // 10),
+        "food_listings": max(10, claims // 2),
+        "claims": claims,
+        "cities": max(20, claims // 500),
+    }
+
+
+def generate(out_dir, claims, seed=42):
+    """Write providers/receivers/food_listings/claims CSVs; return {table: path}.
+
+    Rows are streamed straight to disk, so 10M claims need no more memory
+    than 10k. Ids are 1-based and sequential, matching the serial ids the
+    rows get when loaded into empty tables.
+    """
+    rng = random.Random(seed)
+    counts = scale_for(claims)
+    cities = [f"City {i}" for i in range(1, counts["cities"] + 1)]
+    out_dir = Path(out_dir)
+    paths = {table: out_dir / f"{table}_data.csv" for table in ("providers", "receivers", "food_listings", "claims")}
+
+    provider_city, provider_type = {}, {}
+    with open(paths["providers"], "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Provider_ID", "Name", "Type", "Address", "City", "Contact"])
+        for i in range(1, counts["providers"] + 1):
+            provider_city[i] = rng.choice(cities)
+            provider_type[i] = rng.choice(PROVIDER_TYPES)
+            writer.writerow([i, f"Provider {i}", provider_type[i], f"{rng.randint(1, 999)} Main Street",
+                             provider_city[i], f"+1-555-{i:07d}"])
+
+    with open(paths["receivers"], "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Receiver_ID", "Name", "Type", "City", "Contact"])
+        for i in range(1, counts["receivers"] + 1):
+            writer.writerow([i, f"Receiver {i}", rng.choice(RECEIVER_TYPES), rng.choice(cities),
+                             f"+1-666-{i:07d}"])
+
+    today = datetime(2025, 3, 1)
+    with open(paths["food_listings"], "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Food_ID", "Food_Name", "Quantity", "Expiry_Date", "Provider_ID", "Provider_Type",
+                         "Location", "Food_Type", "Meal_Type"])
+        for i in range(1, counts["food_listings"] + 1):
+            provider = rng.randint(1, counts["providers"])
+            expiry = today + timedelta(days=rng.randint(-30, 30))
+            writer.writerow([i, rng.choice(FOOD_NAMES), rng.randint(1, 50), expiry.strftime("%m/%d/%Y"),
+                             provider, provider_type[provider], provider_city[provider],
+                             rng.choice(FOOD_TYPES), rng.choice(MEAL_TYPES)])
+
+    with open(paths["claims"], "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Claim_ID", "Food_ID", "Receiver_ID", "Status", "Timestamp"])
+        for i in range(1, claims + 1):
+            when = today - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+            writer.writerow([i, rng.randint(1, counts["food_listings"]), rng.randint(1, counts["receivers"]),
+                             rng.choices(STATUSES, STATUS_WEIGHTS)[0], when.strftime("%m/%d/%Y %H:%M")])
+    return paths
+
+
+def reset_tables():
+    with transaction() as conn:
+        conn.exec_driver_sql("TRUNCATE claims, food_listings, receivers, providers RESTART IDENTITY CASCADE")
+
+
+# Measurements ---------------------------------------------------------------
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(func, runs):
+    """Time ``func`` ``runs`` times; peak memory is taken from the first run."""
+    timings = []
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        timings.append(1000 * (time.perf_counter() - start))
+    return result, {
+        "runs": runs,
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "max_ms": round(max(timings), 3),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def bench_queries(runs):
+    results = {}
+    engine = get_engine()
+    conn = engine.raw_connection()
+    try:
+        for query in QUERIES.values():
+            for name, sql in [(query.name, query.sql), (f"{query.name}_windowed", query.windowed)]:
+                if sql is None:
+                    continue
+                params = explain.sample_params(conn, sql)
+                # Straight to the database: the shared result cache would hide the query cost
+                df, stats = measure(lambda: pd.read_sql(sql, engine, params=params), runs)
+                plan = explain.explain(conn, sql, params)
+                conn.rollback()
+                stats.update(rows_returned=len(df), rows_scanned=plan["rows_scanned"])
+                results[name] = stats
+                print(f"🔎 {name:32} p50 {stats['p50_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms")
+    finally:
+        conn.close()
+    return results
+
+
+def bench_writes(runs, batch_size=200):
+    with get_engine().connect() as conn:
+        provider_id = conn.exec_driver_sql("SELECT MIN(provider_id) FROM providers").scalar()
+    row = ("Benchmark Meal", 10, datetime.now().date(), provider_id, "Restaurant", "City 1", "Vegan", "Lunch")
+
+    def add_update_delete():
+        with transaction() as conn:
+            food_id = conn.exec_driver_sql(
+                """
+                INSERT INTO food_listings
+                (food_name, quantity, expiry_date, provider_id, provider_type, location, food_type, meal_type)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING food_id;
+                """, row).scalar()
+        with transaction() as conn:
+            conn.exec_driver_sql("UPDATE food_listings SET quantity = %s WHERE food_id = %s", (20, food_id))
+        with transaction() as conn:
+            conn.exec_driver_sql("DELETE FROM food_listings WHERE food_id = %s", (food_id,))
+
+    batch = pd.DataFrame([dict(zip(ingest.TABLES["food_listings"]["columns"], row))] * batch_size).astype(str)
+
+    def bulk_round_trip():
+        added = bulk_add_listings(batch)
+        ids = [int(v) for v in added["food_id"].dropna()]
+        bulk_update_quantities(listing_versions(ids).assign(quantity=5))
+        bulk_delete_listings(ids)
+
+    results = {}
+    for name, func in [("single_add_update_delete", add_update_delete),
+                       (f"bulk_{batch_size}_add_update_delete", bulk_round_trip)]:
+        _, stats = measure(func, runs)
+        results[name] = stats
+        print(f"✏️ {name:32} p50 {stats['p50_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms")
+    return results
+
+
+def run(args):
+    meta = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "claims": args.claims,
+        "seed": args.seed,
+        "runs": args.runs,
+    }
+    try:
+        meta["git_commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+
+    if not args.skip_load:
+        if args.reset:
+            reset_tables()
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            files = generate(tmp, args.claims, args.seed)
+            print(f"🧪 Generated {args.claims:,} claims in {time.perf_counter() - start:.1f}s")
+            ingest.ingest({table: str(path) for table, path in files.items()})
+
+    with get_engine().connect() as conn:
+        meta["row_counts"] = {
+            table: conn.exec_driver_sql(f"SELECT COUNT(*) FROM {table}").scalar()
+            for table in ("providers", "receivers", "food_listings", "claims")
+        }
+        meta["server_version"] = conn.exec_driver_sql("SHOW server_version").scalar()
+
+    report = {"meta": meta, "queries": bench_queries(args.runs), "writes": bench_writes(args.runs)}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Results written to {args.output}")
+
+
+def claims_stress(args):
+    with get_engine().connect() as conn:
+        receiver_id = conn.exec_driver_sql("SELECT MIN(receiver_id) FROM receivers").scalar()
+        provider_id = conn.exec_driver_sql("SELECT MIN(provider_id) FROM providers").scalar()
+    if receiver_id is None or provider_id is None:
+        sys.exit("Load at least one provider and one receiver first (e.g. benchmark.py run --claims 1000).")
+    if args.claimers > DB_POOL_SIZE + DB_MAX_OVERFLOW:
+        print(f"ℹ️ {args.claimers} claimers share {DB_POOL_SIZE + DB_MAX_OVERFLOW} pooled connections; "
+              "raise DB_POOL_SIZE for more concurrency at the database")
+
+    listings = 1 if args.mode == "single" else args.listings
+    with transaction() as conn:
+        food_ids = conn.exec_driver_sql(
+            """
+            INSERT INTO food_listings
+            (food_name, quantity, expiry_date, provider_id, provider_type, location, food_type, meal_type)
+            SELECT 'Claim Stress ' || n, %s, CURRENT_DATE + 1, %s, 'Restaurant', 'City 1', 'Vegan', 'Lunch'
+            FROM generate_series(1, %s) AS n
+            RETURNING food_id
+            """,
+            (args.quantity, provider_id, listings),
+        ).scalars().all()
+
+    lock = threading.Lock()
+    outcomes, timings = Counter(), []
+
+    def claimer():
+        while True:
+            start = time.perf_counter()
+            if args.mode == "single":
+                result = claim_listing(food_ids[0], receiver_id)
+            else:
+                result = claim_first_available(food_ids, receiver_id)
+            elapsed = 1000 * (time.perf_counter() - start)
+            with lock:
+                outcomes[result["status"]] += 1
+                outcomes["retries"] += result["attempts"] - 1
+                if result["status"] == "claimed":
+                    timings.append(elapsed)
+            if result["status"] == "claimed":
+                continue
+            if result["status"] == "unavailable":
+                # Every candidate may just have been locked; stop only once all are used up
+                with get_engine().connect() as conn:
+                    left = conn.exec_driver_sql(
+                        "SELECT COALESCE(SUM(quantity), 0) FROM food_listings WHERE food_id = ANY(%s)",
+                        (food_ids,)).scalar()
+                if left:
+                    continue
+            return
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.claimers) as pool:
+        for future in [pool.submit(claimer) for _ in range(args.claimers)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    with get_engine().connect() as conn:
+        rows = conn.exec_driver_sql(
+            """
+            SELECT f.food_id, f.quantity, COALESCE(SUM(c.quantity), 0), COUNT(c.claim_id)
+            FROM food_listings f
+            LEFT JOIN claims c ON c.food_id = f.food_id
+            WHERE f.food_id = ANY(%s)
+            GROUP BY f.food_id, f.quantity
+            """,
+            (food_ids,),
+        ).all()
+    problems = []
+    for food_id, remaining, claimed, claim_rows in rows:
+        if remaining < 0:
+            problems.append(f"listing {food_id} over-claimed: quantity {remaining}")
+        if remaining + claimed != args.quantity:
+            problems.append(f"listing {food_id}: {remaining} left + {claimed} claimed != {args.quantity}")
+        if remaining:
+            problems.append(f"listing {food_id}: {remaining} left unclaimed")
+    total_rows = sum(row[3] for row in rows)
+    if total_rows != outcomes["claimed"]:
+        problems.append(f"{outcomes['claimed']} successful claims but {total_rows} claim rows")
+
+    print(f"🤝 {outcomes['claimed']:,} claims by {args.claimers} claimers in {elapsed:.2f}s "
+          f"({outcomes['claimed'] / elapsed:,.0f} claims/s), {outcomes['retries']} retries")
+    if timings:
+        print(f"   latency p50 {statistics.median(timings):.2f} ms  p95 {percentile(timings, 95):.2f} ms")
+
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ No lost updates and no over-claims")
+
+    if not args.keep:
+        # Claims keep their listing (ON DELETE RESTRICT), so they go first
+        with transaction() as conn:
+            conn.exec_driver_sql("DELETE FROM claims WHERE food_id = ANY(%s)", (food_ids,))
+            conn.exec_driver_sql("DELETE FROM food_listings WHERE food_id = ANY(%s)", (food_ids,))
+    if problems:
+        sys.exit(1)
+
+
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"{'name':36} {'old p50':>9} {'new p50':>9} {'old p95':>9} {'new p95':>9}")
+    for section in ("queries", "writes"):
+        for name, stats in new.get(section, {}).items():
+            before = old.get(section, {}).get(name, {})
+            print(f"{name:36} {before.get('p50_ms', float('nan')):9.2f} {stats['p50_ms']:9.2f} "
+                  f"{before.get('p95_ms', float('nan')):9.2f} {stats['p95_ms']:9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="generate, load and benchmark")
+    run_parser.add_argument("--claims", type=int, default=10_000, help="claims to generate (10k to 10M)")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--runs", type=int, default=20, help="timed runs per query / write path")
+    run_parser.add_argument("--reset", action="store_true", help="truncate the app tables before loading")
+    run_parser.add_argument("--skip-load", action="store_true", help="benchmark the data already in the database")
+    run_parser.add_argument("--output", default="bench_results.json")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.set_defaults(func=compare)
+
+    claims_parser = commands.add_parser("claims", help="concurrent claim stress test")
+    claims_parser.add_argument("--claimers", type=int, default=128, help="concurrent claiming threads")
+    claims_parser.add_argument("--quantity", type=int, default=2000, help="units per listing")
+    claims_parser.add_argument("--mode", choices=["single", "skip-locked"], default="single",
+                               help="all claimers on one listing, or claim_first_available over --listings")
+    claims_parser.add_argument("--listings", type=int, default=20, help="listings in skip-locked mode")
+    claims_parser.add_argument("--keep", action="store_true", help="keep the test listings and claims")
+    claims_parser.set_defaults(func=claims_stress)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Plotly figure builders for the Visualizations page.
+
+Builders are cached with st.cache_data, which hashes the DataFrame and the
+other arguments, so a rerun with unchanged data gets the finished figure back
+instead of building it again. Everything is plain Plotly: no matplotlib
+figures are created, so there is nothing left open between reruns.
+"""
+import os
+
+import plotly.express as px
+import streamlit as st
+
+CHART_CACHE_MAX_ENTRIES = int(os.getenv("CHART_CACHE_MAX_ENTRIES", "64"))
+
+# Colour sequences matching the seaborn palettes the charts used before
+PALETTES = {
+    "Set2": px.colors.qualitative.Set2,
+    "viridis": px.colors.sequential.Viridis,
+    "mako": px.colors.sequential.Teal_r,
+    "crest": px.colors.sequential.Blugrn_r,
+    "flare": px.colors.sequential.Redor_r,
+    "rocket": px.colors.sequential.Magma,
+    "RdBu": px.colors.sequential.RdBu,
+    "seagreen": ["seagreen"],
+}
+
+
+@st.cache_data(max_entries=CHART_CACHE_MAX_ENTRIES, show_spinner=False)
+def bar(df, x, y, title, labels=None, color=None, orientation="h", palette=None, height=None):
+    """Bar chart; with a palette and no ``color`` column each bar gets its own colour."""
+    category = y if orientation == "h" else x
+    fig = px.bar(
+        df, x=x, y=y, title=title, labels=labels or {}, orientation=orientation,
+        color=color or (category if palette else None), barmode="group",
+        color_discrete_sequence=PALETTES.get(palette), height=height,
+    )
+    if color is None:
+        fig.update_layout(showlegend=False)
+    if orientation == "h":
+        # Keep the query's order: largest value at the top
+        fig.update_layout(yaxis=dict(autorange="reversed"))
+    else:
+        fig.update_xaxes(tickangle=-45)
+    return fig
+
+
+@st.cache_data(max_entries=CHART_CACHE_MAX_ENTRIES, show_spinner=False)
+def pie(df, names, title, values=None, palette=None):
+    return px.pie(df, names=names, values=values, title=title, color_discrete_sequence=PALETTES.get(palette))
+
+
+@st.cache_data(max_entries=CHART_CACHE_MAX_ENTRIES, show_spinner=False)
+def line(df, x, y, title, labels=None, color=None, palette=None):
+    """Line chart over time, one line per ``color`` value."""
+    fig = px.line(df, x=x, y=y, title=title, labels=labels or {}, color=color, markers=True,
+                  color_discrete_sequence=PALETTES.get(palette))
+    fig.update_layout(hovermode="x unified")
+    return fig
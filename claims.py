@@ -0,0 +1,129 @@
+"""Concurrency-safe claiming of food listings.
+
+A claim decrements food_listings.quantity and inserts the claims row in one
+transaction. The decrement is a single conditional UPDATE
+(``... WHERE quantity >= claimed``). PostgreSQL re-checks that condition
+against the latest row version when two claimers race, so no update is
+lost and a listing can never be over-claimed. claim_first_available() takes
+the first listing from a candidate list that no other transaction is
+claiming right now (FOR UPDATE SKIP LOCKED), so peak-time claimers spread
+over listings instead of queueing behind one row lock.
+
+Deadlocks, serialization failures and lock timeouts are retried with
+jittered exponential backoff.
+"""
+import os
+import random
+import time
+
+from sqlalchemy import exc
+
+from db import transaction
+
+CLAIM_RETRIES = int(os.getenv("CLAIM_RETRIES", "5"))
+CLAIM_BACKOFF_MS = float(os.getenv("CLAIM_BACKOFF_MS", "20"))
+
+# serialization_failure, deadlock_detected, lock_not_available
+RETRYABLE = {"40001", "40P01", "55P03"}
+
+CLAIM_STATUSES = ["Pending", "Completed", "Cancelled"]
+
+
+def _retrying(func):
+    """Run ``func`` and retry it on transient lock conflicts; adds the attempt count to its result."""
+    for attempt in range(1, CLAIM_RETRIES + 1):
+        try:
+            result = func()
+            result["attempts"] = attempt
+            return result
+        except exc.DBAPIError as e:
+            if getattr(e.orig, "pgcode", None) not in RETRYABLE or attempt == CLAIM_RETRIES:
+                raise
+            time.sleep(CLAIM_BACKOFF_MS / 1000 * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+
+def _result(status, food_id, claim_id=None, remaining=None):
+    return {"status": status, "food_id": food_id, "claim_id": claim_id, "remaining": remaining}
+
+
+def _insert_claim(conn, food_id, receiver_id, quantity, status):
+    return conn.exec_driver_sql(
+        """
+        INSERT INTO claims (food_id, receiver_id, status, timestamp, quantity)
+        VALUES (%s, %s, %s, now(), %s)
+        RETURNING claim_id
+        """,
+        (food_id, receiver_id, status, quantity),
+    ).scalar()
+
+
+def claim_listing(food_id, receiver_id, quantity=1, status="Pending"):
+    """Claim ``quantity`` units of one listing.
+
+    Returns a dict with ``status`` one of "claimed", "insufficient" (not
+    enough left) or "not_found", plus food_id, claim_id, remaining quantity
+    and the number of attempts.
+    """
+    if quantity < 1:
+        raise ValueError("quantity must be at least 1")
+
+    def attempt():
+        with transaction("claim") as conn:
+            remaining = conn.exec_driver_sql(
+                """
+                UPDATE food_listings
+                SET quantity = quantity - %s
+                WHERE food_id = %s AND quantity >= %s
+                RETURNING quantity
+                """,
+                (quantity, food_id, quantity),
+            ).scalar()
+            if remaining is None:
+                current = conn.exec_driver_sql(
+                    "SELECT quantity FROM food_listings WHERE food_id = %s", (food_id,)).first()
+                if current is None:
+                    return _result("not_found", food_id)
+                return _result("insufficient", food_id, remaining=current[0])
+            claim_id = _insert_claim(conn, food_id, receiver_id, quantity, status)
+            return _result("claimed", food_id, claim_id, remaining)
+
+    return _retrying(attempt)
+
+
+def claim_first_available(food_ids, receiver_id, quantity=1, status="Pending"):
+    """Claim ``quantity`` from the first listing in ``food_ids`` that has enough left.
+
+    Listings locked by a concurrent claim are skipped rather than waited
+    for. Returns the same dict as claim_listing(); status "unavailable"
+    means no candidate could be claimed.
+    """
+    if quantity < 1:
+        raise ValueError("quantity must be at least 1")
+    food_ids = [int(v) for v in food_ids]
+    if not food_ids:
+        return {**_result("unavailable", None), "attempts": 0}
+
+    def attempt():
+        with transaction("claim_first_available") as conn:
+            food_id = conn.exec_driver_sql(
+                """
+                SELECT food_id
+                FROM food_listings
+                WHERE food_id = ANY(%s) AND quantity >= %s
+                ORDER BY array_position(%s, food_id)
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+                """,
+                (food_ids, quantity, food_ids),
+            ).scalar()
+            if food_id is None:
+                return _result("unavailable", None)
+            # The row is locked by us, so the quantity check above still holds
+            remaining = conn.exec_driver_sql(
+                "UPDATE food_listings SET quantity = quantity - %s WHERE food_id = %s RETURNING quantity",
+                (quantity, food_id),
+            ).scalar()
+            claim_id = _insert_claim(conn, food_id, receiver_id, quantity, status)
+            return _result("claimed", food_id, claim_id, remaining)
+
+    return _retrying(attempt)
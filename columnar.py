@@ -0,0 +1,297 @@
+"""Optional in-memory columnar engine for the registered dashboard queries.
+
+With ANALYTICS_ENGINE=columnar the four app tables are copied into memory
+once, using only the columns the dashboards need. Text dimensions (city,
+status, meal/food/provider type, names) are stored as pandas categoricals:
+NumPy integer codes plus a small dictionary. queries.fetch() then answers
+every registered query with vectorized group-bys on that snapshot instead
+of sending SQL to PostgreSQL. Each answer is computed once per snapshot.
+
+Only the first read waits for a load. After a write made through the app,
+or every COLUMNAR_REFRESH_SECONDS, one background reload starts and the
+current snapshot is served until the new one is ready. The reload waits
+COLUMNAR_DEBOUNCE_SECONDS first, so a burst of writes (e.g. claims) costs
+one reload, and repeats if more writes arrived while it ran.
+"""
+import io
+import os
+import threading
+import time
+
+import pandas as pd
+
+from db import data_version, read_engine
+from metrics import timed
+
+ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "postgres").lower()
+COLUMNAR_REFRESH_SECONDS = float(os.getenv("COLUMNAR_REFRESH_SECONDS", "60"))
+COLUMNAR_DEBOUNCE_SECONDS = float(os.getenv("COLUMNAR_DEBOUNCE_SECONDS", "1"))
+
+# Table -> {column: dtype} of the columns the dashboards read
+TABLES = {
+    "providers": {
+        "provider_id": "Int64", "name": "category", "type": "category", "city": "category", "contact": "string",
+    },
+    "receivers": {"receiver_id": "Int64", "name": "category", "city": "category"},
+    "food_listings": {
+        "food_id": "Int64", "food_name": "category", "quantity": "Int64", "provider_id": "Int64",
+        "provider_type": "category", "location": "category", "food_type": "category", "meal_type": "category",
+    },
+    "claims": {"food_id": "Int64", "receiver_id": "Int64", "status": "category", "quantity": "Int64"},
+}
+
+
+def enabled():
+    return ANALYTICS_ENGINE == "columnar"
+
+
+def _load_table(cur, table, dtypes):
+    # COPY is several times faster than fetching the rows through the driver
+    buf = io.StringIO()
+    cur.copy_expert(f"COPY (SELECT {', '.join(dtypes)} FROM {table}) TO STDOUT WITH (FORMAT csv, HEADER)", buf)
+    buf.seek(0)
+    return pd.read_csv(buf, dtype=dtypes, keep_default_na=False, na_values=[""])
+
+
+class Snapshot:
+    """One consistent copy of the app tables plus the answers computed from it."""
+
+    def __init__(self, tables, version):
+        self.tables = tables
+        self.version = version
+        self.loaded_at = time.time()
+        self.results = {}
+        self.lock = threading.Lock()
+
+        listings = tables["food_listings"]
+        claims = tables["claims"]
+        # Completed claims joined to their (still existing) listing, used by
+        # the receiver, provider and meal type aggregates. A claim counts the
+        # quantity it took, or its listing's for claims without one.
+        completed = claims[claims["status"] == "Completed"]
+        self.completed = completed.merge(
+            listings[["food_id", "provider_id", "meal_type", "quantity"]], on="food_id", how="inner",
+            suffixes=("", "_listed"))
+        self.completed["quantity"] = self.completed["quantity"].fillna(self.completed["quantity_listed"]).fillna(0)
+
+    @classmethod
+    def load(cls):
+        version = data_version()
+        with timed("columnar", "load") as info:
+            conn = read_engine().raw_connection()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+                    tables = {table: _load_table(cur, table, dtypes) for table, dtypes in TABLES.items()}
+                conn.rollback()
+            finally:
+                conn.close()
+            snapshot = cls(tables, version)
+            info.update(rows=sum(len(df) for df in tables.values()),
+                        nbytes=int(sum(df.memory_usage(deep=True).sum() for df in tables.values())))
+        return snapshot
+
+    def answer(self, name, params=None):
+        key = (name, params)
+        with self.lock:
+            if key not in self.results:
+                df = HANDLERS[name](self, *(params or ()))
+                # Plain object columns, so callers' own group-bys don't expand categories
+                categorical = df.select_dtypes("category").columns
+                self.results[key] = df.astype({column: object for column in categorical})
+            return self.results[key].copy()
+
+
+class ColumnarStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.snapshot = None
+        self.refreshing = False
+
+    def current(self):
+        with self.lock:
+            snapshot = self.snapshot
+            if snapshot is not None:
+                stale = (snapshot.version != data_version()
+                         or time.time() - snapshot.loaded_at > COLUMNAR_REFRESH_SECONDS)
+                if stale and not self.refreshing:
+                    self.refreshing = True
+                    threading.Thread(target=self._refresh, name="columnar-refresh", daemon=True).start()
+                return snapshot
+        # Nothing to serve yet: the first load happens once, in the caller
+        with self.load_lock:
+            with self.lock:
+                snapshot = self.snapshot
+            if snapshot is None:
+                snapshot = Snapshot.load()
+                with self.lock:
+                    self.snapshot = snapshot
+            return snapshot
+
+    def _refresh(self):
+        try:
+            while True:
+                time.sleep(COLUMNAR_DEBOUNCE_SECONDS)
+                snapshot = Snapshot.load()
+                with self.lock:
+                    self.snapshot = snapshot
+                    if snapshot.version == data_version():
+                        self.refreshing = False
+                        return
+        except Exception:
+            with self.lock:
+                self.refreshing = False
+            raise
+
+
+STORE = ColumnarStore()
+
+
+def handles(name):
+    return name in HANDLERS
+
+
+def answer(name, params=None):
+    """Answer a registered query from the in-memory snapshot."""
+    with timed("columnar", name) as info:
+        df = STORE.current().answer(name, tuple(params) if params else None)
+        info.update(rows=len(df), nbytes=int(df.memory_usage(deep=True).sum()))
+    return df
+
+
+# Query implementations --------------------------------------------------------
+#
+# Each returns the same columns, in the same order, as the SQL registered in
+# queries.py. Rows with a NULL grouping key are left out, as the summary
+# tables do.
+
+HANDLERS = {}
+
+
+def _handles(name):
+    def register(func):
+        HANDLERS[name] = func
+        return func
+    return register
+
+
+def _counts(series, column):
+    counts = series.value_counts(sort=False)
+    return counts[counts > 0].rename(column)
+
+
+@_handles("participants_by_city")
+def _participants_by_city(snap):
+    providers = _counts(snap.tables["providers"]["city"], "provider_count")
+    receivers = _counts(snap.tables["receivers"]["city"], "receiver_count")
+    df = pd.concat([providers, receivers], axis=1).fillna(0).astype("int64")
+    df.index = df.index.astype(str)
+    return df.sort_index().rename_axis("city").reset_index()
+
+
+def _listing_totals(snap, column):
+    listings = snap.tables["food_listings"]
+    return listings.groupby(column, observed=True).agg(
+        listing_count=("food_id", "size"), total_quantity=("quantity", "sum")).reset_index()
+
+
+@_handles("contribution_by_provider_type")
+def _contribution_by_provider_type(snap):
+    df = _listing_totals(snap, "provider_type")
+    return df[["provider_type", "total_quantity"]].sort_values("total_quantity", ascending=False, ignore_index=True)
+
+
+@_handles("cities")
+def _cities(snap):
+    # Provider cities as in dimension_values: no NULL
+    values = sorted(snap.tables["providers"]["city"].dropna().unique().astype(str))
+    return pd.DataFrame({"city": values})
+
+
+@_handles("providers_in_city")
+def _providers_in_city(snap, city):
+    providers = snap.tables["providers"]
+    return providers.loc[providers["city"] == city, ["name", "contact", "type", "city"]].reset_index(drop=True)
+
+
+def _receiver_completed(snap):
+    completed = snap.completed.groupby("receiver_id").agg(
+        completed_claims=("food_id", "size"), completed_quantity=("quantity", "sum"))
+    receivers = snap.tables["receivers"].set_index("receiver_id")[["name", "city"]]
+    return receivers.join(completed, how="inner").rename(columns={"name": "receiver_name"})
+
+
+@_handles("receiver_totals")
+def _receiver_totals(snap):
+    df = _receiver_completed(snap).rename(columns={"completed_quantity": "total_claimed_quantity"})
+    return df[["receiver_name", "city", "total_claimed_quantity"]].sort_values(
+        "total_claimed_quantity", ascending=False, ignore_index=True)
+
+
+@_handles("total_available")
+def _total_available(snap):
+    listings = snap.tables["food_listings"]
+    total = int(listings["quantity"].sum()) if len(listings) else None
+    return pd.DataFrame({"total_available_quantity": [total]})
+
+
+@_handles("listings_by_location")
+def _listings_by_location(snap):
+    df = _listing_totals(snap, "location")
+    return df[["location", "listing_count"]].sort_values("listing_count", ascending=False, ignore_index=True)
+
+
+@_handles("food_type_counts")
+def _food_type_counts(snap):
+    df = _listing_totals(snap, "food_type").rename(columns={"listing_count": "total_count"})
+    return df[["food_type", "total_count"]].sort_values("total_count", ascending=False, ignore_index=True)
+
+
+@_handles("claims_per_food")
+def _claims_per_food(snap):
+    claims = snap.tables["claims"][["food_id"]].merge(
+        snap.tables["food_listings"][["food_id", "food_name"]], on="food_id", how="inner")
+    df = claims.groupby("food_name", observed=True, dropna=False).size().rename("total_claims").reset_index()
+    return df.sort_values("total_claims", ascending=False, ignore_index=True)
+
+
+@_handles("provider_successful_claims")
+def _provider_successful_claims(snap):
+    per_provider = snap.completed.groupby("provider_id").size().rename("successful_claims")
+    providers = snap.tables["providers"].set_index("provider_id")[["name"]].join(per_provider, how="inner")
+    df = providers.groupby("name", observed=True)["successful_claims"].sum().reset_index()
+    return df.rename(columns={"name": "provider_name"}).sort_values(
+        "successful_claims", ascending=False, ignore_index=True)
+
+
+@_handles("claim_status")
+def _claim_status(snap):
+    df = _counts(snap.tables["claims"]["status"], "total").rename_axis("status").reset_index()
+    df["status"] = df["status"].astype(str)
+    df["percentage"] = (100.0 * df["total"] / df["total"].sum()).round(2)
+    return df.sort_values("total", ascending=False, ignore_index=True)
+
+
+@_handles("receiver_avg_claimed")
+def _receiver_avg_claimed(snap):
+    df = _receiver_completed(snap)
+    df["avg_claimed_quantity"] = (df["completed_quantity"] / df["completed_claims"]).round(2)
+    return df[["receiver_name", "city", "avg_claimed_quantity"]].sort_values(
+        "avg_claimed_quantity", ascending=False, ignore_index=True)
+
+
+@_handles("meal_type_claims")
+def _meal_type_claims(snap):
+    df = _counts(snap.completed["meal_type"], "total_claims").rename_axis("meal_type").reset_index()
+    df["meal_type"] = df["meal_type"].astype(str)
+    return df.sort_values("total_claims", ascending=False, ignore_index=True)
+
+
+@_handles("provider_donations")
+def _provider_donations(snap):
+    listed = snap.tables["food_listings"].groupby("provider_id")["quantity"].sum().rename("total_donated_quantity")
+    providers = snap.tables["providers"].set_index("provider_id")[["name", "city"]].join(listed, how="inner")
+    df = providers.groupby(["name", "city"], observed=True, dropna=False)["total_donated_quantity"].sum().reset_index()
+    return df.rename(columns={"name": "provider_name"}).sort_values(
+        "total_donated_quantity", ascending=False, ignore_index=True)
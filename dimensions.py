@@ -0,0 +1,36 @@
+"""Shared values for the app's dropdowns: cities, provider, food and meal types, claim statuses.
+
+All dimensions are read in one small query from the dimension_values view
+(migrations/009_dimension_lookup.sql), which combines the lookup_values
+table with the summary tables, and kept in memory for every session. Any
+write made through db.transaction() bumps db.data_version(), and the next
+call reloads them. Values changed elsewhere (another app process, ingest,
+SQL) show up once the copy is QUERY_CACHE_TTL seconds old.
+"""
+import threading
+import time
+
+from db import QUERY_CACHE_TTL, data_version, run_query
+
+DIMENSIONS = ("city", "provider_type", "food_type", "meal_type", "claim_status")
+
+_lock = threading.Lock()
+_loaded = (None, 0.0, {})
+
+
+def _load():
+    df = run_query("SELECT dimension, value FROM dimension_values ORDER BY dimension, value", name="dimensions")
+    return {dimension: group["value"].tolist() for dimension, group in df.groupby("dimension")}
+
+
+def values(dimension):
+    """Sorted values of one dimension, e.g. values("food_type")."""
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"unknown dimension {dimension!r}")
+    global _loaded
+    version = data_version()
+    with _lock:
+        loaded_version, loaded_at, _ = _loaded
+        if loaded_version != version or time.monotonic() - loaded_at > QUERY_CACHE_TTL:
+            _loaded = (version, time.monotonic(), _load())
+        return list(_loaded[2].get(dimension, []))
@@ -0,0 +1,139 @@
+"""EXPLAIN (ANALYZE, BUFFERS) report for every registered dashboard query.
+
+Usage:
+    python explain.py                          # print the report
+    python explain.py --save before.json       # keep it for later comparison
+    python explain.py --compare before.json    # show before/after timings
+
+With --compare the script exits non-zero when a query got slower than
+--max-regression percent, so it can guard a migration or a release.
+"""
+import argparse
+import json
+import sys
+from datetime import datetime
+
+from db import get_engine
+from queries import QUERIES
+
+SCAN_NODES = {"Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan"}
+
+
+def _walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def explain(conn, sql, params=None):
+    """Run EXPLAIN (ANALYZE, BUFFERS) on one query and summarise the plan."""
+    with conn.cursor() as cur:
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql.strip().rstrip(";"), params)
+        result = cur.fetchone()[0]
+    if isinstance(result, str):
+        result = json.loads(result)
+    root = result[0]
+    plan = root["Plan"]
+    nodes = list(_walk(plan))
+    return {
+        "planning_ms": root.get("Planning Time"),
+        "execution_ms": root.get("Execution Time"),
+        "rows_returned": plan.get("Actual Rows"),
+        "rows_scanned": sum(
+            node.get("Actual Rows", 0) * node.get("Actual Loops", 1)
+            for node in nodes if node["Node Type"] in SCAN_NODES
+        ),
+        "shared_hit_blocks": plan.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": plan.get("Shared Read Blocks", 0),
+        "seq_scans": sorted({node["Relation Name"] for node in nodes
+                             if node["Node Type"] == "Seq Scan" and "Relation Name" in node}),
+    }
+
+
+def sample_params(conn, sql):
+    # One parameter is a city (providers_in_city), two are a claims
+    # timestamp window; use a real city and the latest month of claims
+    placeholders = sql.count("%s")
+    if not placeholders:
+        return None
+    with conn.cursor() as cur:
+        if placeholders == 2:
+            cur.execute("""
+                SELECT COALESCE(max("timestamp"), now()) - interval '30 days',
+                       COALESCE(max("timestamp"), now()) + interval '1 day'
+                FROM claims
+            """)
+            return cur.fetchone()
+        cur.execute("SELECT city FROM providers WHERE city IS NOT NULL LIMIT 1")
+        row = cur.fetchone()
+    return (row[0] if row else "",)
+
+
+def report():
+    """EXPLAIN every registered query that has SQL of its own; failures are skipped."""
+    conn = get_engine().raw_connection()
+    try:
+        queries = {}
+        for query in QUERIES.values():
+            variants = [(query.name, query.sql), (f"{query.name}_windowed", query.windowed)]
+            for name, sql in variants:
+                if sql is None:
+                    continue
+                try:
+                    queries[name] = explain(conn, sql, sample_params(conn, sql))
+                except Exception as e:
+                    # e.g. a table that a pending migration has yet to create
+                    print(f"⚠️ Could not explain {name}: {e}", file=sys.stderr)
+                conn.rollback()
+    finally:
+        conn.close()
+    return {"generated_at": datetime.now().isoformat(timespec="seconds"), "queries": queries}
+
+
+def compare(before, after, max_regression):
+    """Print before/after execution times; return the names of regressed queries."""
+    regressed = []
+    print(f"{'query':32} {'before ms':>10} {'after ms':>10} {'change':>8}")
+    for name, stats in after["queries"].items():
+        old = before["queries"].get(name)
+        new_ms = stats["execution_ms"]
+        if not old:
+            print(f"{name:32} {'-':>10} {new_ms:10.2f} {'new':>8}")
+            continue
+        old_ms = old["execution_ms"]
+        change = 100.0 * (new_ms - old_ms) / old_ms if old_ms else 0.0
+        flag = ""
+        if change > max_regression:
+            regressed.append(name)
+            flag = "  ⚠️"
+        print(f"{name:32} {old_ms:10.2f} {new_ms:10.2f} {change:7.1f}%{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", metavar="FILE", help="write the report as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a saved report")
+    parser.add_argument("--max-regression", type=float, default=20.0,
+                        help="allowed slowdown in percent before --compare fails (default: 20)")
+    args = parser.parse_args()
+
+    current = report()
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, current, args.max_regression):
+            sys.exit(1)
+    else:
+        for name, stats in current["queries"].items():
+            scans = ", ".join(stats["seq_scans"]) or "-"
+            print(f"{name:32} {stats['execution_ms']:9.2f} ms  "
+                  f"{stats['rows_scanned']:>10} rows scanned  seq scans: {scans}")
+
+
+if __name__ == "__main__":
+    main()
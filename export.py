@@ -0,0 +1,187 @@
+"""Stream the full result of any registered query to a CSV or Parquet file.
+
+Usage:
+    python export.py provider_donations --output donations.csv
+    python export.py claims_per_food --format parquet --output claims.parquet
+    python export.py claims_daily --start 2025-01-01 --end 2025-04-01 --output daily.csv
+
+CSV goes through ``COPY (query) TO STDOUT`` and Parquet through a
+server-side cursor written one row group at a time, so neither holds more
+than one chunk of rows in memory, whatever the size of the result. Derived
+queries (top-N views) are small, so they are computed with pandas as on
+the dashboards.
+"""
+import argparse
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
+
+from db import read_engine
+from metrics import timed
+from queries import QUERIES, fetch
+
+EXPORT_CHUNK_ROWS = 50_000
+# Exports larger than this spill from memory to a temporary file
+EXPORT_SPOOL_BYTES = 8 * 1024 * 1024
+# Largest file the app offers as a download; Streamlit holds a download in
+# memory, so bigger exports go through the API (api.py) or this script
+EXPORT_APP_MAX_BYTES = int(os.getenv("EXPORT_APP_MAX_BYTES", str(50 * 1024 * 1024)))
+# Where users reach api.py, for links to streamed exports
+EXPORT_API_URL = os.getenv("EXPORT_API_URL", "http://localhost:8080").rstrip("/")
+
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+# PostgreSQL type OID -> pyarrow type; anything else is exported as text
+_ARROW_TYPES = {
+    16: lambda pa: pa.bool_(), 20: lambda pa: pa.int64(), 21: lambda pa: pa.int64(), 23: lambda pa: pa.int64(),
+    700: lambda pa: pa.float64(), 701: lambda pa: pa.float64(), 1700: lambda pa: pa.float64(),
+    1082: lambda pa: pa.date32(), 1114: lambda pa: pa.timestamp("us"), 1184: lambda pa: pa.timestamp("us", tz="UTC"),
+}
+
+
+def export_sql(name, params=None, window=None):
+    """The SQL and parameters an export of ``name`` runs; None for derived queries."""
+    query = QUERIES[name]
+    if query.source:
+        return None, None
+    if window and query.windowed:
+        return query.windowed, tuple(window)
+    if query.sql is None:
+        raise ValueError(f"{name} needs a (start, end) window")
+    return query.sql, params
+
+
+def _to_csv(cur, sql, out):
+    # COPY cannot take bind parameters, so they are inlined by the driver
+    cur.copy_expert(f"COPY ({sql.strip().rstrip(';')}) TO STDOUT WITH (FORMAT csv, HEADER)", out)
+
+
+def _arrow_schema(pa, description):
+    return pa.schema([pa.field(column.name, _ARROW_TYPES.get(column.type_code, lambda pa: pa.string())(pa))
+                      for column in description])
+
+
+def _arrow_column(pa, values, field):
+    if pa.types.is_floating(field.type):
+        # NUMERIC arrives as Decimal
+        values = [None if v is None else float(v) for v in values]
+    elif pa.types.is_string(field.type):
+        values = [None if v is None else str(v) for v in values]
+    return pa.array(values, type=field.type)
+
+
+def _to_parquet(conn, sql, params, out):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow") from None
+    # A named cursor keeps the result on the server and fetches it in chunks
+    with conn.cursor(name="export") as named:
+        named.itersize = EXPORT_CHUNK_ROWS
+        named.execute(sql, params)
+        rows = named.fetchmany(EXPORT_CHUNK_ROWS)
+        schema = _arrow_schema(pa, named.description)
+        with pq.ParquetWriter(out, schema) as writer:
+            while rows:
+                columns = zip(*rows)
+                writer.write_table(pa.Table.from_arrays(
+                    [_arrow_column(pa, values, field) for values, field in zip(columns, schema)], schema=schema))
+                rows = named.fetchmany(EXPORT_CHUNK_ROWS)
+
+
+def export(name, out, fmt="csv", params=None, window=None):
+    """Write the full result of query ``name`` to the binary file object ``out``."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}")
+    sql, params = export_sql(name, params, window)
+    with timed("export", name) as info:
+        if sql is None:
+            df = fetch(name, params, window)
+            if fmt == "csv":
+                out.write(df.to_csv(index=False).encode())
+            else:
+                df.to_parquet(out, index=False)
+            info["rows"] = len(df)
+        else:
+            conn = read_engine().raw_connection()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SET TRANSACTION READ ONLY")
+                    if fmt == "csv":
+                        _to_csv(cur, cur.mogrify(sql, params).decode() if params else sql, out)
+                        info["rows"] = cur.rowcount
+                if fmt == "parquet":
+                    _to_parquet(conn, sql, params, out)
+                conn.rollback()
+            finally:
+                conn.close()
+        info["nbytes"] = out.tell()
+
+
+class ExportTooLarge(Exception):
+    """The export is bigger than the file export_file() was allowed to write."""
+
+
+class _CappedFile:
+    def __init__(self, out, max_bytes):
+        self.out = out
+        self.max_bytes = max_bytes
+
+    def write(self, data):
+        if self.out.tell() + len(data) > self.max_bytes:
+            raise ExportTooLarge(f"export is larger than {self.max_bytes:,} bytes")
+        return self.out.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.out, name)
+
+
+def export_file(name, fmt="csv", params=None, window=None, max_bytes=None):
+    """Export to a temporary file, rewound for reading; kept in memory only while small.
+
+    With ``max_bytes``, stops and raises ExportTooLarge as soon as the file
+    would grow past it.
+    """
+    out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    try:
+        export(name, out if max_bytes is None else _CappedFile(out, max_bytes), fmt, params, window)
+    except BaseException:
+        out.close()
+        raise
+    out.seek(0)
+    return out
+
+
+def export_url(name, fmt="csv", params=None, window=None):
+    """URL of the same export streamed by api.py."""
+    query = [("format", fmt)] + [("param", value) for value in params or ()]
+    if window:
+        query += [("start", f"{window[0]:%Y-%m-%d}"), ("end", f"{window[1] - timedelta(days=1):%Y-%m-%d}")]
+    return f"{EXPORT_API_URL}/api/export/{name}?{urlencode(query)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query", choices=sorted(QUERIES), help="registered query name")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--output", required=True, help="file to write")
+    parser.add_argument("--param", action="append", default=[], help="query parameter, e.g. a city (repeatable)")
+    parser.add_argument("--start", type=date.fromisoformat, help="first day of claims to include")
+    parser.add_argument("--end", type=date.fromisoformat, help="last day of claims to include")
+    args = parser.parse_args()
+
+    window = None
+    if args.start or args.end:
+        start = datetime.combine(args.start or date.min, datetime.min.time())
+        end = datetime.combine(args.end or date.today(), datetime.min.time()) + timedelta(days=1)
+        window = (start, end)
+    with open(args.output, "wb") as out:
+        export(args.query, out, args.format, tuple(args.param) or None, window)
+        size = out.tell()
+    print(f"📤 {args.query} → {args.output} ({size:,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
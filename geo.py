@@ -0,0 +1,228 @@
+"""Proximity search: the receivers nearest to a listing.
+
+Coordinates come from an offline gazetteer (migrations/010_geocoding.sql).
+Load one and geocode the existing rows with:
+
+    python geo.py geocode --gazetteer places.csv
+
+The gazetteer is a CSV file with place, latitude and longitude columns, e.g.
+city centroids exported from GeoNames. Rows added later are geocoded by a
+trigger.
+
+Receivers with coordinates are held in memory in a k-d tree over points on
+the unit sphere, where straight-line distance grows with great-circle
+distance, so "nearest N within R km" visits only a few tree nodes. Receivers
+sharing coordinates (e.g. a city centroid) share one tree point. The index
+is kept current from the foodwaste_listings channel, like matching.py.
+"""
+import argparse
+import heapq
+import io
+import json
+import math
+import threading
+
+import pandas as pd
+
+from db import get_engine, run_query
+from live import CHANNEL as SUMMARY_CHANNEL, ChangeListener
+from matching import CHANNEL
+
+EARTH_RADIUS_KM = 6371.0088
+LEAF_SIZE = 16
+
+_RECEIVERS_SQL = "SELECT receiver_id, name, type, city, latitude, longitude FROM receivers WHERE latitude IS NOT NULL"
+
+NEAREST_COLUMNS = ["receiver_id", "name", "type", "city", "distance_km"]
+
+
+def to_xyz(lat, lon):
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def km_to_chord(km):
+    return 2 * math.sin(min(km, math.pi * EARTH_RADIUS_KM) / (2 * EARTH_RADIUS_KM))
+
+
+class KDTree:
+    """Static 3-d tree over ``(xyz, payload)`` items; rebuilt rather than updated."""
+
+    def __init__(self, items):
+        self.size = len(items)
+        self.root = self._build(list(items), 0)
+
+    def _build(self, items, depth):
+        if len(items) <= LEAF_SIZE:
+            return items
+        axis = depth % 3
+        items.sort(key=lambda item: item[0][axis])
+        mid = len(items) // 2
+        return (axis, items[mid][0][axis], self._build(items[:mid], depth + 1), self._build(items[mid:], depth + 1))
+
+    def nearest(self, target, k, max_chord=2.0):
+        """Up to ``k`` ``(chord, payload)`` pairs within ``max_chord`` of ``target``, nearest first."""
+        heap = []   # max-heap on distance: (-d2, tiebreak, payload)
+        bound = [max_chord * max_chord]
+
+        def visit(node):
+            if isinstance(node, list):
+                for xyz, payload in node:
+                    d2 = (xyz[0] - target[0]) ** 2 + (xyz[1] - target[1]) ** 2 + (xyz[2] - target[2]) ** 2
+                    if d2 <= bound[0]:
+                        heapq.heappush(heap, (-d2, id(payload), payload))
+                        if len(heap) > k:
+                            heapq.heappop(heap)
+                        if len(heap) == k:
+                            bound[0] = min(bound[0], -heap[0][0])
+                return
+            axis, split, left, right = node
+            diff = target[axis] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if diff * diff <= bound[0]:
+                visit(far)
+
+        if k > 0 and self.size:
+            visit(self.root)
+        return [(math.sqrt(-d2), payload) for d2, _, payload in sorted(heap, reverse=True)]
+
+
+class ReceiverLocator(ChangeListener):
+    """Receivers with coordinates, searchable by distance."""
+    channels = (CHANNEL, SUMMARY_CHANNEL)
+    name = "receiver-locator"
+
+    def __init__(self):
+        super().__init__()
+        self.receivers = {}     # receiver_id -> (name, type, city, latitude, longitude)
+        self._tree = (None, None)
+
+    def _reload(self, conn):
+        with conn.cursor() as cur:
+            cur.execute(_RECEIVERS_SQL)
+            receivers = {row[0]: row[1:] for row in cur.fetchall()}
+        with self.lock:
+            self.receivers = receivers
+            self._changed()
+
+    def _apply(self, conn, notifications):
+        if any(n.channel == SUMMARY_CHANNEL and json.loads(n.payload).get("reset") for n in notifications):
+            self._reload(conn)
+            return
+        receiver_ids = {event["id"] for event in (json.loads(n.payload) for n in notifications if n.channel == CHANNEL)
+                        if event["table"] == "receivers"}
+        if not receiver_ids:
+            return
+        with conn.cursor() as cur:
+            cur.execute(_RECEIVERS_SQL + " AND receiver_id = ANY(%s)", (list(receiver_ids),))
+            rows = cur.fetchall()
+        with self.lock:
+            for receiver_id in receiver_ids:
+                self.receivers.pop(receiver_id, None)
+            self.receivers.update((row[0], row[1:]) for row in rows)
+            self._changed()
+
+    def _current_tree(self):
+        # Rebuilt on the first search after a change; call with the lock held
+        version, tree = self._tree
+        if version != self.version:
+            points = {}
+            for receiver_id, (*_, lat, lon) in self.receivers.items():
+                points.setdefault((lat, lon), []).append(receiver_id)
+            tree = KDTree([(to_xyz(lat, lon), ids) for (lat, lon), ids in points.items()])
+            self._tree = (self.version, tree)
+        return tree
+
+    def nearest(self, latitude, longitude, n=10, radius_km=None):
+        """The ``n`` receivers nearest to a point, optionally within ``radius_km``."""
+        max_chord = km_to_chord(radius_km) if radius_km is not None else 2.0
+        with self.lock:
+            # Each point holds at least one receiver, so the n nearest
+            # receivers are among the n nearest points
+            found = self._current_tree().nearest(to_xyz(latitude, longitude), n, max_chord)
+            rows = [(receiver_id, *self.receivers[receiver_id][:3], round(chord_to_km(chord), 2))
+                    for chord, ids in found for receiver_id in sorted(ids)][:n]
+        return pd.DataFrame(rows, columns=NEAREST_COLUMNS)
+
+    def stats(self):
+        with self.lock:
+            return {"receivers": len(self.receivers)}
+
+
+def listing_point(food_id):
+    """A listing's coordinates, or its provider's when the listing has none; None if unknown."""
+    df = run_query(
+        """
+        SELECT COALESCE(f.latitude, p.latitude) AS latitude, COALESCE(f.longitude, p.longitude) AS longitude
+        FROM food_listings f
+        LEFT JOIN providers p ON p.provider_id = f.provider_id
+        WHERE f.food_id = %s
+        """,
+        params=(int(food_id),), name="listing_point",
+    )
+    if df.empty or pd.isna(df.iloc[0]["latitude"]):
+        return None
+    return float(df.iloc[0]["latitude"]), float(df.iloc[0]["longitude"])
+
+
+_locator = None
+_locator_lock = threading.Lock()
+
+
+def get_locator():
+    """Return the process-wide ReceiverLocator, starting its listener on first use."""
+    global _locator
+    if _locator is None:
+        with _locator_lock:
+            if _locator is None:
+                locator = ReceiverLocator()
+                locator.start()
+                _locator = locator
+    return _locator
+
+
+def load_gazetteer(path, overwrite=False):
+    """Replace the gazetteer table with ``path`` and geocode the rows; returns (places, rows_updated)."""
+    df = pd.read_csv(path, usecols=["place", "latitude", "longitude"]).dropna()
+    df["place"] = df["place"].astype(str).str.strip().str.lower()
+    df = df.drop_duplicates("place")
+    df = df[df["latitude"].between(-90, 90) & df["longitude"].between(-180, 180)]
+    conn = get_engine().raw_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL statement_timeout = 0")
+            cur.execute("TRUNCATE gazetteer")
+            buf = io.StringIO()
+            df.to_csv(buf, index=False, header=False)
+            buf.seek(0)
+            cur.copy_expert("COPY gazetteer (place, latitude, longitude) FROM STDIN WITH (FORMAT csv)", buf)
+            cur.execute("SELECT geocode_missing(%s)", (overwrite,))
+            updated = cur.fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(df), updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    geocode_parser = commands.add_parser("geocode", help="load a gazetteer and geocode the tables")
+    geocode_parser.add_argument("--gazetteer", required=True, metavar="CSV", help="place,latitude,longitude file")
+    geocode_parser.add_argument("--overwrite", action="store_true", help="re-geocode rows that have coordinates")
+    args = parser.parse_args()
+
+    places, updated = load_gazetteer(args.gazetteer, args.overwrite)
+    print(f"🗺️ {places:,} places loaded, {updated:,} rows geocoded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Bulk-load the providers, receivers, food listings and claims CSV files.
+
+Usage:
+    python ingest.py --providers providers_data.csv --receivers receivers_data.csv \\
+                     --food-listings food_listings_data.csv --claims claims_data.csv
+
+Replaces the notebook's read_csv() + to_sql(if_exists='append') steps. Each
+file is read in chunks, validated and type-coerced in pandas, streamed into
+a staging table with PostgreSQL COPY, and then moved into the real table
+with one set-based INSERT ... SELECT. Providers and receivers are
+deduplicated by name, as in the notebook.
+
+Loaded rows get new serial ids. The CSV's own Provider_ID, Receiver_ID and
+Food_ID (or, without that column, the row's position in the file) are kept
+in a CSV id -> new id map, and the provider, receiver and food ids in the
+files loaded after it are translated through that map. A duplicate name maps
+to the row that was kept for that name; a child row whose parent was not
+loaded (rejected, or without a name) is rejected as an orphan rather than
+pointed at another row. Ids referring to tables not loaded in the same run
+are taken as existing database ids.
+
+Everything runs in one transaction. Rows that fail validation and orphans
+are skipped and can be written out with --rejects DIR.
+"""
+import argparse
+import io
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from db import clear_query_cache, get_engine, note_write
+
+# Column -> PostgreSQL type, in the order the notebook inserts them
+TABLES = {
+    "providers": {
+        "columns": {"name": "TEXT", "type": "TEXT", "address": "TEXT", "city": "TEXT", "contact": "TEXT"},
+        "id": "provider_id",
+        "dedupe_on": "name",
+    },
+    "receivers": {
+        "columns": {"name": "TEXT", "type": "TEXT", "city": "TEXT", "contact": "TEXT"},
+        "id": "receiver_id",
+        "dedupe_on": "name",
+    },
+    "food_listings": {
+        "columns": {
+            "food_name": "TEXT", "quantity": "INTEGER", "expiry_date": "DATE", "provider_id": "INTEGER",
+            "provider_type": "TEXT", "location": "TEXT", "food_type": "TEXT", "meal_type": "TEXT",
+        },
+        "id": "food_id",
+        "references": {"provider_id": "providers"},
+    },
+    "claims": {
+        "columns": {"food_id": "INTEGER", "receiver_id": "INTEGER", "status": "TEXT", "timestamp": "TIMESTAMP"},
+        "references": {"food_id": "food_listings", "receiver_id": "receivers"},
+    },
+}
+
+CHUNK_SIZE = 100_000
+
+# Formats tried in order: the dataset's own (3/17/2025, 3/5/2025 5:26), then
+# ISO 8601 as the app's forms and exports write it
+DATETIME_FORMATS = {
+    "DATE": ("%m/%d/%Y", "ISO8601"),
+    "TIMESTAMP": ("%m/%d/%Y %H:%M", "%m/%d/%Y %H:%M:%S", "ISO8601"),
+}
+
+
+def clean_chunk(df, table, first_row=None):
+    """Normalise column names and coerce types; return (valid_rows, rejected_mask).
+
+    With ``first_row`` (the chunk's 1-based position in the file), tables
+    with an id also get a ``csv_id`` column: the CSV's own id, or the row's
+    position when the file has no id column.
+    """
+    spec = TABLES[table]
+    columns = spec["columns"]
+    df.columns = df.columns.str.strip().str.lower()
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"{table}: CSV is missing columns {missing}")
+    bad = pd.Series(False, index=df.index)
+    csv_id = None
+    if first_row is not None and spec.get("id"):
+        if spec["id"] in df.columns:
+            raw = df[spec["id"]]
+            number = pd.to_numeric(raw, errors="coerce")
+            csv_id = number.where(number % 1 == 0).astype("Int64")
+            bad |= raw.notna() & csv_id.isna()
+        else:
+            csv_id = pd.Series(range(first_row, first_row + len(df)), index=df.index, dtype="Int64")
+    df = df[list(columns)].copy()
+
+    for column, sql_type in columns.items():
+        raw = df[column]
+        if sql_type == "INTEGER":
+            number = pd.to_numeric(raw, errors="coerce")
+            df[column] = number.where(number % 1 == 0).astype("Int64")
+        elif sql_type in DATETIME_FORMATS:
+            parsed = pd.Series(pd.NaT, index=raw.index, dtype="datetime64[us]")
+            for fmt in DATETIME_FORMATS[sql_type]:
+                parsed = parsed.combine_first(pd.to_datetime(raw, format=fmt, errors="coerce"))
+            df[column] = parsed.dt.date if sql_type == "DATE" else parsed
+        else:
+            df[column] = raw.astype("string").str.strip()
+            continue
+        # A value that was present but could not be parsed rejects the row
+        bad |= raw.notna() & df[column].isna()
+
+    if csv_id is not None:
+        df.insert(0, "csv_id", csv_id)
+    return df[~bad], bad
+
+
+def copy_chunk(cur, stage, df):
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False)
+    buf.seek(0)
+    cur.copy_expert(f"COPY {stage} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+def _copy_out(cur, sql, path):
+    with open(path, "a", newline="") as out:
+        header = out.tell() == 0
+        cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv{', HEADER' if header else ''})", out)
+
+
+def ensure_claims_partitions(cur, stage):
+    """Create the monthly claims partitions the staged claims fall in; return how many were new.
+
+    Without them, claims older or newer than the partitions migrate.py
+    keeps would all land in claims_default. A no-op before migration 008.
+    """
+    cur.execute("SELECT to_regproc('ensure_claims_partitions') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return 0
+    cur.execute(f'SELECT min("timestamp")::date, max("timestamp")::date + 1 FROM {stage}')
+    first, last = cur.fetchone()
+    if first is None:
+        return 0
+    # The function switches claims_default's triggers back on after moving
+    # rows; keep every partition's off again if the load turned them off
+    cur.execute("SELECT bool_or(tgenabled = 'D') FROM pg_trigger "
+                "WHERE tgrelid = 'claims_default'::regclass AND NOT tgisinternal")
+    triggers_off = cur.fetchone()[0]
+    cur.execute("SELECT ensure_claims_partitions(%s, %s)", (first, last))
+    created = cur.fetchone()[0]
+    if triggers_off:
+        cur.execute("ALTER TABLE claims DISABLE TRIGGER USER")
+    return created
+
+
+def load_table(cur, table, path, chunk_size, rejects_dir=None, loaded=()):
+    """Stream one CSV into its table; return (rows_read, rows_rejected, rows_inserted).
+
+    ``loaded`` names the tables already loaded in this transaction, whose
+    CSV id -> new id maps (temp tables ids_<table>) translate this file's
+    foreign keys.
+    """
+    spec = TABLES[table]
+    columns = spec["columns"]
+    id_column = spec.get("id")
+    stage = f"stage_{table}"
+    column_defs = ", ".join(f"{name} {sql_type}" for name, sql_type in columns.items())
+    # row_no preserves the CSV order through the set-based insert below
+    cur.execute(f"CREATE TEMP TABLE {stage} (row_no BIGSERIAL, {'csv_id INTEGER, ' if id_column else ''}"
+                f"{column_defs}) ON COMMIT DROP")
+
+    rows_read = rows_rejected = 0
+    rejects_path = Path(rejects_dir) / f"{table}_rejects.csv" if rejects_dir else None
+    for chunk in pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=True):
+        valid, rejected = clean_chunk(chunk.copy(), table, first_row=rows_read + 1)
+        rows_read += len(chunk)
+        if rejected.any():
+            rows_rejected += int(rejected.sum())
+            if rejects_path:
+                chunk[rejected].to_csv(rejects_path, mode="a", index=False, header=not rejects_path.exists())
+        if len(valid):
+            copy_chunk(cur, stage, valid)
+    if table == "claims":
+        ensure_claims_partitions(cur, stage)
+
+    # Foreign keys into tables loaded in this run go through their id maps
+    select, joins, orphan = [], [], []
+    for column in columns:
+        parent = spec.get("references", {}).get(column)
+        if parent in loaded:
+            joins.append(f"LEFT JOIN ids_{parent} m_{column} ON m_{column}.csv_id = s.{column}")
+            orphan.append(f"(s.{column} IS NOT NULL AND m_{column}.id IS NULL)")
+            select.append(f"m_{column}.id AS {column}")
+        else:
+            select.append(f"s.{column}")
+    source = f"{stage} s {' '.join(joins)}"
+    if orphan:
+        orphans = " OR ".join(orphan)
+        cur.execute(f"SELECT count(*) FROM {source} WHERE {orphans}")
+        rows_rejected += cur.fetchone()[0]
+        if rejects_path:
+            _copy_out(cur, f"SELECT s.* FROM {source} WHERE {orphans} ORDER BY s.row_no",
+                      Path(rejects_dir) / f"{table}_orphans.csv")
+        source = f"(SELECT s.row_no{', s.csv_id' if id_column else ''}, {', '.join(select)} " \
+                 f"FROM {source} WHERE NOT ({orphans})) AS s"
+
+    column_list = ", ".join(columns)
+    dedupe_on = spec.get("dedupe_on")
+    if dedupe_on:
+        # First occurrence of each name, skipping names already in the table
+        kept = f"""
+            SELECT * FROM (
+                SELECT DISTINCT ON ({dedupe_on}) *
+                FROM {source}
+                WHERE {dedupe_on} IS NOT NULL
+                ORDER BY {dedupe_on}, row_no
+            ) AS d
+            WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{dedupe_on} = d.{dedupe_on})
+        """
+    else:
+        kept = f"SELECT * FROM {source}"
+    if not id_column:
+        cur.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM ({kept}) AS k ORDER BY row_no")
+        return rows_read, rows_rejected, cur.rowcount
+
+    # Ids are drawn from the table's own sequence up front so that each
+    # staged row knows the id it was inserted with
+    cur.execute("SELECT pg_get_serial_sequence(%s, %s)", (table, id_column))
+    sequence = cur.fetchone()[0]
+    if sequence is None:
+        raise ValueError(f"{table}.{id_column} has no sequence to draw new ids from")
+    cur.execute(f"""
+        CREATE TEMP TABLE kept_{table} ON COMMIT DROP AS
+        SELECT nextval(%s) AS new_id, o.*
+        FROM (SELECT * FROM ({kept}) AS k ORDER BY row_no) AS o
+    """, (sequence,))
+    cur.execute(f"""
+        INSERT INTO {table} ({id_column}, {column_list})
+        SELECT new_id, {column_list} FROM kept_{table} ORDER BY new_id
+    """)
+    inserted = cur.rowcount
+
+    cur.execute(f"CREATE TEMP TABLE ids_{table} (csv_id INTEGER PRIMARY KEY, id INTEGER NOT NULL) ON COMMIT DROP")
+    if dedupe_on:
+        # Every named row maps to the row kept for its name, new or existing
+        cur.execute(f"""
+            INSERT INTO ids_{table} (csv_id, id)
+            SELECT DISTINCT ON (s.csv_id) s.csv_id, t.{id_column}
+            FROM {source}
+            JOIN {table} t ON t.{dedupe_on} = s.{dedupe_on}
+            WHERE s.csv_id IS NOT NULL
+            ORDER BY s.csv_id, t.{id_column}
+        """)
+    else:
+        cur.execute(f"""
+            INSERT INTO ids_{table} (csv_id, id)
+            SELECT DISTINCT ON (csv_id) csv_id, new_id
+            FROM kept_{table}
+            WHERE csv_id IS NOT NULL
+            ORDER BY csv_id, row_no
+        """)
+    return rows_read, rows_rejected, inserted
+
+
+def ingest(files, chunk_size=CHUNK_SIZE, rejects_dir=None):
+    """Load ``{table: csv_path}`` in dependency order inside one transaction."""
+    conn = get_engine().raw_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL statement_timeout = 0")
+            cur.execute("SELECT to_regproc('refresh_summary_tables') IS NOT NULL")
+            has_summaries = cur.fetchone()[0]
+            loaded = set()
+            for table in TABLES:
+                path = files.get(table)
+                if not path:
+                    continue
+                # Per-row summary triggers would dominate a bulk load; the
+                # summary tables are rebuilt once at the end instead
+                if has_summaries:
+                    cur.execute(f"ALTER TABLE {table} DISABLE TRIGGER USER")
+                start = time.perf_counter()
+                read, rejected, inserted = load_table(cur, table, path, chunk_size, rejects_dir, loaded)
+                loaded.add(table)
+                elapsed = time.perf_counter() - start
+                if has_summaries:
+                    cur.execute(f"ALTER TABLE {table} ENABLE TRIGGER USER")
+                print(f"📥 {table}: {read:,} read, {rejected:,} rejected, {inserted:,} inserted "
+                      f"in {elapsed:.1f}s ({read / elapsed if elapsed else 0:,.0f} rows/s)")
+            # Rows loaded with the triggers off still need their coordinates
+            cur.execute("SELECT to_regproc('geocode_missing') IS NOT NULL")
+            if cur.fetchone()[0]:
+                cur.execute("SELECT geocode_missing()")
+            if has_summaries:
+                start = time.perf_counter()
+                cur.execute("SELECT refresh_summary_tables()")
+                print(f"🔄 Summary tables rebuilt in {time.perf_counter() - start:.1f}s")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    note_write()
+    clear_query_cache()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for table in TABLES:
+        parser.add_argument(f"--{table.replace('_', '-')}", dest=table, metavar="CSV")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per CSV chunk")
+    parser.add_argument("--rejects", metavar="DIR", help="write rows that fail validation to DIR/<table>_rejects.csv")
+    args = parser.parse_args()
+
+    files = {table: getattr(args, table) for table in TABLES if getattr(args, table)}
+    if not files:
+        parser.error("give at least one CSV file")
+    if args.rejects:
+        Path(args.rejects).mkdir(parents=True, exist_ok=True)
+    ingest(files, chunk_size=args.chunk_size, rejects_dir=args.rejects)
+
+
+if __name__ == "__main__":
+    main()
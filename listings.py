@@ -0,0 +1,278 @@
+import pandas as pd
+
+from db import get_engine, run_query, transaction
+from ingest import clean_chunk
+from metrics import timed
+
+LISTING_COLUMNS = [
+    "food_id", "food_name", "quantity", "expiry_date", "provider_id",
+    "provider_type", "location", "food_type", "meal_type",
+]
+
+# Seed values for generated data; the forms read theirs from dimensions.py
+FOOD_TYPES = ["Vegetarian", "Non-Vegetarian", "Vegan"]
+MEAL_TYPES = ["Breakfast", "Lunch", "Dinner", "Snacks"]
+
+# Sort label -> key expression. Listings without an expiry date sort last;
+# the expression matches the index in migrations/004_listing_pagination.sql.
+SORT_KEYS = {
+    "Food ID": "food_id",
+    "Expiry Date": "COALESCE(expiry_date, DATE '9999-12-31')",
+}
+
+
+def fetch_listings_page(columns=None, location=None, food_type=None, meal_type=None,
+                        expires_before=None, sort="Food ID", cursor=None, page_size=50):
+    """Fetch one page of food listings using keyset pagination.
+
+    ``cursor`` is the value returned for the previous page (None for the first
+    page). Returns ``(df, next_cursor)``; ``next_cursor`` is None on the last
+    page. Only the requested columns are read, and the filters and sort run in
+    PostgreSQL, so each page costs the same no matter how large the table is.
+    """
+    columns = [c for c in (columns or LISTING_COLUMNS) if c in LISTING_COLUMNS]
+    if "food_id" not in columns:
+        columns.insert(0, "food_id")
+    sort_key = SORT_KEYS[sort]
+
+    where, params = [], []
+    if location:
+        where.append("location = %s")
+        params.append(location)
+    if food_type:
+        where.append("food_type = %s")
+        params.append(food_type)
+    if meal_type:
+        where.append("meal_type = %s")
+        params.append(meal_type)
+    if expires_before:
+        where.append("expiry_date <= %s")
+        params.append(expires_before)
+    if cursor is not None:
+        if sort_key == "food_id":
+            where.append("food_id > %s")
+            params.append(cursor[1])
+        else:
+            where.append(f"({sort_key}, food_id) > (%s, %s)")
+            params.extend(cursor)
+    order_by = "food_id" if sort_key == "food_id" else f"{sort_key}, food_id"
+
+    sql = f"""
+        SELECT {', '.join(columns)}, {sort_key} AS sort_key
+        FROM food_listings
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY {order_by}
+        LIMIT %s;
+    """
+    # One extra row tells us whether there is a next page
+    df = run_query(sql, params=tuple(params) + (page_size + 1,), name="listings_page")
+
+    next_cursor = None
+    if len(df) > page_size:
+        df = df.head(page_size)
+        last = df.iloc[-1]
+        sort_value = last["sort_key"]
+        if hasattr(sort_value, "item"):
+            sort_value = sort_value.item()  # numpy scalar -> Python value for psycopg2
+        next_cursor = (sort_value, int(last["food_id"]))
+    return df.drop(columns="sort_key"), next_cursor
+
+
+def listing_version(food_id):
+    """Current (quantity, version) of one listing, read uncached; None if it does not exist."""
+    with timed("query", "listing_version") as info, get_engine().connect() as conn:
+        row = conn.exec_driver_sql(
+            "SELECT quantity, version FROM food_listings WHERE food_id = %s", (food_id,)).first()
+        info.update(rows=int(row is not None))
+    return row
+
+
+def listing_versions(food_ids):
+    """Current quantity and version of many listings, read uncached; ids that do not exist are left out."""
+    with timed("query", "listing_versions") as info, get_engine().connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT food_id, quantity, version FROM food_listings WHERE food_id = ANY(%s) ORDER BY food_id",
+            ([int(v) for v in food_ids],),
+        ).all()
+        info.update(rows=len(rows))
+    return pd.DataFrame(rows, columns=["food_id", "quantity", "version"])
+
+
+def update_quantity(food_id, quantity, expected_version):
+    """Set a listing's quantity unless it changed since ``expected_version`` was read.
+
+    Returns True on success. False means someone else (e.g. a claim) updated
+    the listing in between, or it was deleted; the caller should re-read it.
+    """
+    with transaction("update_quantity") as conn:
+        updated = conn.exec_driver_sql(
+            "UPDATE food_listings SET quantity = %s WHERE food_id = %s AND version = %s",
+            (quantity, food_id, expected_version),
+        ).rowcount
+    return updated == 1
+
+
+def delete_listing(food_id):
+    """Delete one listing. Returns "deleted", "not_found", or "has_claims" for a listing claims refer to."""
+    with transaction("delete_listing") as conn:
+        deleted = conn.exec_driver_sql(
+            """
+            DELETE FROM food_listings f
+            WHERE f.food_id = %s AND NOT EXISTS (SELECT 1 FROM claims c WHERE c.food_id = f.food_id)
+            """,
+            (food_id,),
+        ).rowcount
+        if deleted:
+            return "deleted"
+        exists = conn.exec_driver_sql("SELECT 1 FROM food_listings WHERE food_id = %s", (food_id,)).first()
+    return "has_claims" if exists else "not_found"
+
+
+# Bulk operations ------------------------------------------------------------
+#
+# Each operation validates every row up front, writes all valid rows with a
+# single set-based statement in one transaction, and returns one result row
+# per input row so operators can see exactly which lines failed and why.
+
+NEW_LISTING_COLUMNS = LISTING_COLUMNS[1:]
+
+
+def _result(rows, status, food_ids=None, errors=None):
+    return pd.DataFrame({
+        "row": rows,
+        "status": status,
+        "food_id": food_ids if food_ids is not None else [None] * len(rows),
+        "error": errors if errors is not None else [""] * len(rows),
+    })
+
+
+def _values(series):
+    """Series -> list with None for missing values and plain Python scalars."""
+    return [None if pd.isna(v) else (v.item() if hasattr(v, "item") else v) for v in series]
+
+
+def bulk_add_listings(df):
+    """Insert many listings (CSV columns as in food_listings) in one transaction."""
+    df = df.reset_index(drop=True)
+    valid, rejected = clean_chunk(df.copy(), "food_listings")
+    rows = pd.Series(range(1, len(df) + 1))
+    errors = pd.Series("", index=df.index)
+    errors[rejected] = "unparseable quantity, provider_id or expiry_date"
+
+    food_name = valid["food_name"].reindex(df.index)
+    quantity = valid["quantity"].reindex(df.index)
+    provider_id = valid["provider_id"].reindex(df.index)
+    checks = [
+        (food_name.isna() | (food_name == ""), "food_name is required"),
+        (quantity.isna() | (quantity < 1), "quantity must be at least 1"),
+        (provider_id.isna(), "provider_id is required"),
+    ]
+    for failed, message in checks:
+        errors[(errors == "") & failed.fillna(True).astype(bool)] = message
+
+    candidates = valid[errors[valid.index] == ""]
+    results = []
+    if len(candidates):
+        with transaction("bulk_add") as conn:
+            known = set(conn.exec_driver_sql(
+                "SELECT provider_id FROM providers WHERE provider_id = ANY(%s)",
+                (_values(candidates["provider_id"].drop_duplicates()),),
+            ).scalars())
+            unknown = ~candidates["provider_id"].isin(known)
+            errors[candidates.index[unknown.to_numpy()]] = "unknown provider_id"
+            candidates = candidates[~unknown]
+
+            if len(candidates):
+                # RETURNING yields the new ids in the order the UNNEST rows were inserted
+                food_ids = conn.exec_driver_sql(
+                    f"""
+                    INSERT INTO food_listings ({', '.join(NEW_LISTING_COLUMNS)})
+                    SELECT * FROM UNNEST(%s::text[], %s::int[], %s::date[], %s::int[],
+                                         %s::text[], %s::text[], %s::text[], %s::text[])
+                    RETURNING food_id
+                    """,
+                    tuple(_values(candidates[column]) for column in NEW_LISTING_COLUMNS),
+                ).scalars().all()
+                results.append(_result(list(rows[candidates.index]), "added", food_ids=food_ids))
+
+    failed = errors != ""
+    results.append(_result(list(rows[failed]), "error", errors=list(errors[failed])))
+    return pd.concat(results, ignore_index=True).sort_values("row", ignore_index=True)
+
+
+def bulk_update_quantities(df):
+    """Set ``quantity`` for many ``food_id`` values in one UPDATE.
+
+    Each row also carries the ``version`` of the listing that was read
+    before editing it (see listing_versions()). A row is only applied if the
+    listing still has that version. Rows for listings that changed in the
+    meantime, e.g. because they were claimed, are reported with the current
+    quantity instead of overwriting it.
+    """
+    df = df.reset_index(drop=True)
+    rows = pd.Series(range(1, len(df) + 1))
+    food_id = pd.to_numeric(df["food_id"], errors="coerce")
+    quantity = pd.to_numeric(df["quantity"], errors="coerce")
+    version = pd.to_numeric(df.get("version", pd.Series(index=df.index, dtype=float)), errors="coerce")
+    errors = pd.Series("", index=df.index)
+    errors[food_id.isna() | (food_id % 1 != 0)] = "food_id must be a whole number"
+    errors[(errors == "") & (quantity.isna() | (quantity < 1) | (quantity % 1 != 0))] = "quantity must be a whole number of at least 1"
+    errors[(errors == "") & (version.isna() | (version % 1 != 0))] = "version of the listing as read is required"
+    errors[(errors == "") & food_id.duplicated(keep="last")] = "food_id repeated later in the batch"
+
+    ok = errors == ""
+    updated, current = set(), {}
+    if ok.any():
+        with transaction("bulk_update") as conn:
+            updated = set(conn.exec_driver_sql(
+                """
+                UPDATE food_listings f
+                SET quantity = u.quantity
+                FROM UNNEST(%s::int[], %s::int[], %s::int[]) AS u(food_id, quantity, version)
+                WHERE f.food_id = u.food_id AND f.version = u.version
+                RETURNING f.food_id
+                """,
+                ([int(v) for v in food_id[ok]], [int(v) for v in quantity[ok]], [int(v) for v in version[ok]]),
+            ).scalars())
+            missed = [int(v) for v in food_id[ok] if int(v) not in updated]
+            if missed:
+                current = dict(conn.exec_driver_sql(
+                    "SELECT food_id, quantity FROM food_listings WHERE food_id = ANY(%s)", (missed,)).all())
+    for i in food_id.index[ok & ~food_id.isin(updated)]:
+        food = int(food_id[i])
+        errors[i] = (f"listing changed since it was read (now {current[food]} left)" if food in current
+                     else "food_id not found")
+
+    done = errors == ""
+    failed = ~done
+    return pd.concat([
+        _result(list(rows[done]), "updated", food_ids=[int(v) for v in food_id[done]]),
+        _result(list(rows[failed]), "error", food_ids=_values(food_id[failed]), errors=list(errors[failed])),
+    ], ignore_index=True).sort_values("row", ignore_index=True)
+
+
+def bulk_delete_listings(food_ids):
+    """Delete a list of food_ids in one statement; report ids that did not exist or have claims."""
+    rows = list(range(1, len(food_ids) + 1))
+    ids = [int(v) for v in food_ids]
+    with transaction("bulk_delete") as conn:
+        # Claims keep their listing, so listings with claims are left alone
+        deleted = set(conn.exec_driver_sql(
+            """
+            DELETE FROM food_listings f
+            WHERE f.food_id = ANY(%s) AND NOT EXISTS (SELECT 1 FROM claims c WHERE c.food_id = f.food_id)
+            RETURNING f.food_id
+            """,
+            (ids,),
+        ).scalars())
+        kept = set(conn.exec_driver_sql(
+            "SELECT food_id FROM food_listings WHERE food_id = ANY(%s)", ([v for v in ids if v not in deleted],)
+        ).scalars())
+    errors = ["" if food_id in deleted else "listing has claims" if food_id in kept else "food_id not found"
+              for food_id in ids]
+    return _result(
+        rows,
+        ["deleted" if error == "" else "error" for error in errors],
+        food_ids=ids,
+        errors=errors,
+    )
@@ -0,0 +1,240 @@
+"""In-memory dashboard aggregates kept current by the PostgreSQL change feed.
+
+A background thread LISTENs on the foodwaste_changes channel (see
+migrations/005_change_feed.sql), loads the aggregates once and then applies
+each notification as a delta: totals by provider type, claim status counts
+and the quantity claimed per receiver. Pages read the aggregates from
+memory, so showing the latest numbers costs no queries at all.
+
+The feed needs nothing but the app's own PostgreSQL database. If the
+connection drops, the thread reconnects and reloads.
+"""
+import heapq
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+import pandas as pd
+
+from db import get_engine, run_query
+from metrics import timed
+
+logger = logging.getLogger("foodwaste.live")
+
+CHANNEL = "foodwaste_changes"
+LIVE_UPDATES = os.getenv("LIVE_UPDATES", "1").lower() not in ("0", "false", "no")
+LIVE_REFRESH_SECONDS = float(os.getenv("LIVE_REFRESH_SECONDS", "5"))
+LIVE_RETRY_SECONDS = 10
+TOP_RECEIVERS = 10
+
+
+def _parse_snapshot(text):
+    """'xmin:xmax:xip,...' from txid_current_snapshot() -> (xmin, xmax, in_progress)."""
+    xmin, xmax, xip = text.split(":")
+    return int(xmin), int(xmax), {int(x) for x in xip.split(",") if x}
+
+
+def _visible(xid, snapshot):
+    # True if the transaction had committed when the snapshot was taken
+    xmin, xmax, in_progress = snapshot
+    return xid < xmin or (xid < xmax and xid not in in_progress)
+
+
+class ChangeListener:
+    """Background LISTEN loop shared by the in-memory indexes.
+
+    Subclasses load their state in ``_reload(conn)`` and apply each batch of
+    notifications in ``_apply(conn, notifications)``. The thread reconnects
+    and reloads whenever the connection is lost.
+    """
+    channels = ()
+    name = "change-listener"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.updated_at = None
+        self.connected = False
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _reload(self, conn):
+        raise NotImplementedError
+
+    def _apply(self, conn, notifications):
+        raise NotImplementedError
+
+    def _changed(self):
+        self.version += 1
+        self.updated_at = time.time()
+
+    def _run(self):
+        while not self._stop.is_set():
+            fairy = None
+            try:
+                # A dedicated connection: LISTEN keeps it busy for the life of the thread
+                fairy = get_engine().raw_connection()
+                fairy.detach()
+                conn = getattr(fairy, "dbapi_connection", None) or fairy.connection
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    for channel in self.channels:
+                        cur.execute(f"LISTEN {channel}")
+                self._reload(conn)
+                self.connected, self.error = True, None
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    notifications = list(conn.notifies)
+                    conn.notifies.clear()
+                    if notifications:
+                        with timed("feed", self.name) as info:
+                            self._apply(conn, notifications)
+                            info["rows"] = len(notifications)
+            except Exception as e:
+                self.connected, self.error = False, str(e)
+                logger.warning("%s interrupted, retrying in %ss: %s", self.name, LIVE_RETRY_SECONDS, e)
+                self._stop.wait(LIVE_RETRY_SECONDS)
+            finally:
+                if fairy is not None:
+                    fairy.close()
+
+
+class LiveAggregates(ChangeListener):
+    """Dashboard aggregates held in memory and updated from the change feed."""
+    channels = (CHANNEL,)
+    name = "live-aggregates"
+
+    def __init__(self):
+        super().__init__()
+        self.listings = {}      # (dimension, value) -> [listing_count, total_quantity]
+        self.statuses = {}      # status -> total
+        self.receivers = {}     # receiver_id -> [completed_claims, completed_quantity]
+        self.snapshot = None
+        self.changes_applied = 0
+        self._frames = (None, None)
+
+    # Loading and applying changes ------------------------------------------
+
+    def _reload(self, conn):
+        with conn.cursor() as cur:
+            # One snapshot for the aggregates and for deciding which
+            # notifications they already include
+            cur.execute("BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            cur.execute("SELECT txid_current_snapshot()::text")
+            snapshot = _parse_snapshot(cur.fetchone()[0])
+            cur.execute("""
+                SELECT dimension, value, listing_count, total_quantity
+                FROM listing_summary
+                WHERE dimension IN ('provider_type', 'total')
+            """)
+            listings = {(d, v): [count, qty] for d, v, count, qty in cur.fetchall()}
+            cur.execute("SELECT status, total FROM claim_status_summary")
+            statuses = dict(cur.fetchall())
+            cur.execute("SELECT receiver_id, completed_claims, completed_quantity FROM receiver_claim_summary")
+            receivers = {rid: [claims, qty] for rid, claims, qty in cur.fetchall()}
+            cur.execute("COMMIT")
+        with self.lock:
+            self.listings, self.statuses, self.receivers = listings, statuses, receivers
+            self.snapshot = snapshot
+            self._changed()
+
+    def _apply(self, conn, notifications):
+        events = [json.loads(n.payload) for n in notifications]
+        if any(e.get("reset") for e in events):
+            # refresh_summary_tables() ran: start over from a fresh snapshot
+            self._reload(conn)
+            events = [e for e in events if not e.get("reset")]
+        with self.lock:
+            applied = 0
+            for event in events:
+                if _visible(event["xid"], self.snapshot):
+                    continue
+                delta = event["delta"]
+                if event["table"] == "listing_summary":
+                    key = tuple(event["key"])
+                    if key[0] not in ("provider_type", "total"):
+                        continue
+                    row = self.listings.setdefault(key, [0, 0])
+                    row[0] += delta["listing_count"]
+                    row[1] += delta["total_quantity"]
+                elif event["table"] == "claim_status_summary":
+                    self.statuses[event["key"]] = self.statuses.get(event["key"], 0) + delta["total"]
+                elif event["table"] == "receiver_claim_summary":
+                    row = self.receivers.setdefault(event["key"], [0, 0])
+                    row[0] += delta["completed_claims"]
+                    row[1] += delta["completed_quantity"]
+                applied += 1
+            if applied:
+                self.changes_applied += applied
+                self._changed()
+
+    # Reading ---------------------------------------------------------------
+
+    def frames(self):
+        """Current aggregates as DataFrames; rebuilt only after a change."""
+        with self.lock:
+            version, frames = self._frames
+            if version == self.version:
+                return frames
+            provider_types = pd.DataFrame(
+                [(value, count, qty) for (dim, value), (count, qty) in self.listings.items()
+                 if dim == "provider_type" and count > 0],
+                columns=["provider_type", "listing_count", "total_quantity"],
+            ).sort_values("total_quantity", ascending=False, ignore_index=True)
+            total = self.listings.get(("total", "all"), [0, 0])
+            statuses = pd.DataFrame([(s, n) for s, n in self.statuses.items() if n > 0], columns=["status", "total"])
+            statuses = statuses.sort_values("total", ascending=False, ignore_index=True)
+            statuses["percentage"] = (100.0 * statuses["total"] / statuses["total"].sum()).round(2)
+            top = heapq.nlargest(TOP_RECEIVERS, ((rid, claims, qty) for rid, (claims, qty) in self.receivers.items()
+                                                 if claims > 0), key=lambda r: r[2])
+            frames = {
+                "total_listings": total[0],
+                "total_quantity": total[1],
+                "provider_types": provider_types,
+                "statuses": statuses,
+                "top_receivers": pd.DataFrame(top, columns=["receiver_id", "completed_claims", "total_claimed_quantity"]),
+                "updated_at": self.updated_at,
+                "changes_applied": self.changes_applied,
+            }
+            self._frames = (self.version, frames)
+            return frames
+
+
+def top_receivers_with_names(df):
+    """Add receiver name and city to the top receivers frame."""
+    if df.empty:
+        return df.assign(receiver_name=[], city=[])
+    names = run_query(
+        "SELECT receiver_id, name AS receiver_name, city FROM receivers WHERE receiver_id = ANY(%s)",
+        params=(sorted(int(v) for v in df["receiver_id"]),), name="live_receiver_names",
+    )
+    return df.merge(names, on="receiver_id", how="left")[
+        ["receiver_name", "city", "completed_claims", "total_claimed_quantity"]]
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_feed():
+    """Return the process-wide LiveAggregates, starting its listener on first use."""
+    global _feed
+    if _feed is None:
+        with _feed_lock:
+            if _feed is None:
+                feed = LiveAggregates()
+                feed.start()
+                _feed = feed
+    return _feed
@@ -0,0 +1,191 @@
+"""Expiry-ordered index of open food listings, for matching receivers to food.
+
+A listing is open while it has quantity left and has not expired, the same
+rule claims.claim_first_available() uses: claims take their quantity off
+the listing, so one completed claim does not use up the rest. The index
+keeps, per location, the open listings sorted by expiry date (listings
+without one sort last, as on Manage Listings). It also keeps each
+receiver's city. Finding the food that expires soonest near a
+receiver is then a binary search plus a short walk, with no database round
+trip.
+
+The index is loaded once and then kept current from the foodwaste_listings
+channel (migrations/006_listing_feed.sql). Each notification names a changed
+listing or receiver, and only those rows are re-read.
+"""
+import json
+import threading
+from bisect import bisect_left, insort
+from datetime import date
+
+import pandas as pd
+
+from live import CHANNEL as SUMMARY_CHANNEL, ChangeListener
+
+CHANNEL = "foodwaste_listings"
+NO_EXPIRY = date.max
+
+_OPEN_LISTINGS_SQL = """
+    SELECT f.food_id, f.food_name, f.quantity, f.expiry_date, f.provider_id,
+           f.location, f.food_type, f.meal_type
+    FROM food_listings f
+    WHERE f.quantity > 0
+      AND (f.expiry_date IS NULL OR f.expiry_date >= CURRENT_DATE)
+"""
+
+MATCH_COLUMNS = ["food_id", "food_name", "quantity", "expiry_date", "days_left", "location",
+                 "food_type", "meal_type", "provider_id"]
+
+
+class Listing:
+    __slots__ = ("food_id", "food_name", "quantity", "expiry_date", "provider_id", "location",
+                 "food_type", "meal_type")
+
+    def __init__(self, food_id, food_name, quantity, expiry_date, provider_id, location, food_type, meal_type):
+        self.food_id = food_id
+        self.food_name = food_name
+        self.quantity = quantity
+        self.expiry_date = expiry_date or NO_EXPIRY
+        self.provider_id = provider_id
+        self.location = location
+        self.food_type = food_type
+        self.meal_type = meal_type
+
+    @property
+    def key(self):
+        return (self.expiry_date, self.food_id)
+
+
+class ListingIndex(ChangeListener):
+    """Open listings by location in expiry order, plus receiver cities."""
+    # The summary channel only matters for its 'reset' message after bulk
+    # loads, which bypass the row triggers
+    channels = (CHANNEL, SUMMARY_CHANNEL)
+    name = "listing-index"
+
+    def __init__(self):
+        super().__init__()
+        self.listings = {}          # food_id -> Listing
+        self.by_location = {}       # location -> sorted [(expiry_date, food_id)]
+        self.everywhere = []        # every open listing, sorted the same way
+        self.receiver_city = {}     # receiver_id -> city
+
+    # Loading and applying changes ------------------------------------------
+
+    def _reload(self, conn):
+        with conn.cursor() as cur:
+            cur.execute(_OPEN_LISTINGS_SQL)
+            listings = {row[0]: Listing(*row) for row in cur.fetchall()}
+            cur.execute("SELECT receiver_id, city FROM receivers")
+            receiver_city = dict(cur.fetchall())
+        by_location = {}
+        for listing in listings.values():
+            by_location.setdefault(listing.location, []).append(listing.key)
+        for keys in by_location.values():
+            keys.sort()
+        everywhere = sorted(listing.key for listing in listings.values())
+        with self.lock:
+            self.listings, self.by_location, self.everywhere = listings, by_location, everywhere
+            self.receiver_city = receiver_city
+            self._changed()
+
+    def _remove(self, food_id):
+        listing = self.listings.pop(food_id, None)
+        if listing is None:
+            return
+        for keys in (self.by_location.get(listing.location, []), self.everywhere):
+            i = bisect_left(keys, listing.key)
+            if i < len(keys) and keys[i] == listing.key:
+                del keys[i]
+
+    def _add(self, listing):
+        self.listings[listing.food_id] = listing
+        insort(self.by_location.setdefault(listing.location, []), listing.key)
+        insort(self.everywhere, listing.key)
+
+    def _apply(self, conn, notifications):
+        if any(n.channel == SUMMARY_CHANNEL and json.loads(n.payload).get("reset") for n in notifications):
+            self._reload(conn)
+            return
+        food_ids, receiver_ids = set(), set()
+        for n in notifications:
+            if n.channel != CHANNEL:
+                continue
+            event = json.loads(n.payload)
+            (receiver_ids if event["table"] == "receivers" else food_ids).add(event["id"])
+
+        with conn.cursor() as cur:
+            rows, receivers = [], []
+            if food_ids:
+                cur.execute(_OPEN_LISTINGS_SQL + " AND f.food_id = ANY(%s)", (list(food_ids),))
+                rows = cur.fetchall()
+            if receiver_ids:
+                cur.execute("SELECT receiver_id, city FROM receivers WHERE receiver_id = ANY(%s)",
+                            (list(receiver_ids),))
+                receivers = cur.fetchall()
+
+        with self.lock:
+            # Re-reading the rows makes every change idempotent: whatever
+            # happened, the index ends up matching the table
+            for food_id in food_ids:
+                self._remove(food_id)
+            for row in rows:
+                self._add(Listing(*row))
+            for receiver_id in receiver_ids:
+                self.receiver_city.pop(receiver_id, None)
+            self.receiver_city.update(receivers)
+            self._changed()
+
+    # Matching --------------------------------------------------------------
+
+    def match(self, receiver_id, food_type=None, meal_type=None, min_quantity=1, within_days=None,
+              anywhere=False, limit=20):
+        """Open listings for a receiver, soonest expiry first.
+
+        Searches the receiver's city unless ``anywhere`` is set. Returns
+        ``(df, city)``. ``city`` is None for an unknown receiver.
+        """
+        today = date.today()
+        with self.lock:
+            city = self.receiver_city.get(receiver_id)
+            if city is None and not anywhere:
+                return pd.DataFrame(columns=MATCH_COLUMNS), None
+            keys = self.everywhere if anywhere else self.by_location.get(city, [])
+            matches = []
+            # Listings expired since they were indexed are skipped, not removed
+            for expiry_date, food_id in keys[bisect_left(keys, (today, 0)):]:
+                if within_days is not None and (expiry_date - today).days > within_days:
+                    break
+                listing = self.listings[food_id]
+                if ((food_type and listing.food_type != food_type)
+                        or (meal_type and listing.meal_type != meal_type)
+                        or listing.quantity < min_quantity):
+                    continue
+                matches.append(listing)
+                if len(matches) >= limit:
+                    break
+        rows = [(m.food_id, m.food_name, m.quantity, None if m.expiry_date == NO_EXPIRY else m.expiry_date,
+                 None if m.expiry_date == NO_EXPIRY else (m.expiry_date - today).days,
+                 m.location, m.food_type, m.meal_type, m.provider_id) for m in matches]
+        return pd.DataFrame(rows, columns=MATCH_COLUMNS), city
+
+    def stats(self):
+        with self.lock:
+            return {"open_listings": len(self.listings), "locations": len(self.by_location),
+                    "receivers": len(self.receiver_city)}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Return the process-wide ListingIndex, starting its listener on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = ListingIndex()
+                index.start()
+                _index = index
+    return _index
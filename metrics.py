@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger("foodwaste.metrics")
+
+# Thresholds (ms) above which a query, write or chart render is logged as slow
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_CHART_MS = float(os.getenv("SLOW_CHART_MS", "300"))
+SLOW_THRESHOLDS = {"query": SLOW_QUERY_MS, "write": SLOW_QUERY_MS, "chart": SLOW_CHART_MS}
+# Log every event as one JSON line, not only the slow ones
+METRICS_LOG_ALL = os.getenv("METRICS_LOG_ALL", "").lower() in ("1", "true", "yes")
+RECENT_EVENTS = int(os.getenv("METRICS_RECENT_EVENTS", "500"))
+
+
+class Metrics:
+    """Process-wide timings for database calls and chart renders.
+
+    Keeps running totals per (kind, name) plus the most recent events, and
+    can export both as a DataFrame, JSON or Prometheus text format.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.recent = deque(maxlen=RECENT_EVENTS)
+
+    def record(self, kind, name, ms, rows=None, nbytes=None, cache=None):
+        event = {
+            "ts": time.time(), "kind": kind, "name": name, "ms": round(ms, 3),
+            "rows": rows, "bytes": nbytes, "cache": cache,
+            "slow": ms > SLOW_THRESHOLDS.get(kind, float("inf")),
+        }
+        with self.lock:
+            total = self.totals.setdefault((kind, name), {
+                "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "bytes": 0,
+                "cache_hits": 0, "cache_misses": 0, "slow": 0,
+            })
+            total["count"] += 1
+            total["total_ms"] += ms
+            total["max_ms"] = max(total["max_ms"], ms)
+            total["rows"] += rows or 0
+            total["bytes"] += nbytes or 0
+            total["cache_hits"] += cache == "hit"
+            total["cache_misses"] += cache == "miss"
+            total["slow"] += event["slow"]
+            self.recent.append(event)
+
+        if event["slow"]:
+            logger.warning(json.dumps(event))
+        elif METRICS_LOG_ALL:
+            logger.info(json.dumps(event))
+
+    def summary(self):
+        with self.lock:
+            rows = [{"kind": kind, "name": name, **total, "avg_ms": total["total_ms"] / total["count"]}
+                    for (kind, name), total in self.totals.items()]
+        columns = ["kind", "name", "count", "avg_ms", "max_ms", "total_ms", "rows", "bytes",
+                   "cache_hits", "cache_misses", "slow"]
+        return pd.DataFrame(rows, columns=columns).sort_values("total_ms", ascending=False, ignore_index=True)
+
+    def recent_events(self, slow_only=False):
+        with self.lock:
+            events = [e for e in self.recent if e["slow"] or not slow_only]
+        return pd.DataFrame(events)
+
+    def to_json(self):
+        return json.dumps({"summary": self.summary().to_dict(orient="records"),
+                           "recent": list(self.recent)}, default=str)
+
+    def prometheus_text(self):
+        """Totals in the Prometheus text exposition format."""
+        lines = []
+        series = [
+            ("foodwaste_calls_total", "counter", "count", "Timed calls"),
+            ("foodwaste_duration_ms_total", "counter", "total_ms", "Total wall time in milliseconds"),
+            ("foodwaste_duration_ms_max", "gauge", "max_ms", "Slowest call in milliseconds"),
+            ("foodwaste_rows_total", "counter", "rows", "Rows returned"),
+            ("foodwaste_bytes_total", "counter", "bytes", "In-memory size of returned results"),
+            ("foodwaste_cache_hits_total", "counter", "cache_hits", "Result cache hits"),
+            ("foodwaste_cache_misses_total", "counter", "cache_misses", "Result cache misses"),
+            ("foodwaste_slow_total", "counter", "slow", "Calls over the slow threshold"),
+        ]
+        with self.lock:
+            totals = {key: dict(total) for key, total in self.totals.items()}
+        for metric, metric_type, key, help_text in series:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            for (kind, name), total in sorted(totals.items()):
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{metric}{{kind="{kind}",name="{label}"}} {total[key]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self.lock:
+            self.totals.clear()
+            self.recent.clear()
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def timed(kind, name):
+    """Time the enclosed block; callers may fill in rows/nbytes/cache on the yielded dict."""
+    info = {}
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        METRICS.record(kind, name, 1000 * (time.perf_counter() - start), **info)
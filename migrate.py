@@ -0,0 +1,116 @@
+"""Apply the versioned SQL migrations in ./migrations to the app database.
+
+Usage:
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied and pending migrations
+    python migrate.py --explain  # also print query timings before and after
+    python migrate.py --partitions  # create the claims partitions for the next 12 months
+
+Each file is applied once, in file-name order, inside its own transaction,
+and recorded in the schema_migrations table. The database comes from
+DATABASE_URL, like the app itself.
+
+--partitions is meant to run daily from cron (or any scheduler), so new
+claims keep landing in their monthly partition rather than claims_default.
+"""
+import argparse
+from pathlib import Path
+
+import explain
+from db import get_engine
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+
+def _ensure_migrations_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version    TEXT PRIMARY KEY,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def migration_files():
+    return sorted(MIGRATIONS_DIR.glob("*.sql"))
+
+
+def applied_versions(conn):
+    with conn.cursor() as cur:
+        _ensure_migrations_table(cur)
+        cur.execute("SELECT version FROM schema_migrations")
+        versions = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    return versions
+
+
+def migrate():
+    """Apply every pending migration and return the versions applied."""
+    # Raw DBAPI connection: migration scripts contain several statements and
+    # literal '%' characters, which must reach PostgreSQL untouched
+    conn = get_engine().raw_connection()
+    applied = []
+    try:
+        done = applied_versions(conn)
+        for path in migration_files():
+            version = path.stem
+            if version in done:
+                continue
+            with conn.cursor() as cur:
+                # Backfills can take longer than the app's statement_timeout
+                cur.execute("SET LOCAL statement_timeout = 0")
+                cur.execute(path.read_text())
+                cur.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
+            conn.commit()
+            applied.append(version)
+            print(f"✅ Applied {version}")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return applied
+
+
+def ensure_partitions(months=12):
+    """Create the monthly claims partitions from this month up to ``months`` ahead; return how many were new."""
+    with get_engine().begin() as conn:
+        return conn.exec_driver_sql(
+            "SELECT ensure_claims_partitions(CURRENT_DATE, (CURRENT_DATE + make_interval(months => %s))::date)",
+            (months,),
+        ).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--explain", action="store_true",
+                        help="EXPLAIN ANALYZE the dashboard queries before and after migrating")
+    parser.add_argument("--partitions", type=int, nargs="?", const=12, metavar="MONTHS",
+                        help="create the missing claims partitions up to MONTHS ahead (default 12) and exit")
+    args = parser.parse_args()
+
+    if args.partitions is not None:
+        created = ensure_partitions(args.partitions)
+        print(f"✅ Created {created} claims partition(s)" if created else "Claims partitions are up to date.")
+        return
+
+    if args.status:
+        conn = get_engine().raw_connection()
+        try:
+            done = applied_versions(conn)
+        finally:
+            conn.close()
+        for path in migration_files():
+            print(f"{'applied' if path.stem in done else 'pending':8} {path.stem}")
+        return
+
+    before = explain.report() if args.explain else None
+    if not migrate():
+        print("Database is up to date.")
+    if before:
+        explain.compare(before, explain.report(), max_regression=0.0)
+
+
+if __name__ == "__main__":
+    main()
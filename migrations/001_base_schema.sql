@@ -0,0 +1,39 @@
+-- Tables loaded by sampurna_project1.ipynb and used by the Streamlit app.
+-- Existing databases keep their tables; this only creates missing ones.
+
+CREATE TABLE IF NOT EXISTS providers (
+    provider_id SERIAL PRIMARY KEY,
+    name        TEXT,
+    type        TEXT,
+    address     TEXT,
+    city        TEXT,
+    contact     TEXT
+);
+
+CREATE TABLE IF NOT EXISTS receivers (
+    receiver_id SERIAL PRIMARY KEY,
+    name        TEXT,
+    type        TEXT,
+    city        TEXT,
+    contact     TEXT
+);
+
+CREATE TABLE IF NOT EXISTS food_listings (
+    food_id       SERIAL PRIMARY KEY,
+    food_name     TEXT,
+    quantity      INTEGER,
+    expiry_date   DATE,
+    provider_id   INTEGER,
+    provider_type TEXT,
+    location      TEXT,
+    food_type     TEXT,
+    meal_type     TEXT
+);
+
+CREATE TABLE IF NOT EXISTS claims (
+    claim_id    SERIAL PRIMARY KEY,
+    food_id     INTEGER,
+    receiver_id INTEGER,
+    status      TEXT,
+    timestamp   TIMESTAMP
+);
@@ -0,0 +1,310 @@
+-- Pre-aggregated rollups behind the dashboard queries.
+--
+-- Row-level triggers on providers, receivers, food_listings and claims apply
+-- each change as a delta, so the dashboards read O(groups) rows instead of
+-- re-joining the full claims history. Rows whose grouping key is NULL are
+-- not tracked. refresh_summary_tables() rebuilds everything from scratch
+-- (used below for the initial backfill and by bulk loads).
+
+-- q1: providers and receivers per city
+CREATE TABLE IF NOT EXISTS city_summary (
+    city           TEXT PRIMARY KEY,
+    provider_count BIGINT NOT NULL DEFAULT 0,
+    receiver_count BIGINT NOT NULL DEFAULT 0
+);
+
+-- q2, q5, q6, q7: listing counts and quantities per location, provider type,
+-- food type and meal type, plus one ('total', 'all') row for the grand total
+CREATE TABLE IF NOT EXISTS listing_summary (
+    dimension      TEXT NOT NULL,
+    value          TEXT NOT NULL,
+    listing_count  BIGINT NOT NULL DEFAULT 0,
+    total_quantity BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, value)
+);
+
+-- q9, q13: listed quantity and completed claims per provider
+CREATE TABLE IF NOT EXISTS provider_summary (
+    provider_id      INTEGER PRIMARY KEY,
+    listing_count    BIGINT NOT NULL DEFAULT 0,
+    listed_quantity  BIGINT NOT NULL DEFAULT 0,
+    completed_claims BIGINT NOT NULL DEFAULT 0
+);
+
+-- q4, q11: completed claims and the quantity of the claimed listings per receiver
+CREATE TABLE IF NOT EXISTS receiver_claim_summary (
+    receiver_id        INTEGER PRIMARY KEY,
+    completed_claims   BIGINT NOT NULL DEFAULT 0,
+    completed_quantity BIGINT NOT NULL DEFAULT 0
+);
+
+-- q10: claims per status
+CREATE TABLE IF NOT EXISTS claim_status_summary (
+    status TEXT PRIMARY KEY,
+    total  BIGINT NOT NULL DEFAULT 0
+);
+
+-- q12: completed claims per meal type
+CREATE TABLE IF NOT EXISTS meal_type_summary (
+    meal_type        TEXT PRIMARY KEY,
+    completed_claims BIGINT NOT NULL DEFAULT 0
+);
+
+
+-- Delta helpers ------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION summary_add_city(p_city TEXT, p_providers BIGINT, p_receivers BIGINT)
+RETURNS void AS $$
+BEGIN
+    IF p_city IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO city_summary AS s (city, provider_count, receiver_count)
+    VALUES (p_city, p_providers, p_receivers)
+    ON CONFLICT (city) DO UPDATE
+        SET provider_count = s.provider_count + EXCLUDED.provider_count,
+            receiver_count = s.receiver_count + EXCLUDED.receiver_count;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION summary_add_listing_value(p_dimension TEXT, p_value TEXT, p_count BIGINT, p_quantity BIGINT)
+RETURNS void AS $$
+BEGIN
+    IF p_value IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO listing_summary AS s (dimension, value, listing_count, total_quantity)
+    VALUES (p_dimension, p_value, p_count, p_quantity)
+    ON CONFLICT (dimension, value) DO UPDATE
+        SET listing_count = s.listing_count + EXCLUDED.listing_count,
+            total_quantity = s.total_quantity + EXCLUDED.total_quantity;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Adds (p_sign = 1) or removes (p_sign = -1) p_claims completed claims of a
+-- listing, as seen through the claims -> food_listings join
+CREATE OR REPLACE FUNCTION summary_add_completed(
+    p_receiver_id INTEGER, p_provider_id INTEGER, p_meal_type TEXT, p_quantity INTEGER,
+    p_sign INTEGER, p_claims BIGINT
+) RETURNS void AS $$
+BEGIN
+    IF p_receiver_id IS NOT NULL THEN
+        INSERT INTO receiver_claim_summary AS s (receiver_id, completed_claims, completed_quantity)
+        VALUES (p_receiver_id, p_sign * p_claims, p_sign * p_claims * COALESCE(p_quantity, 0))
+        ON CONFLICT (receiver_id) DO UPDATE
+            SET completed_claims = s.completed_claims + EXCLUDED.completed_claims,
+                completed_quantity = s.completed_quantity + EXCLUDED.completed_quantity;
+    END IF;
+    IF p_provider_id IS NOT NULL THEN
+        INSERT INTO provider_summary AS s (provider_id, completed_claims)
+        VALUES (p_provider_id, p_sign * p_claims)
+        ON CONFLICT (provider_id) DO UPDATE
+            SET completed_claims = s.completed_claims + EXCLUDED.completed_claims;
+    END IF;
+    IF p_meal_type IS NOT NULL THEN
+        INSERT INTO meal_type_summary AS s (meal_type, completed_claims)
+        VALUES (p_meal_type, p_sign * p_claims)
+        ON CONFLICT (meal_type) DO UPDATE
+            SET completed_claims = s.completed_claims + EXCLUDED.completed_claims;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION summary_apply_claim(
+    p_food_id INTEGER, p_receiver_id INTEGER, p_status TEXT, p_sign INTEGER
+) RETURNS void AS $$
+DECLARE
+    f RECORD;
+BEGIN
+    IF p_status IS NOT NULL THEN
+        INSERT INTO claim_status_summary AS s (status, total)
+        VALUES (p_status, p_sign)
+        ON CONFLICT (status) DO UPDATE SET total = s.total + EXCLUDED.total;
+    END IF;
+    IF p_status IS DISTINCT FROM 'Completed' THEN
+        RETURN;
+    END IF;
+    FOR f IN
+        SELECT provider_id, meal_type, quantity FROM food_listings WHERE food_id = p_food_id
+    LOOP
+        PERFORM summary_add_completed(p_receiver_id, f.provider_id, f.meal_type, f.quantity, p_sign, 1);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION summary_apply_listing(
+    p_food_id INTEGER, p_provider_id INTEGER, p_quantity INTEGER, p_provider_type TEXT,
+    p_location TEXT, p_food_type TEXT, p_meal_type TEXT, p_sign INTEGER
+) RETURNS void AS $$
+DECLARE
+    qty BIGINT := p_sign * COALESCE(p_quantity, 0);
+    r RECORD;
+BEGIN
+    PERFORM summary_add_listing_value('total', 'all', p_sign, qty);
+    PERFORM summary_add_listing_value('location', p_location, p_sign, qty);
+    PERFORM summary_add_listing_value('provider_type', p_provider_type, p_sign, qty);
+    PERFORM summary_add_listing_value('food_type', p_food_type, p_sign, qty);
+    PERFORM summary_add_listing_value('meal_type', p_meal_type, p_sign, qty);
+    IF p_provider_id IS NOT NULL THEN
+        INSERT INTO provider_summary AS s (provider_id, listing_count, listed_quantity)
+        VALUES (p_provider_id, p_sign, qty)
+        ON CONFLICT (provider_id) DO UPDATE
+            SET listing_count = s.listing_count + EXCLUDED.listing_count,
+                listed_quantity = s.listed_quantity + EXCLUDED.listed_quantity;
+    END IF;
+    -- Completed claims on this listing are only counted while the listing exists
+    FOR r IN
+        SELECT receiver_id, COUNT(*) AS n
+        FROM claims
+        WHERE food_id = p_food_id AND status = 'Completed'
+        GROUP BY receiver_id
+    LOOP
+        PERFORM summary_add_completed(r.receiver_id, p_provider_id, p_meal_type, p_quantity, p_sign, r.n);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Triggers -----------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION providers_summary_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM summary_add_city(OLD.city, -1, 0);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM summary_add_city(NEW.city, 1, 0);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION receivers_summary_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM summary_add_city(OLD.city, 0, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM summary_add_city(NEW.city, 0, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION food_listings_summary_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND (OLD.food_id, OLD.provider_id, OLD.quantity, OLD.provider_type, OLD.location, OLD.food_type, OLD.meal_type)
+           IS NOT DISTINCT FROM
+           (NEW.food_id, NEW.provider_id, NEW.quantity, NEW.provider_type, NEW.location, NEW.food_type, NEW.meal_type) THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM summary_apply_listing(OLD.food_id, OLD.provider_id, OLD.quantity, OLD.provider_type,
+                                      OLD.location, OLD.food_type, OLD.meal_type, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM summary_apply_listing(NEW.food_id, NEW.provider_id, NEW.quantity, NEW.provider_type,
+                                      NEW.location, NEW.food_type, NEW.meal_type, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION claims_summary_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND (OLD.food_id, OLD.receiver_id, OLD.status) IS NOT DISTINCT FROM (NEW.food_id, NEW.receiver_id, NEW.status) THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM summary_apply_claim(OLD.food_id, OLD.receiver_id, OLD.status, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM summary_apply_claim(NEW.food_id, NEW.receiver_id, NEW.status, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS providers_summary ON providers;
+CREATE TRIGGER providers_summary
+    AFTER INSERT OR UPDATE OR DELETE ON providers
+    FOR EACH ROW EXECUTE FUNCTION providers_summary_trigger();
+
+DROP TRIGGER IF EXISTS receivers_summary ON receivers;
+CREATE TRIGGER receivers_summary
+    AFTER INSERT OR UPDATE OR DELETE ON receivers
+    FOR EACH ROW EXECUTE FUNCTION receivers_summary_trigger();
+
+DROP TRIGGER IF EXISTS food_listings_summary ON food_listings;
+CREATE TRIGGER food_listings_summary
+    AFTER INSERT OR UPDATE OR DELETE ON food_listings
+    FOR EACH ROW EXECUTE FUNCTION food_listings_summary_trigger();
+
+DROP TRIGGER IF EXISTS claims_summary ON claims;
+CREATE TRIGGER claims_summary
+    AFTER INSERT OR UPDATE OR DELETE ON claims
+    FOR EACH ROW EXECUTE FUNCTION claims_summary_trigger();
+
+
+-- Full rebuild -------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION refresh_summary_tables() RETURNS void AS $$
+BEGIN
+    TRUNCATE city_summary, listing_summary, provider_summary,
+             receiver_claim_summary, claim_status_summary, meal_type_summary;
+
+    INSERT INTO city_summary (city, provider_count, receiver_count)
+    SELECT city, SUM(p), SUM(r)
+    FROM (
+        SELECT city, 1 AS p, 0 AS r FROM providers
+        UNION ALL
+        SELECT city, 0, 1 FROM receivers
+    ) AS participants
+    WHERE city IS NOT NULL
+    GROUP BY city;
+
+    INSERT INTO listing_summary (dimension, value, listing_count, total_quantity)
+    SELECT d.dimension, d.value, COUNT(*), COALESCE(SUM(f.quantity), 0)
+    FROM food_listings f
+    CROSS JOIN LATERAL (VALUES
+        ('total', 'all'),
+        ('location', f.location),
+        ('provider_type', f.provider_type),
+        ('food_type', f.food_type),
+        ('meal_type', f.meal_type)
+    ) AS d(dimension, value)
+    WHERE d.value IS NOT NULL
+    GROUP BY d.dimension, d.value;
+
+    INSERT INTO provider_summary (provider_id, listing_count, listed_quantity, completed_claims)
+    SELECT f.provider_id, COUNT(*), COALESCE(SUM(f.quantity), 0),
+           COALESCE(SUM(cc.n), 0)
+    FROM food_listings f
+    LEFT JOIN (
+        SELECT food_id, COUNT(*) AS n FROM claims WHERE status = 'Completed' GROUP BY food_id
+    ) AS cc ON cc.food_id = f.food_id
+    WHERE f.provider_id IS NOT NULL
+    GROUP BY f.provider_id;
+
+    INSERT INTO receiver_claim_summary (receiver_id, completed_claims, completed_quantity)
+    SELECT c.receiver_id, COUNT(*), COALESCE(SUM(f.quantity), 0)
+    FROM claims c
+    JOIN food_listings f ON c.food_id = f.food_id
+    WHERE c.status = 'Completed' AND c.receiver_id IS NOT NULL
+    GROUP BY c.receiver_id;
+
+    INSERT INTO claim_status_summary (status, total)
+    SELECT status, COUNT(*) FROM claims WHERE status IS NOT NULL GROUP BY status;
+
+    INSERT INTO meal_type_summary (meal_type, completed_claims)
+    SELECT f.meal_type, COUNT(*)
+    FROM claims c
+    JOIN food_listings f ON c.food_id = f.food_id
+    WHERE c.status = 'Completed' AND f.meal_type IS NOT NULL
+    GROUP BY f.meal_type;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT refresh_summary_tables();
@@ -0,0 +1,99 @@
+-- Keys and indexes for the joins and filters the app actually runs.
+--
+-- Tables created by the notebook's to_sql() have no constraints at all, so
+-- primary keys are only added where missing. Foreign keys are NOT VALID:
+-- new rows are checked, existing rows are left alone until someone runs
+-- ALTER TABLE ... VALIDATE CONSTRAINT after cleaning up orphans.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'providers'::regclass AND contype = 'p') THEN
+        ALTER TABLE providers ADD PRIMARY KEY (provider_id);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'receivers'::regclass AND contype = 'p') THEN
+        ALTER TABLE receivers ADD PRIMARY KEY (receiver_id);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'food_listings'::regclass AND contype = 'p') THEN
+        ALTER TABLE food_listings ADD PRIMARY KEY (food_id);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'claims'::regclass AND contype = 'p') THEN
+        ALTER TABLE claims ADD PRIMARY KEY (claim_id);
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'food_listings_provider_id_fkey') THEN
+        ALTER TABLE food_listings
+            ADD CONSTRAINT food_listings_provider_id_fkey
+            FOREIGN KEY (provider_id) REFERENCES providers (provider_id) NOT VALID;
+    END IF;
+    -- Deleting a listing from Manage Listings also removes its claims
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'claims_food_id_fkey') THEN
+        ALTER TABLE claims
+            ADD CONSTRAINT claims_food_id_fkey
+            FOREIGN KEY (food_id) REFERENCES food_listings (food_id) ON DELETE CASCADE NOT VALID;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'claims_receiver_id_fkey') THEN
+        ALTER TABLE claims
+            ADD CONSTRAINT claims_receiver_id_fkey
+            FOREIGN KEY (receiver_id) REFERENCES receivers (receiver_id) NOT VALID;
+    END IF;
+END;
+$$;
+
+-- The cascade above deletes a listing's claims before AFTER row triggers on
+-- food_listings run, so the listing's completed claims are taken out of the
+-- summary tables in a BEFORE DELETE trigger instead.
+CREATE OR REPLACE FUNCTION food_listings_summary_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND (OLD.food_id, OLD.provider_id, OLD.quantity, OLD.provider_type, OLD.location, OLD.food_type, OLD.meal_type)
+           IS NOT DISTINCT FROM
+           (NEW.food_id, NEW.provider_id, NEW.quantity, NEW.provider_type, NEW.location, NEW.food_type, NEW.meal_type) THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM summary_apply_listing(OLD.food_id, OLD.provider_id, OLD.quantity, OLD.provider_type,
+                                      OLD.location, OLD.food_type, OLD.meal_type, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM summary_apply_listing(NEW.food_id, NEW.provider_id, NEW.quantity, NEW.provider_type,
+                                      NEW.location, NEW.food_type, NEW.meal_type, 1);
+    END IF;
+    IF TG_WHEN = 'BEFORE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS food_listings_summary ON food_listings;
+CREATE TRIGGER food_listings_summary
+    AFTER INSERT OR UPDATE ON food_listings
+    FOR EACH ROW EXECUTE FUNCTION food_listings_summary_trigger();
+
+DROP TRIGGER IF EXISTS food_listings_summary_delete ON food_listings;
+CREATE TRIGGER food_listings_summary_delete
+    BEFORE DELETE ON food_listings
+    FOR EACH ROW EXECUTE FUNCTION food_listings_summary_trigger();
+
+-- q3 and the city dropdowns
+CREATE INDEX IF NOT EXISTS providers_city_idx ON providers (city);
+
+-- Joins from claims and food_listings
+CREATE INDEX IF NOT EXISTS food_listings_provider_id_idx ON food_listings (provider_id);
+CREATE INDEX IF NOT EXISTS claims_food_id_idx ON claims (food_id);
+CREATE INDEX IF NOT EXISTS claims_receiver_id_status_idx ON claims (receiver_id, status);
+
+-- Completed claims drive q4, q9, q11, q12 and the summary triggers' per-listing lookups
+CREATE INDEX IF NOT EXISTS claims_completed_food_receiver_idx
+    ON claims (food_id, receiver_id) WHERE status = 'Completed';
+CREATE INDEX IF NOT EXISTS claims_status_idx ON claims (status);
+
+-- Listing filters
+CREATE INDEX IF NOT EXISTS food_listings_location_idx ON food_listings (location);
+CREATE INDEX IF NOT EXISTS food_listings_type_meal_idx ON food_listings (food_type, meal_type);
+CREATE INDEX IF NOT EXISTS food_listings_meal_type_idx ON food_listings (meal_type);
+
+ANALYZE providers;
+ANALYZE receivers;
+ANALYZE food_listings;
+ANALYZE claims;
@@ -0,0 +1,6 @@
+-- Keyset pagination for "📋 Current Food Listings" (see listings.py).
+-- Sorting by food_id uses the primary key; sorting by expiry date uses this
+-- expression index, with undated listings last.
+
+CREATE INDEX IF NOT EXISTS food_listings_expiry_page_idx
+    ON food_listings ((COALESCE(expiry_date, DATE '9999-12-31')), food_id);
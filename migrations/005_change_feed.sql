@@ -0,0 +1,68 @@
+-- Change feed for the live dashboard aggregates (live.py).
+--
+-- Changes to food_listings and claims reach the summary tables through the
+-- triggers from 002/003, which already work out what each change means for
+-- the aggregates (e.g. a completed claim adds the listing's quantity to its
+-- receiver). Every such summary row change is sent on the foodwaste_changes
+-- channel as a delta, so listeners can apply it without re-running queries.
+--
+-- Only changes made from inside another trigger (pg_trigger_depth() > 1) are
+-- sent: refresh_summary_tables() rewrites the tables directly and is
+-- announced with a single 'reset' message from the TRUNCATE trigger instead.
+-- seq keeps otherwise identical payloads from being folded together by
+-- NOTIFY; xid lets a listener skip changes its snapshot already contains.
+
+CREATE SEQUENCE IF NOT EXISTS change_feed_seq;
+
+CREATE OR REPLACE FUNCTION change_feed_notify() RETURNS trigger AS $$
+DECLARE
+    key   JSON;
+    delta JSON;
+BEGIN
+    IF pg_trigger_depth() < 2 THEN
+        RETURN NULL;
+    END IF;
+    IF TG_TABLE_NAME = 'listing_summary' THEN
+        key := json_build_array(COALESCE(NEW.dimension, OLD.dimension), COALESCE(NEW.value, OLD.value));
+        delta := json_build_object(
+            'listing_count', COALESCE(NEW.listing_count, 0) - COALESCE(OLD.listing_count, 0),
+            'total_quantity', COALESCE(NEW.total_quantity, 0) - COALESCE(OLD.total_quantity, 0));
+    ELSIF TG_TABLE_NAME = 'claim_status_summary' THEN
+        key := to_json(COALESCE(NEW.status, OLD.status));
+        delta := json_build_object('total', COALESCE(NEW.total, 0) - COALESCE(OLD.total, 0));
+    ELSIF TG_TABLE_NAME = 'receiver_claim_summary' THEN
+        key := to_json(COALESCE(NEW.receiver_id, OLD.receiver_id));
+        delta := json_build_object(
+            'completed_claims', COALESCE(NEW.completed_claims, 0) - COALESCE(OLD.completed_claims, 0),
+            'completed_quantity', COALESCE(NEW.completed_quantity, 0) - COALESCE(OLD.completed_quantity, 0));
+    END IF;
+    PERFORM pg_notify('foodwaste_changes', json_build_object(
+        'seq', nextval('change_feed_seq'), 'xid', txid_current(),
+        'table', TG_TABLE_NAME, 'key', key, 'delta', delta)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION change_feed_reset() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('foodwaste_changes', json_build_object(
+        'seq', nextval('change_feed_seq'), 'xid', txid_current(),
+        'table', TG_TABLE_NAME, 'reset', true)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['listing_summary', 'claim_status_summary', 'receiver_claim_summary'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I_change_feed ON %I', t, t);
+        EXECUTE format('CREATE TRIGGER %I_change_feed AFTER INSERT OR UPDATE OR DELETE ON %I '
+                       'FOR EACH ROW EXECUTE FUNCTION change_feed_notify()', t, t);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I_change_feed_reset ON %I', t, t);
+        EXECUTE format('CREATE TRIGGER %I_change_feed_reset AFTER TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION change_feed_reset()', t, t);
+    END LOOP;
+END;
+$$;
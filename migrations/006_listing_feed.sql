@@ -0,0 +1,45 @@
+-- Change feed for the expiry-ordered listing index (matching.py).
+--
+-- Sends the ids of changed listings and receivers on the foodwaste_listings
+-- channel. A claim changing status can open or close its listing, so claims
+-- send their food_id too. The listener re-reads the current rows for the ids
+-- it receives, so messages only need to say what changed, and identical
+-- messages that NOTIFY folds together within a transaction lose nothing.
+
+CREATE OR REPLACE FUNCTION listing_feed_notify() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'receivers' THEN
+        PERFORM pg_notify('foodwaste_listings', json_build_object(
+            'table', 'receivers', 'id', COALESCE(NEW.receiver_id, OLD.receiver_id))::text);
+        RETURN NULL;
+    END IF;
+    -- food_listings and claims both identify the listing by food_id
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('foodwaste_listings', json_build_object('table', 'food_listings', 'id', OLD.food_id)::text);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify('foodwaste_listings', json_build_object('table', 'food_listings', 'id', NEW.food_id)::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS food_listings_listing_feed ON food_listings;
+CREATE TRIGGER food_listings_listing_feed
+    AFTER INSERT OR UPDATE OR DELETE ON food_listings
+    FOR EACH ROW EXECUTE FUNCTION listing_feed_notify();
+
+DROP TRIGGER IF EXISTS claims_listing_feed ON claims;
+CREATE TRIGGER claims_listing_feed
+    AFTER INSERT OR UPDATE OF food_id, status OR DELETE ON claims
+    FOR EACH ROW EXECUTE FUNCTION listing_feed_notify();
+
+DROP TRIGGER IF EXISTS receivers_listing_feed ON receivers;
+CREATE TRIGGER receivers_listing_feed
+    AFTER INSERT OR UPDATE OF city OR DELETE ON receivers
+    FOR EACH ROW EXECUTE FUNCTION listing_feed_notify();
+
+-- Open listings in expiry order, for the index's full load
+CREATE INDEX IF NOT EXISTS food_listings_open_expiry_idx
+    ON food_listings (expiry_date, food_id)
+    WHERE quantity > 0;
@@ -0,0 +1,31 @@
+-- Concurrency-safe claiming (claims.py).
+--
+-- food_listings.version is bumped by a trigger on every update, whoever
+-- makes it, so an editor can tell whether a listing changed since it was
+-- read. claims.quantity records how much of the listing each claim took
+-- (NULL for claims loaded from the original CSV). The CHECK constraint is a
+-- last line of defence against a writer taking a listing below zero.
+
+ALTER TABLE food_listings ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE claims ADD COLUMN IF NOT EXISTS quantity INTEGER;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'food_listings_quantity_nonnegative') THEN
+        ALTER TABLE food_listings
+            ADD CONSTRAINT food_listings_quantity_nonnegative CHECK (quantity >= 0) NOT VALID;
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION food_listings_bump_version() RETURNS trigger AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS food_listings_version ON food_listings;
+CREATE TRIGGER food_listings_version
+    BEFORE UPDATE ON food_listings
+    FOR EACH ROW EXECUTE FUNCTION food_listings_bump_version();
@@ -0,0 +1,116 @@
+-- Monthly range partitions on claims."timestamp" for the date-range filters
+-- and claim trends (queries.py). A query bounded by timestamp only scans the
+-- partitions its range covers. Claims without a timestamp, or newer than the
+-- last monthly partition, go to claims_default.
+--
+-- The table is rebuilt as a partitioned table with the same columns, id
+-- sequence, indexes and triggers. A partitioned table can only be unique
+-- on columns that include the partition key, so claim_id becomes unique
+-- together with "timestamp"; the sequence still hands out distinct ids.
+-- Foreign keys on a partitioned table cannot be NOT VALID, so they come
+-- back only if the existing rows already satisfy them.
+--
+-- Needs PostgreSQL 13 or later.
+
+-- Creates the missing monthly partitions from p_from up to p_to, moving
+-- any rows for those months out of claims_default first. Run it ahead of
+-- time, e.g. SELECT ensure_claims_partitions(CURRENT_DATE, CURRENT_DATE + 365).
+CREATE OR REPLACE FUNCTION ensure_claims_partitions(p_from DATE, p_to DATE) RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', p_from)::date;
+    month_end   DATE;
+    part        TEXT;
+    created     INTEGER := 0;
+BEGIN
+    WHILE month_start < p_to LOOP
+        month_end := (month_start + interval '1 month')::date;
+        part := 'claims_p' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(part) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE claims INCLUDING DEFAULTS)', part);
+            -- The rows only move between partitions, so the summary and
+            -- listing feed triggers must not see them leave
+            ALTER TABLE claims_default DISABLE TRIGGER USER;
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM claims_default WHERE "timestamp" >= %L AND "timestamp" < %L RETURNING *)
+                 INSERT INTO %I SELECT * FROM moved',
+                month_start, month_end, part);
+            ALTER TABLE claims_default ENABLE TRIGGER USER;
+            EXECUTE format('ALTER TABLE claims ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           part, month_start, month_end);
+            created := created + 1;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    first_month DATE;
+    id_sequence TEXT;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'claims'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE claims RENAME TO claims_unpartitioned;
+    CREATE TABLE claims (LIKE claims_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp");
+    CREATE TABLE claims_default PARTITION OF claims DEFAULT;
+
+    SELECT date_trunc('month', COALESCE(min("timestamp"), now()))::date INTO first_month
+    FROM claims_unpartitioned;
+    PERFORM ensure_claims_partitions(first_month, (date_trunc('month', now()) + interval '13 months')::date);
+
+    -- No triggers on the new table yet, so the summary tables are untouched
+    INSERT INTO claims SELECT * FROM claims_unpartitioned;
+
+    -- Keep the claim_id sequence when the old table is dropped
+    id_sequence := pg_get_serial_sequence('claims_unpartitioned', 'claim_id');
+    IF id_sequence IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY claims.claim_id', id_sequence);
+    END IF;
+    DROP TABLE claims_unpartitioned;
+
+    ALTER TABLE claims ADD CONSTRAINT claims_claim_id_timestamp_key UNIQUE (claim_id, "timestamp");
+
+    IF NOT EXISTS (SELECT 1 FROM claims c WHERE c.food_id IS NOT NULL
+                   AND NOT EXISTS (SELECT 1 FROM food_listings f WHERE f.food_id = c.food_id)) THEN
+        ALTER TABLE claims
+            ADD CONSTRAINT claims_food_id_fkey
+            FOREIGN KEY (food_id) REFERENCES food_listings (food_id) ON DELETE CASCADE;
+    ELSE
+        RAISE NOTICE 'claims has rows for missing listings; claims_food_id_fkey not added';
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM claims c WHERE c.receiver_id IS NOT NULL
+                   AND NOT EXISTS (SELECT 1 FROM receivers r WHERE r.receiver_id = c.receiver_id)) THEN
+        ALTER TABLE claims
+            ADD CONSTRAINT claims_receiver_id_fkey
+            FOREIGN KEY (receiver_id) REFERENCES receivers (receiver_id);
+    ELSE
+        RAISE NOTICE 'claims has rows for missing receivers; claims_receiver_id_fkey not added';
+    END IF;
+END;
+$$;
+
+-- Indexes from 003, created on every partition
+CREATE INDEX IF NOT EXISTS claims_food_id_idx ON claims (food_id);
+CREATE INDEX IF NOT EXISTS claims_receiver_id_status_idx ON claims (receiver_id, status);
+CREATE INDEX IF NOT EXISTS claims_completed_food_receiver_idx
+    ON claims (food_id, receiver_id) WHERE status = 'Completed';
+CREATE INDEX IF NOT EXISTS claims_status_idx ON claims (status);
+
+-- Date ranges that cover only part of a month
+CREATE INDEX IF NOT EXISTS claims_timestamp_idx ON claims ("timestamp");
+
+DROP TRIGGER IF EXISTS claims_summary ON claims;
+CREATE TRIGGER claims_summary
+    AFTER INSERT OR UPDATE OR DELETE ON claims
+    FOR EACH ROW EXECUTE FUNCTION claims_summary_trigger();
+
+DROP TRIGGER IF EXISTS claims_listing_feed ON claims;
+CREATE TRIGGER claims_listing_feed
+    AFTER INSERT OR UPDATE OF food_id, status OR DELETE ON claims
+    FOR EACH ROW EXECUTE FUNCTION listing_feed_notify();
+
+ANALYZE claims;
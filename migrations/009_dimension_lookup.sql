@@ -0,0 +1,40 @@
+-- Dropdown values for the app's forms and filters (dimensions.py).
+--
+-- lookup_values holds the values every form should offer even before any
+-- row uses them. dimension_values adds the values that occur in the data,
+-- read from the summary tables of 002, so listing the cities, provider,
+-- food and meal types or claim statuses costs a few hundred rows at most
+-- instead of a DISTINCT over providers, food_listings or claims.
+
+CREATE TABLE IF NOT EXISTS lookup_values (
+    dimension TEXT NOT NULL,
+    value     TEXT NOT NULL,
+    PRIMARY KEY (dimension, value)
+);
+
+INSERT INTO lookup_values (dimension, value) VALUES
+    ('provider_type', 'Restaurant'),
+    ('provider_type', 'Grocery Store'),
+    ('provider_type', 'Supermarket'),
+    ('food_type', 'Vegetarian'),
+    ('food_type', 'Non-Vegetarian'),
+    ('food_type', 'Vegan'),
+    ('meal_type', 'Breakfast'),
+    ('meal_type', 'Lunch'),
+    ('meal_type', 'Dinner'),
+    ('meal_type', 'Snacks'),
+    ('claim_status', 'Pending'),
+    ('claim_status', 'Completed'),
+    ('claim_status', 'Cancelled')
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE VIEW dimension_values AS
+    SELECT dimension, value FROM lookup_values
+    UNION
+    SELECT 'city', city FROM city_summary WHERE provider_count > 0
+    UNION
+    SELECT dimension, value
+    FROM listing_summary
+    WHERE dimension IN ('provider_type', 'food_type', 'meal_type') AND listing_count > 0
+    UNION
+    SELECT 'claim_status', status FROM claim_status_summary WHERE total > 0;
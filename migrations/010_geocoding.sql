@@ -0,0 +1,97 @@
+-- Coordinates for providers, receivers and listings, for proximity search (geo.py).
+--
+-- Places are geocoded offline from a gazetteer of place names, loaded into
+-- the gazetteer table by `python geo.py geocode --gazetteer FILE`. Names are
+-- matched case-insensitively: providers and receivers by city, listings by
+-- location. New and edited rows are geocoded by a BEFORE trigger; rows
+-- given explicit coordinates keep them.
+
+CREATE TABLE IF NOT EXISTS gazetteer (
+    place     TEXT PRIMARY KEY,     -- lower(trim(name))
+    latitude  DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL
+);
+
+ALTER TABLE providers ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION,
+                      ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+ALTER TABLE receivers ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION,
+                      ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+ALTER TABLE food_listings ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION,
+                          ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+
+CREATE OR REPLACE FUNCTION geocode_row() RETURNS trigger AS $$
+DECLARE
+    place_name TEXT;
+    lat        DOUBLE PRECISION;
+    lon        DOUBLE PRECISION;
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.latitude IS NOT NULL THEN
+        RETURN NEW;
+    END IF;
+    -- Separate statements: NEW has a location or a city, not both
+    IF TG_TABLE_NAME = 'food_listings' THEN
+        place_name := NEW.location;
+    ELSE
+        place_name := NEW.city;
+    END IF;
+    SELECT g.latitude, g.longitude INTO lat, lon FROM gazetteer g WHERE g.place = lower(trim(place_name));
+    NEW.latitude := lat;
+    NEW.longitude := lon;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS providers_geocode ON providers;
+CREATE TRIGGER providers_geocode
+    BEFORE INSERT OR UPDATE OF city ON providers
+    FOR EACH ROW EXECUTE FUNCTION geocode_row();
+
+DROP TRIGGER IF EXISTS receivers_geocode ON receivers;
+CREATE TRIGGER receivers_geocode
+    BEFORE INSERT OR UPDATE OF city ON receivers
+    FOR EACH ROW EXECUTE FUNCTION geocode_row();
+
+DROP TRIGGER IF EXISTS food_listings_geocode ON food_listings;
+CREATE TRIGGER food_listings_geocode
+    BEFORE INSERT OR UPDATE OF location ON food_listings
+    FOR EACH ROW EXECUTE FUNCTION geocode_row();
+
+-- Receivers that move are re-read by the proximity index
+DROP TRIGGER IF EXISTS receivers_listing_feed ON receivers;
+CREATE TRIGGER receivers_listing_feed
+    AFTER INSERT OR UPDATE OF city, latitude, longitude OR DELETE ON receivers
+    FOR EACH ROW EXECUTE FUNCTION listing_feed_notify();
+
+-- Sets coordinates from the gazetteer in bulk: only where missing, or for
+-- every row with p_overwrite. Row triggers are skipped, like a bulk load,
+-- and listeners are told to reload with one 'reset' message instead.
+-- Returns the number of rows updated.
+CREATE OR REPLACE FUNCTION geocode_missing(p_overwrite BOOLEAN DEFAULT false) RETURNS BIGINT AS $$
+DECLARE
+    t       TEXT;
+    place   TEXT;
+    n       BIGINT;
+    updated BIGINT := 0;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['providers', 'receivers', 'food_listings'] LOOP
+        place := CASE WHEN t = 'food_listings' THEN 'location' ELSE 'city' END;
+        EXECUTE format('ALTER TABLE %I DISABLE TRIGGER USER', t);
+        EXECUTE format(
+            'UPDATE %I AS x SET latitude = g.latitude, longitude = g.longitude
+             FROM gazetteer g
+             WHERE g.place = lower(trim(x.%I)) AND (%L OR x.latitude IS NULL)
+               AND (x.latitude, x.longitude) IS DISTINCT FROM (g.latitude, g.longitude)',
+            t, place, p_overwrite);
+        GET DIAGNOSTICS n = ROW_COUNT;
+        EXECUTE format('ALTER TABLE %I ENABLE TRIGGER USER', t);
+        updated := updated + n;
+    END LOOP;
+    IF updated > 0 THEN
+        PERFORM pg_notify('foodwaste_changes', json_build_object(
+            'seq', nextval('change_feed_seq'), 'xid', txid_current(),
+            'table', 'gazetteer', 'reset', true)::text);
+    END IF;
+    RETURN updated;
+END;
+$$ LANGUAGE plpgsql;
+
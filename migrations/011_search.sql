@@ -0,0 +1,13 @@
+-- Trigram indexes for the typeahead search (search.py).
+--
+-- pg_trgm matches misspelt and partial words (word_similarity, the <%
+-- operator) as well as ILIKE '%text%', and both use these GIN indexes.
+-- Locations are searched in listing_summary, which already holds one row
+-- per location, so food_listings.location needs no index of its own.
+-- Creating the extension needs a role allowed to do so.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS food_listings_food_name_trgm_idx ON food_listings USING gin (food_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS providers_name_trgm_idx ON providers USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS receivers_name_trgm_idx ON receivers USING gin (name gin_trgm_ops);
@@ -0,0 +1,251 @@
+-- Spreads listing_summary over slots so concurrent listing writes stop
+-- queueing on its rows.
+--
+-- Every listing insert, update and delete (and, since 007, every claim)
+-- adjusts the ('total', 'all') row and one row per location, provider, food
+-- and meal type, and holds those row locks until commit. With many claimers
+-- that one total row serialised all listing writes. The rows now live in
+-- listing_summary_slots, keyed by (dimension, value, slot) with slot =
+-- food_id % 16, and listing_summary becomes a view that sums the slots, so
+-- its readers are unchanged. Two claims only contend on a summary row when
+-- their listings share a slot. A listing always maps to the same slot, so
+-- every slot holds the exact counts of its own listings.
+--
+-- An update that only changes a listing's quantity (a claim, or a quantity
+-- edit) now adds the difference to the quantities instead of removing and
+-- re-adding the whole listing, so it no longer touches the completed-claim
+-- counts per provider and meal type.
+
+CREATE OR REPLACE FUNCTION listing_summary_slot(p_food_id INTEGER) RETURNS SMALLINT AS $$
+    SELECT (abs(COALESCE(p_food_id, 0)) % 16)::smallint;
+$$ LANGUAGE sql IMMUTABLE;
+
+DO $$
+BEGIN
+    IF to_regclass('listing_summary_slots') IS NULL THEN
+        DROP VIEW IF EXISTS dimension_values;
+        ALTER TABLE listing_summary RENAME TO listing_summary_slots;
+        ALTER TABLE listing_summary_slots ADD COLUMN slot SMALLINT NOT NULL DEFAULT 0;
+        ALTER TABLE listing_summary_slots DROP CONSTRAINT listing_summary_pkey;
+        ALTER TABLE listing_summary_slots ADD PRIMARY KEY (dimension, value, slot);
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE VIEW listing_summary AS
+    SELECT dimension, value,
+           SUM(listing_count)::bigint AS listing_count,
+           SUM(total_quantity)::bigint AS total_quantity
+    FROM listing_summary_slots
+    GROUP BY dimension, value;
+
+-- As in 009, now reading the view
+CREATE OR REPLACE VIEW dimension_values AS
+    SELECT dimension, value FROM lookup_values
+    UNION
+    SELECT 'city', city FROM city_summary WHERE provider_count > 0
+    UNION
+    SELECT dimension, value
+    FROM listing_summary
+    WHERE dimension IN ('provider_type', 'food_type', 'meal_type') AND listing_count > 0
+    UNION
+    SELECT 'claim_status', status FROM claim_status_summary WHERE total > 0;
+
+DROP FUNCTION IF EXISTS summary_add_listing_value(TEXT, TEXT, BIGINT, BIGINT);
+CREATE OR REPLACE FUNCTION summary_add_listing_value(
+    p_dimension TEXT, p_value TEXT, p_count BIGINT, p_quantity BIGINT, p_slot SMALLINT
+) RETURNS void AS $$
+BEGIN
+    IF p_value IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO listing_summary_slots AS s (dimension, value, slot, listing_count, total_quantity)
+    VALUES (p_dimension, p_value, p_slot, p_count, p_quantity)
+    ON CONFLICT (dimension, value, slot) DO UPDATE
+        SET listing_count = s.listing_count + EXCLUDED.listing_count,
+            total_quantity = s.total_quantity + EXCLUDED.total_quantity;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION summary_apply_listing(
+    p_food_id INTEGER, p_provider_id INTEGER, p_quantity INTEGER, p_provider_type TEXT,
+    p_location TEXT, p_food_type TEXT, p_meal_type TEXT, p_sign INTEGER
+) RETURNS void AS $$
+DECLARE
+    qty  BIGINT := p_sign * COALESCE(p_quantity, 0);
+    slot SMALLINT := listing_summary_slot(p_food_id);
+    r RECORD;
+BEGIN
+    PERFORM summary_add_listing_value('total', 'all', p_sign, qty, slot);
+    PERFORM summary_add_listing_value('location', p_location, p_sign, qty, slot);
+    PERFORM summary_add_listing_value('provider_type', p_provider_type, p_sign, qty, slot);
+    PERFORM summary_add_listing_value('food_type', p_food_type, p_sign, qty, slot);
+    PERFORM summary_add_listing_value('meal_type', p_meal_type, p_sign, qty, slot);
+    IF p_provider_id IS NOT NULL THEN
+        INSERT INTO provider_summary AS s (provider_id, listing_count, listed_quantity)
+        VALUES (p_provider_id, p_sign, qty)
+        ON CONFLICT (provider_id) DO UPDATE
+            SET listing_count = s.listing_count + EXCLUDED.listing_count,
+                listed_quantity = s.listed_quantity + EXCLUDED.listed_quantity;
+    END IF;
+    -- Completed claims on this listing are only counted while the listing exists
+    FOR r IN
+        SELECT receiver_id, COUNT(*) AS n
+        FROM claims
+        WHERE food_id = p_food_id AND status = 'Completed'
+        GROUP BY receiver_id
+    LOOP
+        PERFORM summary_add_completed(r.receiver_id, p_provider_id, p_meal_type, p_quantity, p_sign, r.n);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- A change of p_delta in one listing's quantity, all else unchanged
+CREATE OR REPLACE FUNCTION summary_add_listing_quantity(
+    p_food_id INTEGER, p_provider_id INTEGER, p_provider_type TEXT,
+    p_location TEXT, p_food_type TEXT, p_meal_type TEXT, p_delta BIGINT
+) RETURNS void AS $$
+DECLARE
+    slot SMALLINT := listing_summary_slot(p_food_id);
+BEGIN
+    PERFORM summary_add_listing_value('total', 'all', 0, p_delta, slot);
+    PERFORM summary_add_listing_value('location', p_location, 0, p_delta, slot);
+    PERFORM summary_add_listing_value('provider_type', p_provider_type, 0, p_delta, slot);
+    PERFORM summary_add_listing_value('food_type', p_food_type, 0, p_delta, slot);
+    PERFORM summary_add_listing_value('meal_type', p_meal_type, 0, p_delta, slot);
+    IF p_provider_id IS NOT NULL THEN
+        UPDATE provider_summary SET listed_quantity = listed_quantity + p_delta WHERE provider_id = p_provider_id;
+    END IF;
+    -- Completed claims count the listing's quantity for their receiver
+    UPDATE receiver_claim_summary s
+    SET completed_quantity = s.completed_quantity + c.n * p_delta
+    FROM (
+        SELECT receiver_id, COUNT(*) AS n
+        FROM claims
+        WHERE food_id = p_food_id AND status = 'Completed' AND receiver_id IS NOT NULL
+        GROUP BY receiver_id
+    ) AS c
+    WHERE s.receiver_id = c.receiver_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- As in 003, plus the quantity-only path
+CREATE OR REPLACE FUNCTION food_listings_summary_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND (OLD.food_id, OLD.provider_id, OLD.provider_type, OLD.location, OLD.food_type, OLD.meal_type)
+           IS NOT DISTINCT FROM
+           (NEW.food_id, NEW.provider_id, NEW.provider_type, NEW.location, NEW.food_type, NEW.meal_type) THEN
+        IF OLD.quantity IS DISTINCT FROM NEW.quantity THEN
+            PERFORM summary_add_listing_quantity(NEW.food_id, NEW.provider_id, NEW.provider_type, NEW.location,
+                                                 NEW.food_type, NEW.meal_type,
+                                                 COALESCE(NEW.quantity, 0) - COALESCE(OLD.quantity, 0));
+        END IF;
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM summary_apply_listing(OLD.food_id, OLD.provider_id, OLD.quantity, OLD.provider_type,
+                                      OLD.location, OLD.food_type, OLD.meal_type, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM summary_apply_listing(NEW.food_id, NEW.provider_id, NEW.quantity, NEW.provider_type,
+                                      NEW.location, NEW.food_type, NEW.meal_type, 1);
+    END IF;
+    IF TG_WHEN = 'BEFORE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- As in 005; listeners still see the slots' deltas as listing_summary changes
+CREATE OR REPLACE FUNCTION change_feed_notify() RETURNS trigger AS $$
+DECLARE
+    key   JSON;
+    delta JSON;
+    tbl   TEXT := TG_TABLE_NAME;
+BEGIN
+    IF pg_trigger_depth() < 2 THEN
+        RETURN NULL;
+    END IF;
+    IF TG_TABLE_NAME = 'listing_summary_slots' THEN
+        tbl := 'listing_summary';
+        key := json_build_array(COALESCE(NEW.dimension, OLD.dimension), COALESCE(NEW.value, OLD.value));
+        delta := json_build_object(
+            'listing_count', COALESCE(NEW.listing_count, 0) - COALESCE(OLD.listing_count, 0),
+            'total_quantity', COALESCE(NEW.total_quantity, 0) - COALESCE(OLD.total_quantity, 0));
+    ELSIF TG_TABLE_NAME = 'claim_status_summary' THEN
+        key := to_json(COALESCE(NEW.status, OLD.status));
+        delta := json_build_object('total', COALESCE(NEW.total, 0) - COALESCE(OLD.total, 0));
+    ELSIF TG_TABLE_NAME = 'receiver_claim_summary' THEN
+        key := to_json(COALESCE(NEW.receiver_id, OLD.receiver_id));
+        delta := json_build_object(
+            'completed_claims', COALESCE(NEW.completed_claims, 0) - COALESCE(OLD.completed_claims, 0),
+            'completed_quantity', COALESCE(NEW.completed_quantity, 0) - COALESCE(OLD.completed_quantity, 0));
+    END IF;
+    PERFORM pg_notify('foodwaste_changes', json_build_object(
+        'seq', nextval('change_feed_seq'), 'xid', txid_current(),
+        'table', tbl, 'key', key, 'delta', delta)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- As in 002, writing the slots
+CREATE OR REPLACE FUNCTION refresh_summary_tables() RETURNS void AS $$
+BEGIN
+    TRUNCATE city_summary, listing_summary_slots, provider_summary,
+             receiver_claim_summary, claim_status_summary, meal_type_summary;
+
+    INSERT INTO city_summary (city, provider_count, receiver_count)
+    SELECT city, SUM(p), SUM(r)
+    FROM (
+        SELECT city, 1 AS p, 0 AS r FROM providers
+        UNION ALL
+        SELECT city, 0, 1 FROM receivers
+    ) AS participants
+    WHERE city IS NOT NULL
+    GROUP BY city;
+
+    INSERT INTO listing_summary_slots (dimension, value, slot, listing_count, total_quantity)
+    SELECT d.dimension, d.value, listing_summary_slot(f.food_id), COUNT(*), COALESCE(SUM(f.quantity), 0)
+    FROM food_listings f
+    CROSS JOIN LATERAL (VALUES
+        ('total', 'all'),
+        ('location', f.location),
+        ('provider_type', f.provider_type),
+        ('food_type', f.food_type),
+        ('meal_type', f.meal_type)
+    ) AS d(dimension, value)
+    WHERE d.value IS NOT NULL
+    GROUP BY d.dimension, d.value, listing_summary_slot(f.food_id);
+
+    INSERT INTO provider_summary (provider_id, listing_count, listed_quantity, completed_claims)
+    SELECT f.provider_id, COUNT(*), COALESCE(SUM(f.quantity), 0),
+           COALESCE(SUM(cc.n), 0)
+    FROM food_listings f
+    LEFT JOIN (
+        SELECT food_id, COUNT(*) AS n FROM claims WHERE status = 'Completed' GROUP BY food_id
+    ) AS cc ON cc.food_id = f.food_id
+    WHERE f.provider_id IS NOT NULL
+    GROUP BY f.provider_id;
+
+    INSERT INTO receiver_claim_summary (receiver_id, completed_claims, completed_quantity)
+    SELECT c.receiver_id, COUNT(*), COALESCE(SUM(f.quantity), 0)
+    FROM claims c
+    JOIN food_listings f ON c.food_id = f.food_id
+    WHERE c.status = 'Completed' AND c.receiver_id IS NOT NULL
+    GROUP BY c.receiver_id;
+
+    INSERT INTO claim_status_summary (status, total)
+    SELECT status, COUNT(*) FROM claims WHERE status IS NOT NULL GROUP BY status;
+
+    INSERT INTO meal_type_summary (meal_type, completed_claims)
+    SELECT f.meal_type, COUNT(*)
+    FROM claims c
+    JOIN food_listings f ON c.food_id = f.food_id
+    WHERE c.status = 'Completed' AND f.meal_type IS NOT NULL
+    GROUP BY f.meal_type;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT refresh_summary_tables();
@@ -0,0 +1,32 @@
+-- Deleting a listing no longer deletes its claims.
+--
+-- 003 and 008 create claims_food_id_fkey with ON DELETE CASCADE, so
+-- deleting a listing from Manage Listings silently dropped its claim
+-- history and changed the claim status counts. The cascading key is
+-- recreated here with ON DELETE RESTRICT, on new and existing databases
+-- alike; the app reports a listing with claims as not deletable instead. The key is recreated with
+-- the same NOT VALID / validated state it had (008 only adds it when no
+-- claim points at a missing listing).
+
+DO $$
+DECLARE
+    was_valid BOOLEAN;
+BEGIN
+    SELECT convalidated INTO was_valid
+    FROM pg_constraint
+    WHERE conname = 'claims_food_id_fkey' AND conrelid = 'claims'::regclass AND confdeltype = 'c';
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+    ALTER TABLE claims DROP CONSTRAINT claims_food_id_fkey;
+    IF was_valid THEN
+        ALTER TABLE claims
+            ADD CONSTRAINT claims_food_id_fkey
+            FOREIGN KEY (food_id) REFERENCES food_listings (food_id) ON DELETE RESTRICT;
+    ELSE
+        ALTER TABLE claims
+            ADD CONSTRAINT claims_food_id_fkey
+            FOREIGN KEY (food_id) REFERENCES food_listings (food_id) ON DELETE RESTRICT NOT VALID;
+    END IF;
+END;
+$$;
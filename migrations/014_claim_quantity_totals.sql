@@ -0,0 +1,201 @@
+-- Receiver totals count the quantity each claim took.
+--
+-- q4 and q11 used to add up the claimed listing's current quantity. Since
+-- claims decrement their listing (007), that total shrank whenever anyone
+-- else claimed from the same listing, and reached 0 once it was fully
+-- claimed. A completed claim now counts claims.quantity, falling back to
+-- the listing's quantity for claims loaded from the original CSV, which
+-- have none. Only those older claims still follow the listing's quantity.
+
+DROP FUNCTION IF EXISTS summary_add_completed(INTEGER, INTEGER, TEXT, INTEGER, INTEGER, BIGINT);
+-- Adds (p_sign = 1) or removes (p_sign = -1) p_claims completed claims of a
+-- listing, which took p_claimed in total
+CREATE OR REPLACE FUNCTION summary_add_completed(
+    p_receiver_id INTEGER, p_provider_id INTEGER, p_meal_type TEXT, p_claimed BIGINT,
+    p_sign INTEGER, p_claims BIGINT
+) RETURNS void AS $$
+BEGIN
+    IF p_receiver_id IS NOT NULL THEN
+        INSERT INTO receiver_claim_summary AS s (receiver_id, completed_claims, completed_quantity)
+        VALUES (p_receiver_id, p_sign * p_claims, p_sign * COALESCE(p_claimed, 0))
+        ON CONFLICT (receiver_id) DO UPDATE
+            SET completed_claims = s.completed_claims + EXCLUDED.completed_claims,
+                completed_quantity = s.completed_quantity + EXCLUDED.completed_quantity;
+    END IF;
+    IF p_provider_id IS NOT NULL THEN
+        INSERT INTO provider_summary AS s (provider_id, completed_claims)
+        VALUES (p_provider_id, p_sign * p_claims)
+        ON CONFLICT (provider_id) DO UPDATE
+            SET completed_claims = s.completed_claims + EXCLUDED.completed_claims;
+    END IF;
+    IF p_meal_type IS NOT NULL THEN
+        INSERT INTO meal_type_summary AS s (meal_type, completed_claims)
+        VALUES (p_meal_type, p_sign * p_claims)
+        ON CONFLICT (meal_type) DO UPDATE
+            SET completed_claims = s.completed_claims + EXCLUDED.completed_claims;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION IF EXISTS summary_apply_claim(INTEGER, INTEGER, TEXT, INTEGER);
+CREATE OR REPLACE FUNCTION summary_apply_claim(
+    p_food_id INTEGER, p_receiver_id INTEGER, p_status TEXT, p_quantity INTEGER, p_sign INTEGER
+) RETURNS void AS $$
+DECLARE
+    f RECORD;
+BEGIN
+    IF p_status IS NOT NULL THEN
+        INSERT INTO claim_status_summary AS s (status, total)
+        VALUES (p_status, p_sign)
+        ON CONFLICT (status) DO UPDATE SET total = s.total + EXCLUDED.total;
+    END IF;
+    IF p_status IS DISTINCT FROM 'Completed' THEN
+        RETURN;
+    END IF;
+    FOR f IN
+        SELECT provider_id, meal_type, quantity FROM food_listings WHERE food_id = p_food_id
+    LOOP
+        PERFORM summary_add_completed(p_receiver_id, f.provider_id, f.meal_type,
+                                      COALESCE(p_quantity, f.quantity), p_sign, 1);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION claims_summary_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND (OLD.food_id, OLD.receiver_id, OLD.status, OLD.quantity)
+           IS NOT DISTINCT FROM (NEW.food_id, NEW.receiver_id, NEW.status, NEW.quantity) THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM summary_apply_claim(OLD.food_id, OLD.receiver_id, OLD.status, OLD.quantity, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM summary_apply_claim(NEW.food_id, NEW.receiver_id, NEW.status, NEW.quantity, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- As in 012, with each claim's own quantity
+CREATE OR REPLACE FUNCTION summary_apply_listing(
+    p_food_id INTEGER, p_provider_id INTEGER, p_quantity INTEGER, p_provider_type TEXT,
+    p_location TEXT, p_food_type TEXT, p_meal_type TEXT, p_sign INTEGER
+) RETURNS void AS $$
+DECLARE
+    qty  BIGINT := p_sign * COALESCE(p_quantity, 0);
+    slot SMALLINT := listing_summary_slot(p_food_id);
+    r RECORD;
+BEGIN
+    PERFORM summary_add_listing_value('total', 'all', p_sign, qty, slot);
+    PERFORM summary_add_listing_value('location', p_location, p_sign, qty, slot);
+    PERFORM summary_add_listing_value('provider_type', p_provider_type, p_sign, qty, slot);
+    PERFORM summary_add_listing_value('food_type', p_food_type, p_sign, qty, slot);
+    PERFORM summary_add_listing_value('meal_type', p_meal_type, p_sign, qty, slot);
+    IF p_provider_id IS NOT NULL THEN
+        INSERT INTO provider_summary AS s (provider_id, listing_count, listed_quantity)
+        VALUES (p_provider_id, p_sign, qty)
+        ON CONFLICT (provider_id) DO UPDATE
+            SET listing_count = s.listing_count + EXCLUDED.listing_count,
+                listed_quantity = s.listed_quantity + EXCLUDED.listed_quantity;
+    END IF;
+    -- Completed claims on this listing are only counted while the listing exists
+    FOR r IN
+        SELECT receiver_id, COUNT(*) AS n, SUM(COALESCE(quantity, p_quantity)) AS claimed
+        FROM claims
+        WHERE food_id = p_food_id AND status = 'Completed'
+        GROUP BY receiver_id
+    LOOP
+        PERFORM summary_add_completed(r.receiver_id, p_provider_id, p_meal_type, r.claimed, p_sign, r.n);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- As in 012; only claims without a quantity of their own follow the listing's
+CREATE OR REPLACE FUNCTION summary_add_listing_quantity(
+    p_food_id INTEGER, p_provider_id INTEGER, p_provider_type TEXT,
+    p_location TEXT, p_food_type TEXT, p_meal_type TEXT, p_delta BIGINT
+) RETURNS void AS $$
+DECLARE
+    slot SMALLINT := listing_summary_slot(p_food_id);
+BEGIN
+    PERFORM summary_add_listing_value('total', 'all', 0, p_delta, slot);
+    PERFORM summary_add_listing_value('location', p_location, 0, p_delta, slot);
+    PERFORM summary_add_listing_value('provider_type', p_provider_type, 0, p_delta, slot);
+    PERFORM summary_add_listing_value('food_type', p_food_type, 0, p_delta, slot);
+    PERFORM summary_add_listing_value('meal_type', p_meal_type, 0, p_delta, slot);
+    IF p_provider_id IS NOT NULL THEN
+        UPDATE provider_summary SET listed_quantity = listed_quantity + p_delta WHERE provider_id = p_provider_id;
+    END IF;
+    UPDATE receiver_claim_summary s
+    SET completed_quantity = s.completed_quantity + c.n * p_delta
+    FROM (
+        SELECT receiver_id, COUNT(*) AS n
+        FROM claims
+        WHERE food_id = p_food_id AND status = 'Completed' AND receiver_id IS NOT NULL AND quantity IS NULL
+        GROUP BY receiver_id
+    ) AS c
+    WHERE s.receiver_id = c.receiver_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- As in 012, with each claim's own quantity
+CREATE OR REPLACE FUNCTION refresh_summary_tables() RETURNS void AS $$
+BEGIN
+    TRUNCATE city_summary, listing_summary_slots, provider_summary,
+             receiver_claim_summary, claim_status_summary, meal_type_summary;
+
+    INSERT INTO city_summary (city, provider_count, receiver_count)
+    SELECT city, SUM(p), SUM(r)
+    FROM (
+        SELECT city, 1 AS p, 0 AS r FROM providers
+        UNION ALL
+        SELECT city, 0, 1 FROM receivers
+    ) AS participants
+    WHERE city IS NOT NULL
+    GROUP BY city;
+
+    INSERT INTO listing_summary_slots (dimension, value, slot, listing_count, total_quantity)
+    SELECT d.dimension, d.value, listing_summary_slot(f.food_id), COUNT(*), COALESCE(SUM(f.quantity), 0)
+    FROM food_listings f
+    CROSS JOIN LATERAL (VALUES
+        ('total', 'all'),
+        ('location', f.location),
+        ('provider_type', f.provider_type),
+        ('food_type', f.food_type),
+        ('meal_type', f.meal_type)
+    ) AS d(dimension, value)
+    WHERE d.value IS NOT NULL
+    GROUP BY d.dimension, d.value, listing_summary_slot(f.food_id);
+
+    INSERT INTO provider_summary (provider_id, listing_count, listed_quantity, completed_claims)
+    SELECT f.provider_id, COUNT(*), COALESCE(SUM(f.quantity), 0),
+           COALESCE(SUM(cc.n), 0)
+    FROM food_listings f
+    LEFT JOIN (
+        SELECT food_id, COUNT(*) AS n FROM claims WHERE status = 'Completed' GROUP BY food_id
+    ) AS cc ON cc.food_id = f.food_id
+    WHERE f.provider_id IS NOT NULL
+    GROUP BY f.provider_id;
+
+    INSERT INTO receiver_claim_summary (receiver_id, completed_claims, completed_quantity)
+    SELECT c.receiver_id, COUNT(*), COALESCE(SUM(COALESCE(c.quantity, f.quantity)), 0)
+    FROM claims c
+    JOIN food_listings f ON c.food_id = f.food_id
+    WHERE c.status = 'Completed' AND c.receiver_id IS NOT NULL
+    GROUP BY c.receiver_id;
+
+    INSERT INTO claim_status_summary (status, total)
+    SELECT status, COUNT(*) FROM claims WHERE status IS NOT NULL GROUP BY status;
+
+    INSERT INTO meal_type_summary (meal_type, completed_claims)
+    SELECT f.meal_type, COUNT(*)
+    FROM claims c
+    JOIN food_listings f ON c.food_id = f.food_id
+    WHERE c.status = 'Completed' AND f.meal_type IS NOT NULL
+    GROUP BY f.meal_type;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT refresh_summary_tables();
@@ -0,0 +1,135 @@
+"""Background precompute of the heaviest dashboard queries.
+
+A worker thread re-runs PRECOMPUTE_QUERIES every PRECOMPUTE_INTERVAL_SECONDS
+and keeps the latest result of each as a timestamped snapshot. Pages get
+the snapshot at once, with its "as of" time, while the next refresh runs
+behind it. A write made through the app (db.data_version()) starts a
+refresh within a second instead of at the next interval. Until the first
+refresh finishes a query has no snapshot; pages say so instead of waiting.
+A snapshot computed before the latest write is not served (see is_current());
+readers go to the database until the refresh catches up.
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+
+from db import data_version, read_engine
+from metrics import timed
+
+logger = logging.getLogger("foodwaste.precompute")
+
+PRECOMPUTE = os.getenv("PRECOMPUTE", "1").lower() not in ("0", "false", "no")
+PRECOMPUTE_QUERIES = tuple(name.strip() for name in os.getenv(
+    "PRECOMPUTE_QUERIES", "participants_by_city,receiver_totals,receiver_avg_claimed").split(",") if name.strip())
+PRECOMPUTE_INTERVAL_SECONDS = float(os.getenv("PRECOMPUTE_INTERVAL_SECONDS", "60"))
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    df: pd.DataFrame
+    as_of: float        # time.time() when the query finished
+    seconds: float      # how long it ran
+    version: int        # db.data_version() when the query started
+
+
+class Precomputer:
+    """Worker thread holding the latest snapshot of each precomputed query."""
+
+    def __init__(self, names):
+        self.names = names
+        self.snapshots = {}
+        self.lock = threading.Lock()
+        self.error = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="precompute", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def latest(self, name):
+        with self.lock:
+            return self.snapshots.get(name)
+
+    def refresh_now(self):
+        self._wake.set()
+
+    def _refresh(self, name, version):
+        # Imported here: queries.py imports this module
+        from queries import QUERIES
+        start = time.perf_counter()
+        # Straight to the database: the shared result cache could hand back an old result
+        with timed("precompute", name) as info:
+            df = pd.read_sql(QUERIES[name].sql, read_engine())
+            info["rows"] = len(df)
+        with self.lock:
+            self.snapshots[name] = Snapshot(df, time.time(), time.perf_counter() - start, version)
+
+    def _run(self):
+        while not self._stop.is_set():
+            version = data_version()
+            for name in self.names:
+                try:
+                    self._refresh(name, version)
+                    self.error = None
+                except Exception as e:
+                    # Keep the previous snapshot until it is superseded by a write
+                    self.error = f"{name}: {e}"
+                    logger.warning("Precompute of %s failed: %s", name, e)
+            # Sleep until the interval is up, a refresh is requested or the app writes
+            deadline = time.monotonic() + PRECOMPUTE_INTERVAL_SECONDS
+            while not self._stop.is_set() and time.monotonic() < deadline and data_version() == version:
+                if self._wake.wait(1):
+                    self._wake.clear()
+                    break
+
+    def status(self):
+        """One row per precomputed query: rows, as-of time and refresh duration."""
+        rows = []
+        with self.lock:
+            for name in self.names:
+                snap = self.snapshots.get(name)
+                if snap is None:
+                    rows.append((name, None, None, None))
+                else:
+                    rows.append((name, len(snap.df), time.strftime("%H:%M:%S", time.localtime(snap.as_of)),
+                                 round(snap.seconds * 1000, 1)))
+        return pd.DataFrame(rows, columns=["query", "rows", "as_of", "refresh_ms"])
+
+
+_precomputer = None
+_precomputer_lock = threading.Lock()
+
+
+def get_precomputer():
+    """Return the process-wide Precomputer, starting its worker on first use."""
+    global _precomputer
+    if _precomputer is None:
+        with _precomputer_lock:
+            if _precomputer is None:
+                precomputer = Precomputer(PRECOMPUTE_QUERIES)
+                precomputer.start()
+                _precomputer = precomputer
+    return _precomputer
+
+
+def handles(name):
+    return PRECOMPUTE and name in PRECOMPUTE_QUERIES
+
+
+def latest(name):
+    """The latest Snapshot of a precomputed query, or None before its first refresh."""
+    return get_precomputer().latest(name)
+
+
+def is_current(snapshot):
+    """False once a write has happened since ``snapshot`` was computed."""
+    return snapshot.version == data_version()
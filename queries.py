@@ -0,0 +1,465 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+import pandas as pd
+
+import columnar
+import precompute
+from db import run_query
+
+# Worker threads used to run a page's queries concurrently
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", "8"))
+_executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="query")
+
+
+@dataclass(frozen=True)
+class Query:
+    """A named analytic query used by the dashboard pages.
+
+    A query either has its own ``sql`` or is answered from the result of
+    another registered query (``source``) through ``derive``, so that e.g. a
+    top-10 view never hits the database when the full ranking is cached.
+
+    Most aggregates read the trigger-maintained summary tables from
+    migrations/002_summary_tables.sql rather than scanning claims. The
+    summaries cover all time, so claim-based queries also have a
+    ``windowed`` variant that reads claims directly for a
+    ``(start, end)`` timestamp range; claims is partitioned by month, so
+    only the partitions in the range are scanned.
+
+    ``params`` names the ``%s`` placeholders in ``sql``, in order.
+    """
+    name: str
+    title: str
+    sql: Optional[str] = None
+    source: Optional[str] = None
+    derive: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None
+    windowed: Optional[str] = None
+    params: Tuple[str, ...] = ()
+
+
+def _top(n):
+    return lambda df: df.head(n).reset_index(drop=True)
+
+
+def _top_donors(df):
+    # q13 without the city column: providers sharing a name are summed together
+    totals = df.groupby("provider_name", as_index=False)["total_donated_quantity"].sum()
+    return totals.sort_values("total_donated_quantity", ascending=False).head(10).reset_index(drop=True)
+
+
+_QUERIES = [
+    # Query 1: food providers and receivers are there in each city
+    Query(
+        "participants_by_city",
+        "1. Food Providers and Receivers per City",
+        sql="""
+        SELECT city, provider_count, receiver_count
+        FROM city_summary
+        WHERE provider_count > 0 OR receiver_count > 0
+        ORDER BY city;
+        """,
+    ),
+    # Query 2: Total food contribution by provider type
+    Query(
+        "contribution_by_provider_type",
+        "2. Food Contribution by Provider Type",
+        sql="""
+        SELECT value AS provider_type,
+               total_quantity
+        FROM listing_summary
+        WHERE dimension = 'provider_type' AND listing_count > 0
+        ORDER BY total_quantity DESC;
+        """,
+    ),
+    # Query 3: Contact Info of Food Providers in a Specific City
+    Query(
+        "cities",
+        "Cities with Food Providers",
+        sql="SELECT value AS city FROM dimension_values WHERE dimension = 'city' ORDER BY value;",
+    ),
+    Query(
+        "providers_in_city",
+        "3. Contact Info of Food Providers in a Specific City",
+        sql="""
+        SELECT name, contact, type, city
+        FROM providers
+        WHERE city = %s;
+        """,
+        params=("city",),
+    ),
+    # Query 4: Top Receivers by Total Food Claimed
+    Query(
+        "receiver_totals",
+        "4. Receivers Who Claimed the Most Food",
+        sql="""
+        SELECT r.name AS receiver_name,
+               r.city,
+               s.completed_quantity AS total_claimed_quantity
+        FROM receiver_claim_summary s
+        JOIN receivers r ON s.receiver_id = r.receiver_id
+        WHERE s.completed_claims > 0
+        ORDER BY total_claimed_quantity DESC;
+        """,
+        windowed="""
+        SELECT r.name AS receiver_name,
+               r.city,
+               SUM(COALESCE(c.quantity, f.quantity, 0)) AS total_claimed_quantity
+        FROM claims c
+        JOIN food_listings f ON c.food_id = f.food_id
+        JOIN receivers r ON c.receiver_id = r.receiver_id
+        WHERE c.status = 'Completed' AND c."timestamp" >= %s AND c."timestamp" < %s
+        GROUP BY r.receiver_id, r.name, r.city
+        ORDER BY total_claimed_quantity DESC;
+        """,
+    ),
+    # Query 5: Total Quantity of Food Available from All Providers
+    Query(
+        "total_available",
+        "5. Total Quantity of Food Available from All Providers",
+        sql="""
+        SELECT SUM(total_quantity) AS total_available_quantity
+        FROM listing_summary
+        WHERE dimension = 'total';
+        """,
+    ),
+    # Query 6: Locations by Number of Food Listings
+    Query(
+        "listings_by_location",
+        "Food Listings per Location",
+        sql="""
+        SELECT value AS location, listing_count
+        FROM listing_summary
+        WHERE dimension = 'location' AND listing_count > 0
+        ORDER BY listing_count DESC;
+        """,
+    ),
+    Query(
+        "top_location",
+        "6. Location with the Highest Number of Food Listings",
+        source="listings_by_location",
+        derive=_top(1),
+    ),
+    Query(
+        "top_locations",
+        "6. Top 10 Locations by Number of Food Listings",
+        source="listings_by_location",
+        derive=_top(10),
+    ),
+    # Query 7: Most Commonly Available Food Types
+    Query(
+        "food_type_counts",
+        "7. Most Commonly Available Food Types",
+        sql="""
+        SELECT value AS food_type, listing_count AS total_count
+        FROM listing_summary
+        WHERE dimension = 'food_type' AND listing_count > 0
+        ORDER BY total_count DESC;
+        """,
+    ),
+    # Query 8: Number of Claims per Food Item
+    Query(
+        "claims_per_food",
+        "8. Number of Claims per Food Item",
+        sql="""
+        SELECT f.food_name, COUNT(c.claim_id) AS total_claims
+        FROM claims c
+        JOIN food_listings f ON c.food_id = f.food_id
+        GROUP BY f.food_name
+        ORDER BY total_claims DESC;
+        """,
+        windowed="""
+        SELECT f.food_name, COUNT(c.claim_id) AS total_claims
+        FROM claims c
+        JOIN food_listings f ON c.food_id = f.food_id
+        WHERE c."timestamp" >= %s AND c."timestamp" < %s
+        GROUP BY f.food_name
+        ORDER BY total_claims DESC;
+        """,
+    ),
+    # Query 9: Providers by Number of Successful Food Claims
+    Query(
+        "provider_successful_claims",
+        "Successful Food Claims per Provider",
+        sql="""
+        SELECT p.name AS provider_name,
+               SUM(s.completed_claims) AS successful_claims
+        FROM provider_summary s
+        JOIN providers p ON s.provider_id = p.provider_id
+        WHERE s.completed_claims > 0
+        GROUP BY p.name
+        ORDER BY successful_claims DESC;
+        """,
+        windowed="""
+        SELECT p.name AS provider_name,
+               COUNT(*) AS successful_claims
+        FROM claims c
+        JOIN food_listings f ON c.food_id = f.food_id
+        JOIN providers p ON f.provider_id = p.provider_id
+        WHERE c.status = 'Completed' AND c."timestamp" >= %s AND c."timestamp" < %s
+        GROUP BY p.name
+        ORDER BY successful_claims DESC;
+        """,
+    ),
+    Query(
+        "top_provider_by_claims",
+        "9. Provider with Highest Number of Successful Food Claims",
+        source="provider_successful_claims",
+        derive=_top(1),
+    ),
+    Query(
+        "top_providers_by_claims",
+        "9. Top 10 Providers with Most Successful Food Claims",
+        source="provider_successful_claims",
+        derive=_top(10),
+    ),
+    # Query 10: Percentage of Food Claims by Status
+    Query(
+        "claim_status",
+        "10. Percentage of Food Claims by Status",
+        sql="""
+        SELECT status,
+               total,
+               ROUND(100.0 * total / SUM(total) OVER (), 2) AS percentage
+        FROM claim_status_summary
+        WHERE total > 0
+        ORDER BY total DESC;
+        """,
+        windowed="""
+        SELECT status,
+               COUNT(*) AS total,
+               ROUND(100.0 * COUNT(*) / SUM(COUNT(*)) OVER (), 2) AS percentage
+        FROM claims
+        WHERE status IS NOT NULL AND "timestamp" >= %s AND "timestamp" < %s
+        GROUP BY status
+        ORDER BY total DESC;
+        """,
+    ),
+    # Query 11: Average Quantity of Food Claimed per Receiver
+    Query(
+        "receiver_avg_claimed",
+        "11. Average Quantity of Food Claimed per Receiver",
+        sql="""
+        SELECT
+            r.name AS receiver_name,
+            r.city,
+            ROUND(s.completed_quantity::numeric / s.completed_claims, 2) AS avg_claimed_quantity
+        FROM receiver_claim_summary s
+        JOIN receivers r ON s.receiver_id = r.receiver_id
+        WHERE s.completed_claims > 0
+        ORDER BY avg_claimed_quantity DESC;
+        """,
+        windowed="""
+        SELECT
+            r.name AS receiver_name,
+            r.city,
+            ROUND(SUM(COALESCE(c.quantity, f.quantity, 0))::numeric / COUNT(*), 2) AS avg_claimed_quantity
+        FROM claims c
+        JOIN food_listings f ON c.food_id = f.food_id
+        JOIN receivers r ON c.receiver_id = r.receiver_id
+        WHERE c.status = 'Completed' AND c."timestamp" >= %s AND c."timestamp" < %s
+        GROUP BY r.receiver_id, r.name, r.city
+        ORDER BY avg_claimed_quantity DESC;
+        """,
+    ),
+    # Query 12: Most Claimed Meal Type
+    Query(
+        "meal_type_claims",
+        "12. Most Claimed Meal Type",
+        sql="""
+        SELECT meal_type,
+               completed_claims AS total_claims
+        FROM meal_type_summary
+        WHERE completed_claims > 0
+        ORDER BY total_claims DESC;
+        """,
+        windowed="""
+        SELECT f.meal_type,
+               COUNT(*) AS total_claims
+        FROM claims c
+        JOIN food_listings f ON c.food_id = f.food_id
+        WHERE c.status = 'Completed' AND f.meal_type IS NOT NULL
+          AND c."timestamp" >= %s AND c."timestamp" < %s
+        GROUP BY f.meal_type
+        ORDER BY total_claims DESC;
+        """,
+    ),
+    # Query 13: Total Quantity of Food Donated by Each Provider
+    Query(
+        "provider_donations",
+        "13. Total Quantity of Food Donated by Each Provider",
+        sql="""
+        SELECT p.name AS provider_name,
+               p.city,
+               SUM(s.listed_quantity) AS total_donated_quantity
+        FROM provider_summary s
+        JOIN providers p ON s.provider_id = p.provider_id
+        WHERE s.listing_count > 0
+        GROUP BY p.name, p.city
+        ORDER BY total_donated_quantity DESC;
+        """,
+    ),
+    Query(
+        "top_donors",
+        "13. Top 10 Providers by Total Food Donated",
+        source="provider_donations",
+        derive=_top_donors,
+    ),
+    # Claim trends only have a windowed variant: fetch them with a window
+    Query(
+        "claims_daily",
+        "14. Daily Claims by Status",
+        windowed="""
+        SELECT date_trunc('day', "timestamp")::date AS period, status, COUNT(*) AS claims
+        FROM claims
+        WHERE "timestamp" >= %s AND "timestamp" < %s
+        GROUP BY 1, 2
+        ORDER BY 1, 2;
+        """,
+    ),
+    Query(
+        "claims_weekly",
+        "15. Weekly Claims by Status",
+        windowed="""
+        SELECT date_trunc('week', "timestamp")::date AS period, status, COUNT(*) AS claims
+        FROM claims
+        WHERE "timestamp" >= %s AND "timestamp" < %s
+        GROUP BY 1, 2
+        ORDER BY 1, 2;
+        """,
+    ),
+]
+
+QUERIES = {query.name: query for query in _QUERIES}
+
+
+def _check_precompute_queries():
+    # The precompute worker runs each query's plain sql without parameters;
+    # a derived query is precomputed through its source
+    for name in precompute.PRECOMPUTE_QUERIES:
+        query = QUERIES.get(name)
+        if query is None:
+            raise ValueError(f"PRECOMPUTE_QUERIES: unknown query {name!r}")
+        if query.source:
+            raise ValueError(f"PRECOMPUTE_QUERIES: {name} is derived from {query.source}; list {query.source} instead")
+        if query.sql is None or query.params:
+            raise ValueError(f"PRECOMPUTE_QUERIES: {name} cannot run without a window or parameters")
+
+
+_check_precompute_queries()
+
+
+def parameters(name):
+    """Names of the params fetch() expects for ``name``; derived queries take their source's."""
+    query = QUERIES[name]
+    return parameters(query.source) if query.source else query.params
+
+
+def fetch(name, params=None, window=None):
+    """Return the result of a registered query as a DataFrame.
+
+    Derived queries are computed from their source's (cached) result, so
+    they never cost a database round trip of their own. With
+    ANALYTICS_ENGINE=columnar, queries are answered by columnar.py instead.
+    ``window`` is a ``(start, end)`` timestamp range, used by queries that
+    have a windowed variant and ignored by the rest.
+    """
+    query = QUERIES[name]
+    if query.source:
+        return query.derive(fetch(query.source, params, window))
+    if window and query.windowed:
+        return run_query(query.windowed, params=tuple(window), name=f"{query.name}_windowed")
+    if columnar.enabled() and columnar.handles(name):
+        return columnar.answer(name, params)
+    if precompute.handles(name):
+        snapshot = precompute.latest(name)
+        if snapshot is not None and precompute.is_current(snapshot):
+            return snapshot.df
+    return run_query(query.sql, params=params, name=query.name)
+
+
+def _precomputed(name, window=None):
+    query = QUERIES[name]
+    return (not (window and query.windowed) and not (columnar.enabled() and columnar.handles(name))
+            and precompute.handles(name))
+
+
+def snapshot_of(name, window=None):
+    """The precompute Snapshot that ``name`` (or its source) is answered from right now, or None."""
+    query = QUERIES[name]
+    if query.source:
+        return snapshot_of(query.source, window)
+    snapshot = precompute.latest(name) if _precomputed(name, window) else None
+    return snapshot if snapshot is not None and precompute.is_current(snapshot) else None
+
+
+def from_snapshot(name, window=None):
+    """True if prefetch() answers ``name`` (or its source) from a background precompute snapshot.
+
+    That includes the cold start, when the answer is None. A snapshot from
+    before the latest write is not used: the query goes to the database.
+    """
+    query = QUERIES[name]
+    if query.source:
+        return from_snapshot(query.source, window)
+    if not _precomputed(name, window):
+        return False
+    snapshot = precompute.latest(name)
+    return snapshot is None or precompute.is_current(snapshot)
+
+
+def prefetch(names, window=None):
+    """Start all of the given (parameterless) queries at once.
+
+    Returns a dict of name -> Future. Every distinct database query is
+    submitted to the worker pool only once; derived queries resolve as soon
+    as their source does. ``window`` works as in fetch(). Precomputed
+    queries never wait for the database: their future holds the latest
+    snapshot, or None before the first one. A snapshot from before the
+    latest write is skipped, and the query reads the database instead.
+    """
+    futures = {}
+    for name in names:
+        _submit(name, futures, window)
+    return {name: futures[name] for name in names}
+
+
+def _submit(name, futures, window=None):
+    if name not in futures:
+        query = QUERIES[name]
+        if query.source:
+            futures[name] = _then(_submit(query.source, futures, window), query.derive)
+        elif window and query.windowed:
+            futures[name] = _executor.submit(run_query, query.windowed, params=tuple(window),
+                                             name=f"{query.name}_windowed")
+        elif columnar.enabled() and columnar.handles(name):
+            # Answered from memory in well under a millisecond once loaded
+            futures[name] = Future()
+            try:
+                futures[name].set_result(columnar.answer(name))
+            except Exception as e:
+                futures[name].set_exception(e)
+        elif precompute.handles(name) and from_snapshot(name):
+            futures[name] = Future()
+            snapshot = snapshot_of(name)
+            futures[name].set_result(snapshot.df if snapshot is not None else None)
+        else:
+            futures[name] = _executor.submit(run_query, query.sql, name=query.name)
+    return futures[name]
+
+
+def _then(future, func):
+    derived = Future()
+
+    def _resolve(done):
+        try:
+            # A cold precomputed source stays None
+            result = done.result()
+            derived.set_result(None if result is None else func(result))
+        except Exception as e:
+            derived.set_exception(e)
+
+    future.add_done_callback(_resolve)
+    return derived
@@ -0,0 +1,68 @@
+"""Typeahead search over food names, locations, providers and receivers.
+
+One query answers every kind at once, through the trigram indexes from
+migrations/011_search.sql. A term matches when it is a close fuzzy match
+for a word of the name (pg_trgm word similarity, so "brad" finds "Bread")
+or occurs in it. Names that start with the term rank first, then by
+similarity. Results are cached like any other query, and every write
+clears that cache.
+"""
+import pandas as pd
+
+from db import run_query
+
+SEARCH_COLUMNS = ["kind", "id", "label", "detail", "score"]
+SEARCH_KINDS = ("food", "location", "provider", "receiver")
+SEARCH_LIMIT = 10
+# Shorter terms match too much to be useful
+MIN_TERM_LENGTH = 2
+
+_KIND_SQL = {
+    "food": """
+        SELECT 'food' AS kind, food_id AS id, food_name AS label,
+               concat_ws(' · ', location, quantity || ' left', 'expires ' || expiry_date) AS detail,
+               food_name ILIKE %(prefix)s AS starts_with, word_similarity(%(term)s, food_name) AS score
+        FROM food_listings
+        WHERE %(term)s <%% food_name OR food_name ILIKE %(contains)s
+    """,
+    "location": """
+        SELECT 'location' AS kind, NULL::integer AS id, value AS label,
+               listing_count || ' listings' AS detail,
+               value ILIKE %(prefix)s AS starts_with, word_similarity(%(term)s, value) AS score
+        FROM listing_summary
+        WHERE dimension = 'location' AND listing_count > 0
+          AND (%(term)s <%% value OR value ILIKE %(contains)s)
+    """,
+    "provider": """
+        SELECT 'provider' AS kind, provider_id AS id, name AS label, concat_ws(' · ', type, city) AS detail,
+               name ILIKE %(prefix)s AS starts_with, word_similarity(%(term)s, name) AS score
+        FROM providers
+        WHERE %(term)s <%% name OR name ILIKE %(contains)s
+    """,
+    "receiver": """
+        SELECT 'receiver' AS kind, receiver_id AS id, name AS label, concat_ws(' · ', type, city) AS detail,
+               name ILIKE %(prefix)s AS starts_with, word_similarity(%(term)s, name) AS score
+        FROM receivers
+        WHERE %(term)s <%% name OR name ILIKE %(contains)s
+    """,
+}
+
+
+def _like_escape(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search(term, kinds=SEARCH_KINDS, limit=SEARCH_LIMIT):
+    """Ranked matches for ``term``: up to ``limit`` per kind, as a DataFrame.
+
+    Columns are SEARCH_COLUMNS; id is None for locations.
+    """
+    term = (term or "").strip()
+    if len(term) < MIN_TERM_LENGTH:
+        return pd.DataFrame(columns=SEARCH_COLUMNS)
+    parts = [f"({_KIND_SQL[kind].strip()}\n        ORDER BY starts_with DESC, score DESC, label\n        "
+             f"LIMIT %(limit)s)" for kind in kinds]
+    sql = "SELECT kind, id, label, detail, score FROM (\n" + "\nUNION ALL\n".join(parts) + "\n) AS matches"
+    escaped = _like_escape(term)
+    params = {"term": term, "prefix": escaped + "%", "contains": "%" + escaped + "%", "limit": limit}
+    return run_query(sql, params=params, name="search")
@@ -0,0 +1,25 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# The app's modules live at the repository root, not in a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Tests marked db run against DATABASE_URL, which must be a migrated scratch
+# database; they are skipped unless RUN_DB_TESTS=1
+RUN_DB_TESTS = os.getenv("RUN_DB_TESTS", "").lower() in ("1", "true", "yes")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "db: needs a migrated PostgreSQL database at DATABASE_URL (RUN_DB_TESTS=1)")
+
+
+def pytest_collection_modifyitems(config, items):
+    if RUN_DB_TESTS:
+        return
+    skip = pytest.mark.skip(reason="needs a database; set RUN_DB_TESTS=1")
+    for item in items:
+        if "db" in item.keywords:
+            item.add_marker(skip)
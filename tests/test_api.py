@@ -0,0 +1,109 @@
+"""API request handling, with the query and export layers replaced by fakes."""
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from aiohttp import web
+
+import api
+
+
+def _request(path, check):
+    async def run():
+        app = web.Application()
+        app.router.add_get("/api/queries/{name}", api.get_query)
+        app.router.add_get("/api/export/{name}", api.export_query)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get(path)
+            return await check(response)
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def fake_export(monkeypatch):
+    calls = []
+
+    def export(name, out, fmt="csv", params=None, window=None):
+        calls.append((name, fmt, params, window))
+        for i in range(20_000):
+            out.write(b"%d,row\n" % i)
+
+    monkeypatch.setattr(api.export, "export", export)
+    return calls
+
+
+def test_export_streams_the_whole_file_in_bounded_chunks(fake_export):
+    async def check(response):
+        assert response.status == 200
+        assert response.headers["Content-Disposition"] == 'attachment; filename="providers_in_city.csv"'
+        chunks = [chunk async for chunk in response.content.iter_chunked(api.EXPORT_CHUNK_BYTES)]
+        return b"".join(chunks)
+
+    body = _request("/api/export/providers_in_city?param=Springfield", check)
+    assert body == b"".join(b"%d,row\n" % i for i in range(20_000))
+    assert fake_export == [("providers_in_city", "csv", ("Springfield",), None)]
+
+
+def test_export_failure_before_any_data_is_an_error_response(monkeypatch):
+    def export(name, out, fmt="csv", params=None, window=None):
+        raise RuntimeError("Parquet export needs pyarrow")
+
+    monkeypatch.setattr(api.export, "export", export)
+
+    async def check(response):
+        return response.status, await response.json()
+
+    assert _request("/api/export/claim_status?format=parquet", check) == (
+        500, {"error": "Parquet export needs pyarrow"})
+
+
+@pytest.mark.parametrize("path, error", [
+    ("/api/export/claim_status?format=xlsx", "unknown format 'xlsx'"),
+    ("/api/export/providers_in_city", "providers_in_city takes 1 param value(s), got 0"),
+    ("/api/export/claims_daily", "claims_daily needs start and end dates"),
+    ("/api/export/claims_daily?start=2025-02-30", "day is out of range for month"),
+])
+def test_export_rejects_bad_requests(fake_export, path, error):
+    async def check(response):
+        return response.status, (await response.json())["error"]
+
+    assert _request(path, check) == (400, error)
+    assert fake_export == []
+
+
+def test_open_ended_windows_reach_the_last_representable_day(fake_export):
+    async def check(response):
+        return response.status
+
+    assert _request("/api/export/claims_daily?end=9999-12-31", check) == 200
+    assert _request("/api/export/claims_daily?start=2025-01-01", check) == 200
+    (_, _, _, all_time), (_, _, _, (start, until_today)) = fake_export
+    assert all_time == (datetime.min, datetime.max)
+    assert start == datetime(2025, 1, 1)
+    assert until_today == datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+
+
+def test_export_stops_when_the_client_goes_away(monkeypatch):
+    outcome = []
+
+    def export(name, out, fmt="csv", params=None, window=None):
+        try:
+            while True:
+                out.write(b"x" * 1024)
+        except ConnectionResetError:
+            outcome.append("stopped")
+            raise
+
+    monkeypatch.setattr(api.export, "export", export)
+
+    async def check(response):
+        await response.content.read(api.EXPORT_CHUNK_BYTES)
+        response.close()
+        for _ in range(100):
+            if outcome:
+                break
+            await asyncio.sleep(0.05)
+
+    _request("/api/export/claim_status", check)
+    assert outcome == ["stopped"]
@@ -0,0 +1,246 @@
+"""Claiming: result handling, SKIP LOCKED, retries, and no over-claims under contention."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import exc
+
+import claims
+
+
+class Result:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+
+    def scalar(self):
+        return self.rows[0][0] if self.rows else None
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+
+class PgError(Exception):
+    def __init__(self, pgcode):
+        super().__init__(f"pgcode {pgcode}")
+        self.pgcode = pgcode
+
+
+class FakeDatabase:
+    """food_listings quantities and claims rows, answering the statements claims.py sends.
+
+    Each transaction runs alone (as if serialized), and is rolled back if
+    it raises. ``locked`` holds listings a concurrent transaction has
+    locked, which SKIP LOCKED passes over. ``failures`` is a list of pgcodes
+    raised by the next statements, one per statement.
+    """
+
+    def __init__(self, quantities):
+        self.quantities = dict(quantities)
+        self.claims = []
+        self.locked = set()
+        self.failures = []
+        self.statements = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self, name="write"):
+        with self.lock:
+            saved = (dict(self.quantities), list(self.claims))
+            try:
+                yield self
+            except Exception:
+                self.quantities, self.claims = saved
+                raise
+
+    def exec_driver_sql(self, sql, params):
+        self.statements += 1
+        if self.failures:
+            code = self.failures.pop(0)
+            if code:
+                raise exc.OperationalError(sql, params, PgError(code))
+        sql = " ".join(sql.split())
+        if sql.startswith("UPDATE food_listings SET quantity = quantity - %s WHERE food_id = %s AND quantity >= %s"):
+            quantity, food_id, minimum = params
+            if self.quantities.get(food_id, -1) < minimum:
+                return Result()
+            self.quantities[food_id] -= quantity
+            return Result([(self.quantities[food_id],)])
+        if sql.startswith("UPDATE food_listings SET quantity = quantity - %s WHERE food_id = %s"):
+            quantity, food_id = params
+            assert food_id not in self.locked, "updated a row locked by another transaction"
+            assert self.quantities[food_id] >= quantity, "SKIP LOCKED path over-claimed"
+            self.quantities[food_id] -= quantity
+            return Result([(self.quantities[food_id],)])
+        if sql.startswith("SELECT quantity FROM food_listings"):
+            food_id, = params
+            return Result([(self.quantities[food_id],)] if food_id in self.quantities else [])
+        if sql.startswith("SELECT food_id FROM food_listings") and sql.endswith("FOR UPDATE SKIP LOCKED"):
+            food_ids, quantity, _ = params
+            return Result([(food_id,) for food_id in food_ids
+                           if food_id not in self.locked and self.quantities.get(food_id, -1) >= quantity][:1])
+        if sql.startswith("INSERT INTO claims"):
+            self.claims.append(params)
+            return Result([(len(self.claims),)])
+        raise AssertionError(f"unexpected statement: {sql}")
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeDatabase({1: 5, 2: 0, 3: 3, 4: 10})
+    monkeypatch.setattr(claims, "transaction", db.transaction)
+    sleeps = []
+    monkeypatch.setattr(claims.time, "sleep", sleeps.append)
+    db.sleeps = sleeps
+    return db
+
+
+def test_claim_listing_decrements_and_records_the_claim(fake_db):
+    result = claims.claim_listing(1, receiver_id=7, quantity=2)
+    assert result == {"status": "claimed", "food_id": 1, "claim_id": 1, "remaining": 3, "attempts": 1}
+    assert fake_db.quantities[1] == 3
+    assert fake_db.claims == [(1, 7, "Pending", 2)]
+
+
+def test_claim_listing_reports_insufficient_and_missing_listings(fake_db):
+    result = claims.claim_listing(3, receiver_id=7, quantity=4)
+    assert (result["status"], result["remaining"], result["claim_id"]) == ("insufficient", 3, None)
+    assert claims.claim_listing(99, receiver_id=7)["status"] == "not_found"
+    assert fake_db.quantities[3] == 3 and fake_db.claims == []
+
+
+def test_claim_listing_rejects_a_non_positive_quantity(fake_db):
+    with pytest.raises(ValueError):
+        claims.claim_listing(1, receiver_id=7, quantity=0)
+
+
+def test_claim_first_available_skips_locked_and_used_up_listings(fake_db):
+    fake_db.locked = {1}
+    result = claims.claim_first_available([2, 1, 3, 4], receiver_id=7, quantity=2)
+    # 2 is used up and 1 is locked by someone else, so 3 is claimed
+    assert (result["status"], result["food_id"], result["remaining"]) == ("claimed", 3, 1)
+    assert fake_db.quantities == {1: 5, 2: 0, 3: 1, 4: 10}
+
+
+def test_claim_first_available_with_nothing_left(fake_db):
+    fake_db.locked = {4}
+    result = claims.claim_first_available([2, 3, 4], receiver_id=7, quantity=5)
+    assert (result["status"], result["food_id"]) == ("unavailable", None)
+    assert claims.claim_first_available([], receiver_id=7) == {**claims._result("unavailable", None), "attempts": 0}
+
+
+@pytest.mark.parametrize("pgcode", sorted(claims.RETRYABLE))
+def test_transient_conflicts_are_retried_with_backoff(fake_db, pgcode):
+    fake_db.failures = [pgcode, None, pgcode]   # fails on the 1st statement, then on the 2nd of the retry
+    result = claims.claim_listing(1, receiver_id=7)
+    assert (result["status"], result["attempts"]) == ("claimed", 3)
+    # The failed attempts were rolled back, so only one unit was taken
+    assert fake_db.quantities[1] == 4 and len(fake_db.claims) == 1
+    first, second = fake_db.sleeps
+    base = claims.CLAIM_BACKOFF_MS / 1000
+    assert 0.5 * base <= first <= 1.5 * base
+    assert 2 * 0.5 * base <= second <= 2 * 1.5 * base
+
+
+def test_retries_stop_after_claim_retries_attempts(fake_db):
+    fake_db.failures = ["40P01"] * claims.CLAIM_RETRIES
+    with pytest.raises(exc.OperationalError):
+        claims.claim_first_available([1], receiver_id=7)
+    assert fake_db.statements == claims.CLAIM_RETRIES
+    assert len(fake_db.sleeps) == claims.CLAIM_RETRIES - 1
+    assert fake_db.quantities[1] == 5 and fake_db.claims == []
+
+
+def test_other_errors_are_not_retried(fake_db):
+    fake_db.failures = ["23503"]   # foreign_key_violation
+    with pytest.raises(exc.OperationalError):
+        claims.claim_listing(1, receiver_id=7)
+    assert fake_db.statements == 1 and fake_db.sleeps == []
+
+
+@pytest.mark.parametrize("claim", ["single", "first_available"])
+def test_concurrent_claimers_take_exactly_the_listed_quantity(fake_db, claim):
+    fake_db.quantities = {food_id: 40 for food_id in range(1, 6)}
+    food_ids = list(fake_db.quantities)
+
+    def claimer(i):
+        outcomes = []
+        while True:
+            if claim == "single":
+                result = claims.claim_listing(food_ids[i % len(food_ids)], receiver_id=i)
+            else:
+                result = claims.claim_first_available(food_ids, receiver_id=i)
+            outcomes.append(result["status"])
+            if result["status"] != "claimed":
+                return outcomes
+
+    with ThreadPoolExecutor(max_workers=128) as pool:
+        outcomes = [status for statuses in pool.map(claimer, range(128)) for status in statuses]
+    assert outcomes.count("claimed") == 200 == len(fake_db.claims)
+    assert all(quantity == 0 for quantity in fake_db.quantities.values())
+
+
+# Against PostgreSQL ---------------------------------------------------------
+
+
+@pytest.fixture
+def stress_listings():
+    from db import get_engine
+    with get_engine().begin() as conn:
+        provider_id = conn.exec_driver_sql(
+            "INSERT INTO providers (name, type, city) VALUES ('Claim Test', 'Restaurant', 'City 1') "
+            "RETURNING provider_id").scalar()
+        receiver_id = conn.exec_driver_sql(
+            "INSERT INTO receivers (name, type, city) VALUES ('Claim Test', 'NGO', 'City 1') "
+            "RETURNING receiver_id").scalar()
+        food_ids = conn.exec_driver_sql(
+            """
+            INSERT INTO food_listings (food_name, quantity, expiry_date, provider_id, location)
+            SELECT 'Claim Test ' || n, 50, CURRENT_DATE + 1, %s, 'City 1' FROM generate_series(1, 4) AS n
+            RETURNING food_id
+            """,
+            (provider_id,),
+        ).scalars().all()
+    yield food_ids, receiver_id
+    with get_engine().begin() as conn:
+        conn.exec_driver_sql("DELETE FROM claims WHERE food_id = ANY(%s)", (food_ids,))
+        conn.exec_driver_sql("DELETE FROM food_listings WHERE food_id = ANY(%s)", (food_ids,))
+        conn.exec_driver_sql("DELETE FROM receivers WHERE receiver_id = %s", (receiver_id,))
+        conn.exec_driver_sql("DELETE FROM providers WHERE provider_id = %s", (provider_id,))
+
+
+@pytest.mark.db
+@pytest.mark.parametrize("claim", ["single", "first_available"])
+def test_no_lost_updates_or_over_claims_in_postgres(stress_listings, claim):
+    from db import get_engine
+    food_ids, receiver_id = stress_listings
+
+    def claimer(i):
+        claimed = 0
+        while True:
+            if claim == "single":
+                result = claims.claim_listing(food_ids[i % len(food_ids)], receiver_id)
+            else:
+                result = claims.claim_first_available(food_ids, receiver_id)
+            if result["status"] == "claimed":
+                claimed += 1
+            elif result["status"] == "unavailable" and any(
+                    claims.claim_listing(food_id, receiver_id)["status"] == "claimed" for food_id in food_ids):
+                # Everything was locked just now; a blocking claim found some left
+                claimed += 1
+            else:
+                return claimed
+
+    with ThreadPoolExecutor(max_workers=128) as pool:
+        claimed = sum(pool.map(claimer, range(128)))
+    with get_engine().connect() as conn:
+        rows = conn.exec_driver_sql(
+            """
+            SELECT f.quantity, COALESCE(SUM(c.quantity), 0), COUNT(c.claim_id)
+            FROM food_listings f LEFT JOIN claims c ON c.food_id = f.food_id
+            WHERE f.food_id = ANY(%s) GROUP BY f.food_id, f.quantity
+            """,
+            (food_ids,),
+        ).all()
+    assert all(remaining == 0 and taken == 50 for remaining, taken, _ in rows)
+    assert sum(count for _, _, count in rows) == claimed == 200
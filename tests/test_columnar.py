@@ -0,0 +1,177 @@
+"""Columnar HANDLERS against the same queries run as SQL over the same rows."""
+import random
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from columnar import HANDLERS, TABLES, Snapshot
+from queries import QUERIES
+
+CITIES = ["Springfield", "Shelbyville", "Ogdenville", "North Haverbrook", None]
+STATUSES = ["Completed", "Pending", "Cancelled", None]
+
+# The registered SQL of these reads the summary tables; the same totals
+# computed from the raw tables, leaving out NULL groups as the summaries do
+RAW_SQL = {
+    "participants_by_city": """
+        SELECT city, SUM(p) AS provider_count, SUM(r) AS receiver_count
+        FROM (SELECT city, 1 AS p, 0 AS r FROM providers UNION ALL SELECT city, 0, 1 FROM receivers)
+        WHERE city IS NOT NULL
+        GROUP BY city
+        ORDER BY city
+    """,
+    "contribution_by_provider_type": """
+        SELECT provider_type, SUM(quantity) AS total_quantity
+        FROM food_listings WHERE provider_type IS NOT NULL
+        GROUP BY provider_type ORDER BY total_quantity DESC
+    """,
+    "cities": "SELECT DISTINCT city FROM providers WHERE city IS NOT NULL ORDER BY city",
+    "total_available": "SELECT SUM(quantity) AS total_available_quantity FROM food_listings",
+    "listings_by_location": """
+        SELECT location, COUNT(*) AS listing_count
+        FROM food_listings WHERE location IS NOT NULL
+        GROUP BY location ORDER BY listing_count DESC
+    """,
+    "food_type_counts": """
+        SELECT food_type, COUNT(*) AS total_count
+        FROM food_listings WHERE food_type IS NOT NULL
+        GROUP BY food_type ORDER BY total_count DESC
+    """,
+    "provider_donations": """
+        SELECT p.name AS provider_name, p.city, SUM(f.quantity) AS total_donated_quantity
+        FROM food_listings f JOIN providers p ON f.provider_id = p.provider_id
+        GROUP BY p.name, p.city ORDER BY total_donated_quantity DESC
+    """,
+}
+# Ordering column of each query, checked separately since ties may come in any order
+SORTED_BY = {
+    "participants_by_city": ("city", True),
+    "contribution_by_provider_type": ("total_quantity", False),
+    "cities": ("city", True),
+    "receiver_totals": ("total_claimed_quantity", False),
+    "listings_by_location": ("listing_count", False),
+    "food_type_counts": ("total_count", False),
+    "claims_per_food": ("total_claims", False),
+    "provider_successful_claims": ("successful_claims", False),
+    "claim_status": ("total", False),
+    "receiver_avg_claimed": ("avg_claimed_quantity", False),
+    "meal_type_claims": ("total_claims", False),
+    "provider_donations": ("total_donated_quantity", False),
+}
+
+
+def _maybe(rng, values, missing=0.1):
+    return None if rng.random() < missing else rng.choice(values)
+
+
+def _tables(seed):
+    rng = random.Random(seed)
+    providers = pd.DataFrame({
+        "provider_id": range(1, 41),
+        "name": [f"Provider {rng.randint(1, 30)}" for _ in range(40)],
+        "type": [_maybe(rng, ["Restaurant", "Grocery Store", "Supermarket"]) for _ in range(40)],
+        "city": [_maybe(rng, CITIES[:-1]) for _ in range(40)],
+        "contact": [f"555-{i:04d}" for i in range(40)],
+    })
+    receivers = pd.DataFrame({
+        "receiver_id": range(1, 61),
+        "name": [f"Receiver {rng.randint(1, 45)}" for _ in range(60)],
+        "city": [_maybe(rng, CITIES[:-1]) for _ in range(60)],
+    })
+    n_listings = 300
+    listings = pd.DataFrame({
+        "food_id": range(1, n_listings + 1),
+        "food_name": [_maybe(rng, ["Bread", "Rice", "Soup", "Salad", "Fruit"], 0.02) for _ in range(n_listings)],
+        "quantity": [rng.randint(0, 50) for _ in range(n_listings)],
+        # Some listings belong to providers that do not exist
+        "provider_id": [rng.randint(1, 45) for _ in range(n_listings)],
+        "provider_type": [_maybe(rng, ["Restaurant", "Grocery Store", "Supermarket"]) for _ in range(n_listings)],
+        "location": [_maybe(rng, CITIES) for _ in range(n_listings)],
+        "food_type": [_maybe(rng, ["Vegetarian", "Vegan", "Non-Vegetarian"]) for _ in range(n_listings)],
+        "meal_type": [_maybe(rng, ["Breakfast", "Lunch", "Dinner", "Snacks"]) for _ in range(n_listings)],
+    })
+    n_claims = 800
+    claims = pd.DataFrame({
+        "claim_id": range(1, n_claims + 1),
+        # Some claims point at listings that were deleted
+        "food_id": [rng.randint(1, n_listings + 20) for _ in range(n_claims)],
+        "receiver_id": [_maybe(rng, range(1, 66), 0.05) for _ in range(n_claims)],
+        "status": [rng.choice(STATUSES) for _ in range(n_claims)],
+        # Claims loaded from the CSV have no quantity of their own
+        "quantity": [_maybe(rng, range(1, 10), 0.4) for _ in range(n_claims)],
+        "timestamp": [f"2025-03-{rng.randint(1, 28):02d} 12:00:00" for _ in range(n_claims)],
+    })
+    return {"providers": providers, "receivers": receivers, "food_listings": listings, "claims": claims}
+
+
+def _sqlite(tables):
+    conn = sqlite3.connect(":memory:")
+    for table, df in tables.items():
+        df.to_sql(table, conn, index=False)
+    return conn
+
+
+def _reference_sql(name):
+    if name in RAW_SQL:
+        return RAW_SQL[name], ()
+    query = QUERIES[name]
+    if query.windowed:
+        # A window that covers every claim
+        sql = query.windowed.replace("::numeric", " * 1.0")
+        return sql.replace("%s", "?"), ("2000-01-01", "2100-01-01")
+    return query.sql.replace("%s", "?"), ()
+
+
+def _rows(df):
+    def key(value):
+        if value is None or (isinstance(value, float) and pd.isna(value)) or value is pd.NA:
+            return (0, "")
+        return (1, value) if isinstance(value, str) else (1, float(value))
+    return sorted((tuple(key(v) for v in row) for row in df.itertuples(index=False)))
+
+
+def _assert_same(actual, expected):
+    assert list(actual.columns) == list(expected.columns)
+    assert len(actual) == len(expected)
+    for got, want in zip(_rows(actual), _rows(expected)):
+        for (got_null, got_value), (want_null, want_value) in zip(got, want):
+            assert got_null == want_null
+            if isinstance(want_value, float):
+                assert got_value == pytest.approx(want_value, abs=0.011)
+            else:
+                assert got_value == want_value
+
+
+@pytest.fixture(scope="module", params=range(3))
+def data(request):
+    tables = _tables(request.param)
+    snapshot = Snapshot({table: tables[table][list(dtypes)].astype(dtypes) for table, dtypes in TABLES.items()}, 0)
+    return snapshot, _sqlite(tables), tables
+
+
+@pytest.mark.parametrize("name", sorted(set(HANDLERS) - {"providers_in_city"}))
+def test_handler_matches_sql(data, name):
+    snapshot, conn, _ = data
+    sql, params = _reference_sql(name)
+    expected = pd.read_sql_query(sql, conn, params=params)
+    actual = snapshot.answer(name)
+    _assert_same(actual, expected)
+    if name in SORTED_BY:
+        column, ascending = SORTED_BY[name]
+        values = list(actual[column])
+        assert values == sorted(values, reverse=not ascending)
+
+
+def test_providers_in_city_matches_sql(data):
+    snapshot, conn, tables = data
+    sql, _ = _reference_sql("providers_in_city")
+    for city in CITIES[:-1]:
+        expected = pd.read_sql_query(sql, conn, params=(city,))
+        _assert_same(snapshot.answer("providers_in_city", (city,)), expected)
+
+
+def test_every_handler_is_a_registered_query():
+    assert set(HANDLERS) <= set(QUERIES)
+    assert all(not QUERIES[name].source for name in HANDLERS)
+
@@ -0,0 +1,73 @@
+"""Read replica health (which failures take a replica out, and where reads go meanwhile), and the data version."""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, exc
+
+import db
+
+
+class PgError(Exception):
+    def __init__(self, pgcode=None):
+        super().__init__(f"pgcode {pgcode}")
+        self.pgcode = pgcode
+
+
+def _context(error, is_disconnect=False):
+    return SimpleNamespace(sqlalchemy_exception=error, original_exception=error.orig, is_disconnect=is_disconnect)
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    replica = db.Replica("postgresql+psycopg2://reader@replica.invalid/food_waste_db")
+    # A checked, caught-up replica, so read_engine() needs no database
+    replica.checked_at = time.time()
+    monkeypatch.setattr(db, "_replicas", [replica])
+    monkeypatch.setattr(db, "_engine", create_engine("postgresql+psycopg2://writer@primary.invalid/food_waste_db"))
+    return replica
+
+
+def test_a_healthy_replica_serves_reads(replica):
+    assert db.read_engine() is replica.engine
+
+
+@pytest.mark.parametrize("error, is_disconnect", [
+    (exc.OperationalError("SELECT 1", None, PgError()), False),          # could not connect
+    (exc.OperationalError("SELECT 1", None, PgError("08006")), False),   # connection_failure
+    (exc.DBAPIError("SELECT 1", None, PgError()), True),                 # server closed the connection
+])
+def test_unreachable_replica_is_skipped(replica, error, is_disconnect):
+    replica._on_error(_context(error, is_disconnect))
+    assert replica.down()
+    assert db.read_engine() is db.get_engine()
+
+
+@pytest.mark.parametrize("error", [
+    exc.OperationalError("SELECT pg_sleep(60)", None, PgError("57014")),   # statement_timeout
+    exc.ProgrammingError("SELEC 1", None, PgError("42601")),
+])
+def test_query_errors_leave_the_replica_in_use(replica, error):
+    replica._on_error(_context(error))
+    assert not replica.down()
+    assert db.read_engine() is replica.engine
+
+
+def test_failed_connects_at_pool_checkout_count(replica):
+    replica.engine.pool.connect_failed_at = time.time()
+    assert db.read_engine() is db.get_engine()
+    # Until the cooldown is over
+    replica.engine.pool.connect_failed_at = time.time() - db.REPLICA_COOLDOWN_SECONDS - 1
+    assert db.read_engine() is replica.engine
+
+
+def test_concurrent_cache_clears_each_bump_the_data_version(monkeypatch):
+    monkeypatch.setattr(db, "_cached_query", SimpleNamespace(clear=lambda: None))
+    start = db.data_version()
+    threads = [threading.Thread(target=lambda: [db.clear_query_cache() for _ in range(1000)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert db.data_version() == start + 8000
@@ -0,0 +1,28 @@
+"""export_file() size cap and the API links the app offers for large exports."""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import export
+
+
+@pytest.fixture
+def big_result(monkeypatch):
+    # top_location is derived, so it is exported from fetch() without a database
+    monkeypatch.setattr(export, "fetch", lambda *args: pd.DataFrame({"n": range(100_000)}))
+
+
+def test_export_file_stops_at_max_bytes(big_result):
+    with pytest.raises(export.ExportTooLarge):
+        export.export_file("top_location", max_bytes=10_000)
+    data = export.export_file("top_location", max_bytes=10_000_000).read()
+    assert data.startswith(b"n\n0\n1\n") and data.endswith(b"99999\n")
+
+
+def test_export_url_matches_the_api_arguments():
+    window = (datetime(2025, 1, 1), datetime(2025, 2, 1))
+    assert export.export_url("claims_daily", "csv", None, window) == (
+        f"{export.EXPORT_API_URL}/api/export/claims_daily?format=csv&start=2025-01-01&end=2025-01-31")
+    assert export.export_url("providers_in_city", "parquet", ("New York",)) == (
+        f"{export.EXPORT_API_URL}/api/export/providers_in_city?format=parquet&param=New+York")
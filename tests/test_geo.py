@@ -0,0 +1,89 @@
+"""KDTree and ReceiverLocator against a brute-force scan of every point."""
+import math
+import random
+
+import pytest
+
+from geo import KDTree, ReceiverLocator, chord_to_km, km_to_chord, to_xyz
+
+
+def _random_points(rng, n, duplicates=0):
+    points = [(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(n)]
+    # Repeated coordinates, like receivers sharing a city centroid
+    points += [rng.choice(points) for _ in range(duplicates)]
+    return points
+
+
+def _brute_force(items, target, k, max_chord):
+    found = sorted((math.dist(xyz, target), payload) for xyz, payload in items)
+    return [(d, payload) for d, payload in found if d <= max_chord][:k]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("k", [1, 3, 10, 50])
+@pytest.mark.parametrize("radius_km", [None, 50, 500, 5000])
+def test_nearest_matches_brute_force(seed, k, radius_km):
+    rng = random.Random(seed)
+    items = [(to_xyz(lat, lon), i) for i, (lat, lon) in enumerate(_random_points(rng, 400, duplicates=40))]
+    tree = KDTree(items)
+    max_chord = km_to_chord(radius_km) if radius_km is not None else 2.0
+    for _ in range(20):
+        target = to_xyz(rng.uniform(-90, 90), rng.uniform(-180, 180))
+        expected = _brute_force(items, target, k, max_chord)
+        found = tree.nearest(target, k, max_chord)
+        assert [d for d, _ in found] == pytest.approx([d for d, _ in expected])
+        # Ties between duplicate points may come back in any order
+        for d, payload in found:
+            assert math.dist(items[payload][0], target) == pytest.approx(d)
+        assert len({payload for _, payload in found}) == len(found)
+
+
+def test_nearest_edge_cases():
+    items = [(to_xyz(10, 10), "a"), (to_xyz(10, 10), "b"), (to_xyz(-10, -10), "c")]
+    tree = KDTree(items)
+    target = to_xyz(10, 10)
+    assert tree.nearest(target, 0) == []
+    assert KDTree([]).nearest(target, 5) == []
+    assert sorted(payload for _, payload in tree.nearest(target, 2)) == ["a", "b"]
+    assert len(tree.nearest(target, 10)) == 3
+    assert sorted(payload for _, payload in tree.nearest(target, 10, km_to_chord(1))) == ["a", "b"]
+
+
+def test_chord_km_round_trip():
+    for km in (0.0, 1.0, 250.0, 5000.0, 20000.0):
+        assert chord_to_km(km_to_chord(km)) == pytest.approx(km, abs=1e-6)
+
+
+def test_locator_nearest_with_shared_coordinates():
+    rng = random.Random(7)
+    points = _random_points(rng, 150, duplicates=150)
+    locator = ReceiverLocator()
+    locator.receivers = {rid: (f"Receiver {rid}", "NGO", "City", lat, lon)
+                         for rid, (lat, lon) in enumerate(points, start=1)}
+    locator._changed()
+
+    for _ in range(30):
+        lat, lon = rng.uniform(-60, 70), rng.uniform(-180, 180)
+        n, radius_km = rng.choice([1, 5, 20]), rng.choice([None, 300, 3000])
+        target = to_xyz(lat, lon)
+        expected = sorted(
+            (chord_to_km(math.dist(to_xyz(r[3], r[4]), target)), rid) for rid, r in locator.receivers.items())
+        if radius_km is not None:
+            expected = [(d, rid) for d, rid in expected if d <= radius_km + 1e-6]
+        expected = expected[:n]
+
+        df = locator.nearest(lat, lon, n=n, radius_km=radius_km)
+        assert len(df) == len(expected)
+        assert list(df["distance_km"]) == pytest.approx([round(d, 2) for d, _ in expected], abs=0.011)
+        assert df["receiver_id"].is_unique
+        assert list(df["distance_km"]) == sorted(df["distance_km"])
+
+
+def test_locator_rebuilds_tree_after_change():
+    locator = ReceiverLocator()
+    locator.receivers = {1: ("A", "NGO", "X", 0.0, 0.0)}
+    locator._changed()
+    assert list(locator.nearest(0.0, 0.0, n=5)["receiver_id"]) == [1]
+    locator.receivers[2] = ("B", "NGO", "X", 0.0, 0.001)
+    locator._changed()
+    assert list(locator.nearest(0.0, 0.0, n=5)["receiver_id"]) == [1, 2]
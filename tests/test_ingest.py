@@ -0,0 +1,63 @@
+"""CSV loading: date parsing and claims partitions for the loaded range."""
+from datetime import date, datetime
+
+import pandas as pd
+
+import ingest
+
+
+def test_dates_parse_in_the_dataset_and_iso_formats():
+    df = pd.DataFrame({
+        "Food_ID": ["1", "2", "3"], "Food_Name": "Soup", "Quantity": "4",
+        "Expiry_Date": ["3/17/2025", "2025-03-20", "17.03.2025"], "Provider_ID": "1", "Provider_Type": "Restaurant",
+        "Location": "Kellytown", "Food_Type": "Vegan", "Meal_Type": "Lunch",
+    })
+    valid, rejected = ingest.clean_chunk(df, "food_listings")
+    assert list(valid["expiry_date"]) == [date(2025, 3, 17), date(2025, 3, 20)]
+    assert list(rejected) == [False, False, True]
+
+
+def test_timestamps_parse_in_the_dataset_and_iso_formats():
+    df = pd.DataFrame({
+        "Claim_ID": ["1", "2", "3", "4"], "Food_ID": "1", "Receiver_ID": "1", "Status": "Pending",
+        "Timestamp": ["3/5/2025 5:26", "3/21/2025 0:59:10", "2025-03-05 10:00:00", "yesterday"],
+    })
+    valid, rejected = ingest.clean_chunk(df, "claims")
+    assert list(valid["timestamp"]) == [datetime(2025, 3, 5, 5, 26), datetime(2025, 3, 21, 0, 59, 10),
+                                        datetime(2025, 3, 5, 10)]
+    assert list(rejected) == [False, False, False, True]
+
+
+class Cursor:
+    """Answers the partition helper's queries from canned results, in order."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((" ".join(sql.split()), params))
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+
+def test_partitions_cover_the_staged_claims():
+    cur = Cursor((True,), (date(2023, 1, 5), date(2025, 3, 21)), (False,), (27,))
+    assert ingest.ensure_claims_partitions(cur, "stage_claims") == 27
+    assert ("SELECT ensure_claims_partitions(%s, %s)", (date(2023, 1, 5), date(2025, 3, 21))) in cur.executed
+    assert not any("DISABLE TRIGGER" in sql for sql, _ in cur.executed)
+
+
+def test_triggers_turned_off_for_the_load_stay_off():
+    cur = Cursor((True,), (date(2024, 6, 1), date(2024, 6, 2)), (True,), (1,))
+    ingest.ensure_claims_partitions(cur, "stage_claims")
+    assert cur.executed[-1] == ("ALTER TABLE claims DISABLE TRIGGER USER", None)
+
+
+def test_nothing_to_do_without_dated_claims_or_partitioning():
+    cur = Cursor((True,), (None, None))
+    assert ingest.ensure_claims_partitions(cur, "stage_claims") == 0
+    cur = Cursor((False,))
+    assert ingest.ensure_claims_partitions(cur, "stage_claims") == 0
+    assert len(cur.executed) == 1
@@ -0,0 +1,225 @@
+"""Bulk add/update/delete validation against a row-by-row reference."""
+import random
+from contextlib import contextmanager
+from datetime import date
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import listings
+from metrics import METRICS
+
+
+class Result:
+    def __init__(self, rows=(), rowcount=None):
+        self.rows = list(rows)
+        self.rowcount = len(self.rows) if rowcount is None else rowcount
+
+    def scalars(self):
+        return Result([row[0] for row in self.rows])
+
+    def all(self):
+        return self.rows
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class FakeConnection:
+    """The statements listings.py sends, run against dicts."""
+
+    def __init__(self, providers, food_listings, claimed):
+        self.providers = set(providers)
+        self.listings = food_listings  # food_id -> {"quantity": ..., "version": ...}
+        self.claimed = set(claimed)
+        self.inserted = []
+
+    def exec_driver_sql(self, sql, params):
+        sql = " ".join(sql.split())
+        if sql.startswith("SELECT provider_id FROM providers"):
+            return Result((v,) for v in params[0] if v in self.providers)
+        if sql.startswith("INSERT INTO food_listings"):
+            new_ids = []
+            for row in zip(*params):
+                food_id = max(self.listings, default=0) + 1
+                self.listings[food_id] = {"quantity": row[1], "version": 1, "row": row}
+                new_ids.append((food_id,))
+            self.inserted.extend(new_ids)
+            return Result(new_ids)
+        if sql.startswith("UPDATE food_listings"):
+            updated = []
+            for food_id, quantity, version in zip(*params):
+                listing = self.listings.get(food_id)
+                if listing and listing["version"] == version:
+                    listing.update(quantity=quantity, version=version + 1)
+                    updated.append((food_id,))
+            return Result(updated)
+        if sql.startswith("SELECT food_id, quantity FROM food_listings"):
+            return Result((v, self.listings[v]["quantity"]) for v in params[0] if v in self.listings)
+        if sql.startswith("DELETE FROM food_listings"):
+            deleted = [v for v in dict.fromkeys(params[0]) if v in self.listings and v not in self.claimed]
+            for food_id in deleted:
+                del self.listings[food_id]
+            return Result((v,) for v in deleted)
+        if sql.startswith("SELECT quantity, version FROM food_listings"):
+            listing = self.listings.get(params[0])
+            return Result([(listing["quantity"], listing["version"])] if listing else [])
+        if sql.startswith("SELECT food_id, quantity, version FROM food_listings"):
+            return Result((v, self.listings[v]["quantity"], self.listings[v]["version"])
+                          for v in sorted(params[0]) if v in self.listings)
+        if sql.startswith("SELECT food_id FROM food_listings"):
+            return Result((v,) for v in params[0] if v in self.listings)
+        raise AssertionError(f"unexpected statement: {sql}")
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    conn = FakeConnection(providers=range(1, 11), food_listings={}, claimed=())
+
+    @contextmanager
+    def transaction(name="write"):
+        conn.transactions += 1
+        yield conn
+
+    @contextmanager
+    def connect():
+        yield conn
+
+    conn.transactions = 0
+    monkeypatch.setattr(listings, "transaction", transaction)
+    monkeypatch.setattr(listings, "get_engine", lambda: SimpleNamespace(connect=connect))
+    return conn
+
+
+def _is_whole(value, minimum=None):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return False
+    return number == number and number % 1 == 0 and (minimum is None or number >= minimum)
+
+
+def _expected_add_error(row, providers):
+    quantity, provider_id, expiry = row["quantity"], row["provider_id"], row["expiry_date"]
+    if ((quantity is not None and not _is_whole(quantity)) or (provider_id is not None and not _is_whole(provider_id))
+            or (expiry is not None and pd.isna(pd.to_datetime(expiry, errors="coerce")))):
+        return "unparseable quantity, provider_id or expiry_date"
+    if row["food_name"] is None or not row["food_name"].strip():
+        return "food_name is required"
+    if quantity is None or float(quantity) < 1:
+        return "quantity must be at least 1"
+    if provider_id is None:
+        return "provider_id is required"
+    if int(float(provider_id)) not in providers:
+        return "unknown provider_id"
+    return ""
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bulk_add_matches_row_by_row_checks(fake_db, seed):
+    rng = random.Random(seed)
+    rows = [{
+        "food_name": rng.choice(["Bread", " Rice ", "", "  ", None]),
+        "quantity": rng.choice(["5", "0", "-1", "12", "x", "2.5", None]),
+        "expiry_date": rng.choice(["2025-03-20", "not a date", None]),
+        "provider_id": rng.choice(["1", "7", "10", "11", "abc", None]),
+        "provider_type": "Restaurant", "location": "Springfield", "food_type": "Vegan", "meal_type": "Lunch",
+    } for _ in range(200)]
+    result = listings.bulk_add_listings(pd.DataFrame(rows))
+
+    assert list(result["row"]) == list(range(1, len(rows) + 1))
+    expected = [_expected_add_error(row, fake_db.providers) for row in rows]
+    assert list(result["error"]) == expected
+    assert list(result["status"]) == ["added" if error == "" else "error" for error in expected]
+    # New ids come back for exactly the added rows, in input order
+    added = result[result["status"] == "added"]
+    assert list(added["food_id"]) == [food_id for (food_id,) in fake_db.inserted]
+    for food_id, row in zip(added["food_id"], (row for row, error in zip(rows, expected) if error == "")):
+        stored = fake_db.listings[food_id]["row"]
+        assert stored[0] == row["food_name"].strip()
+        assert stored[2] == (date.fromisoformat(row["expiry_date"]) if row["expiry_date"] else None)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bulk_update_matches_row_by_row_checks(fake_db, seed):
+    rng = random.Random(seed)
+    fake_db.listings.update({food_id: {"quantity": 10, "version": rng.randint(1, 3)} for food_id in range(1, 31)})
+    rows = [{
+        "food_id": rng.choice([str(rng.randint(1, 35)), "abc", "3.5", None]),
+        "quantity": rng.choice(["4", "0", "2.5", "x", None, "9"]),
+        "version": rng.choice([None, "1", "2", "3", "1.5"]),
+    } for _ in range(120)]
+    versions = {food_id: listing["version"] for food_id, listing in fake_db.listings.items()}
+    result = listings.bulk_update_quantities(pd.DataFrame(rows))
+
+    # Reference: validate each row, then apply the last valid row per food_id
+    # if its version matches the one the listing had before the batch
+    expected = []
+    for i, row in enumerate(rows):
+        if not _is_whole(row["food_id"]):
+            expected.append("food_id must be a whole number")
+        elif not _is_whole(row["quantity"], minimum=1):
+            expected.append("quantity must be a whole number of at least 1")
+        elif not _is_whole(row["version"]):
+            expected.append("version of the listing as read is required")
+        elif any(_is_whole(later["food_id"]) and float(later["food_id"]) == float(row["food_id"])
+                 for later in rows[i + 1:]):
+            expected.append("food_id repeated later in the batch")
+        else:
+            expected.append(None)
+    for i, row in enumerate(rows):
+        if expected[i] is None:
+            food_id = int(float(row["food_id"]))
+            if food_id not in versions:
+                expected[i] = "food_id not found"
+            elif versions[food_id] != int(float(row["version"])):
+                expected[i] = f"listing changed since it was read (now {fake_db.listings[food_id]['quantity']} left)"
+            else:
+                expected[i] = ""
+                assert fake_db.listings[food_id]["quantity"] == int(float(row["quantity"]))
+
+    assert list(result["row"]) == list(range(1, len(rows) + 1))
+    assert list(result["error"]) == expected
+    assert list(result["status"]) == ["updated" if error == "" else "error" for error in expected]
+
+
+def test_bulk_add_with_no_valid_rows_opens_no_transaction(fake_db):
+    result = listings.bulk_add_listings(pd.DataFrame({
+        "food_name": ["Rice", None], "quantity": ["x", "4"], "expiry_date": [None, "2025-03-20"],
+        "provider_id": ["1", "2"], "provider_type": None, "location": None, "food_type": None, "meal_type": None,
+    }))
+    assert list(result["error"]) == ["unparseable quantity, provider_id or expiry_date", "food_name is required"]
+    assert fake_db.transactions == 0
+
+
+def test_bulk_update_without_versions_changes_nothing(fake_db):
+    fake_db.listings[1] = {"quantity": 10, "version": 1}
+    result = listings.bulk_update_quantities(pd.DataFrame({"food_id": [1], "quantity": [3]}))
+    assert list(result["error"]) == ["version of the listing as read is required"]
+    assert fake_db.listings[1]["quantity"] == 10
+
+
+def test_bulk_delete_reports_claimed_and_missing_listings(fake_db):
+    fake_db.listings.update({food_id: {"quantity": 1, "version": 1} for food_id in range(1, 11)})
+    fake_db.claimed = {2, 5}
+    ids = [1, 2, 5, 11, 3, 1]
+    result = listings.bulk_delete_listings(ids)
+    assert list(result["error"]) == ["", "listing has claims", "listing has claims", "food_id not found", "", ""]
+    assert list(result["status"]) == ["deleted", "error", "error", "error", "deleted", "deleted"]
+    assert sorted(fake_db.listings) == [2, 4, 5, 6, 7, 8, 9, 10]
+
+
+def test_version_reads_are_timed_like_other_queries(fake_db):
+    fake_db.listings.update({1: {"quantity": 5, "version": 3}, 2: {"quantity": 1, "version": 7}})
+    before = {name: dict(METRICS.totals.get(("query", name), {"count": 0, "rows": 0}))
+              for name in ("listing_version", "listing_versions")}
+    assert tuple(listings.listing_version(1)) == (5, 3)
+    assert listings.listing_version(9) is None
+    assert listings.listing_versions([2, 9, 1])["version"].tolist() == [3, 7]
+    for name, calls, rows in (("listing_version", 2, 1), ("listing_versions", 1, 2)):
+        total = METRICS.totals[("query", name)]
+        assert (total["count"] - before[name]["count"], total["rows"] - before[name]["rows"]) == (calls, rows)
@@ -0,0 +1,188 @@
+"""ListingIndex, kept current by notifications, against a scan of the table it mirrors."""
+import json
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import matching
+from live import CHANNEL as SUMMARY_CHANNEL
+from matching import CHANNEL, NO_EXPIRY, ListingIndex
+
+TODAY = date.today()
+LOCATIONS = ["Springfield", "Shelbyville", "Ogdenville", None]
+FOOD_TYPES = ["Vegetarian", "Vegan", "Non-Vegetarian"]
+MEAL_TYPES = ["Breakfast", "Lunch", "Dinner"]
+
+
+class Notification:
+    def __init__(self, channel, payload):
+        self.channel = channel
+        self.payload = json.dumps(payload)
+
+
+class FakeDatabase:
+    """food_listings, claims and receivers as dicts, answering the index's queries."""
+
+    def __init__(self):
+        self.listings = {}      # food_id -> (food_name, quantity, expiry_date, provider_id, location, food_type, meal_type)
+        self.receivers = {}     # receiver_id -> city
+
+    def is_open(self, food_id):
+        _, quantity, expiry_date, *_ = self.listings[food_id]
+        return quantity > 0 and (expiry_date is None or expiry_date >= TODAY)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        ids = set(params[0]) if params else None
+        if "FROM food_listings" in sql:
+            self.rows = [(food_id, *row) for food_id, row in self.db.listings.items()
+                         if (ids is None or food_id in ids) and self.db.is_open(food_id)]
+        elif "FROM receivers" in sql:
+            self.rows = [(rid, city) for rid, city in self.db.receivers.items() if ids is None or rid in ids]
+        else:
+            raise AssertionError(f"unexpected query: {sql}")
+
+    def fetchall(self):
+        return self.rows
+
+
+def _random_listing(rng):
+    expiry = rng.choice([None, TODAY + timedelta(days=rng.randint(-5, 30))])
+    return (f"Food {rng.randint(1, 50)}", rng.randint(0, 20), expiry, rng.randint(1, 10),
+            rng.choice(LOCATIONS), rng.choice(FOOD_TYPES), rng.choice(MEAL_TYPES))
+
+
+def _expected(db, receiver_id, food_type=None, meal_type=None, min_quantity=1, within_days=None,
+              anywhere=False, limit=20):
+    city = db.receivers.get(receiver_id)
+    if city is None and not anywhere:
+        return [], None
+    found = []
+    for food_id, (_, quantity, expiry_date, _, location, f_type, m_type) in db.listings.items():
+        expiry = expiry_date or NO_EXPIRY
+        if not db.is_open(food_id) or expiry < TODAY:
+            continue
+        if not anywhere and location != city:
+            continue
+        if within_days is not None and (expiry - TODAY).days > within_days:
+            continue
+        if (food_type and f_type != food_type) or (meal_type and m_type != meal_type) or quantity < min_quantity:
+            continue
+        found.append((expiry, food_id))
+    return [food_id for _, food_id in sorted(found)[:limit]], city
+
+
+def _check_invariants(index):
+    assert index.everywhere == sorted(listing.key for listing in index.listings.values())
+    for location, keys in index.by_location.items():
+        assert keys == sorted(listing.key for listing in index.listings.values() if listing.location == location)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_updates_match_a_full_scan(seed):
+    rng = random.Random(seed)
+    db = FakeDatabase()
+    for food_id in range(1, 201):
+        db.listings[food_id] = _random_listing(rng)
+    for receiver_id in range(1, 31):
+        db.receivers[receiver_id] = rng.choice(LOCATIONS[:-1])
+    index = ListingIndex()
+    index._reload(db)
+    next_id = 201
+
+    for _ in range(40):
+        notifications = []
+        for _ in range(rng.randint(1, 15)):
+            action = rng.random()
+            food_id = rng.choice(list(db.listings))
+            if action < 0.25:
+                db.listings[next_id] = _random_listing(rng)
+                food_id, next_id = next_id, next_id + 1
+            elif action < 0.5:
+                # A claim takes some of the quantity
+                row = list(db.listings[food_id])
+                row[1] = max(0, row[1] - rng.randint(1, 5))
+                db.listings[food_id] = tuple(row)
+            elif action < 0.65:
+                # A new expiry date moves the listing within its location
+                row = list(db.listings[food_id])
+                row[2] = TODAY + timedelta(days=rng.randint(-2, 40))
+                db.listings[food_id] = tuple(row)
+            elif action < 0.75:
+                row = list(db.listings[food_id])
+                row[4] = rng.choice(LOCATIONS)
+                db.listings[food_id] = tuple(row)
+            elif action < 0.85:
+                # A claim takes the rest
+                row = list(db.listings[food_id])
+                row[1] = 0
+                db.listings[food_id] = tuple(row)
+            elif action < 0.93:
+                del db.listings[food_id]
+            else:
+                receiver_id = rng.randint(1, 35)
+                db.receivers[receiver_id] = rng.choice(LOCATIONS[:-1])
+                notifications.append(Notification(CHANNEL, {"table": "receivers", "id": receiver_id}))
+                continue
+            notifications.append(Notification(CHANNEL, {"table": "food_listings", "id": food_id}))
+        # The same listing may be named more than once in a batch
+        notifications += rng.sample(notifications, k=len(notifications) // 3)
+        index._apply(db, notifications)
+        _check_invariants(index)
+
+        for receiver_id in range(1, 36):
+            options = dict(
+                food_type=rng.choice([None, *FOOD_TYPES]), meal_type=rng.choice([None, *MEAL_TYPES]),
+                min_quantity=rng.choice([1, 5]), within_days=rng.choice([None, 3, 10]),
+                anywhere=rng.random() < 0.2, limit=rng.choice([1, 5, 20]),
+            )
+            expected_ids, expected_city = _expected(db, receiver_id, **options)
+            df, city = index.match(receiver_id, **options)
+            assert city == expected_city
+            assert list(df["food_id"]) == expected_ids
+
+
+def test_reset_notification_reloads_everything():
+    db = FakeDatabase()
+    db.listings[1] = ("Bread", 5, TODAY + timedelta(days=1), 1, "Springfield", "Vegan", "Lunch")
+    db.receivers[1] = "Springfield"
+    index = ListingIndex()
+    index._reload(db)
+
+    # A bulk load changes rows without per-row notifications
+    db.listings[2] = ("Rice", 5, TODAY, 1, "Springfield", "Vegan", "Lunch")
+    index._apply(db, [Notification(SUMMARY_CHANNEL, {"table": "listing_summary", "reset": True})])
+    assert list(index.match(1)[0]["food_id"]) == [2, 1]
+
+
+def test_expired_listings_are_skipped_without_a_change():
+    db = FakeDatabase()
+    db.listings[1] = ("Bread", 5, TODAY + timedelta(days=1), 1, "Springfield", "Vegan", "Lunch")
+    db.listings[2] = ("Rice", 5, None, 1, "Springfield", "Vegan", "Lunch")
+    db.receivers[1] = "Springfield"
+    index = ListingIndex()
+    index._reload(db)
+    df, _ = index.match(1)
+    assert list(df["food_id"]) == [1, 2]
+    assert df["days_left"].isna().tolist() == [False, True]
+
+    matching.date = type("FakeDate", (), {"today": staticmethod(lambda: TODAY + timedelta(days=2))})
+    try:
+        assert list(index.match(1)[0]["food_id"]) == [2]
+    finally:
+        matching.date = date